@@ -17,11 +17,14 @@ import importlib
 import logging
 import os
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import esmvalcore
 from esmvalcore._config import read_config_user_file
-from esmvalcore._task import write_ncl_settings
+from esmvalcore._task import resource_usage_logger, write_ncl_settings
 
 from .utilities import read_cmor_config
 
@@ -92,8 +95,14 @@ def _write_ncl_settings(project_info, dataset, run_dir, reformat_script,
 
 
 def _run_ncl_script(in_dir, out_dir, run_dir, dataset, reformat_script,
-                    log_level):
-    """Run the NCL cmorization mechanism."""
+                    log_level, timeout=None):
+    """Run the NCL cmorization mechanism.
+
+    The output of NCL is logged while the script is running. If the script
+    does not finish within `timeout` seconds, it is killed. The resource
+    usage of the script is written to ``resource_usage.txt`` in the run
+    directory of the dataset.
+    """
     logger.info("CMORizing dataset %s using NCL script %s",
                 dataset, reformat_script)
     project = {}
@@ -114,15 +123,43 @@ def _run_ncl_script(in_dir, out_dir, run_dir, dataset, reformat_script,
     # call NCL
     ncl_call = ['ncl', reformat_script]
     logger.info("Executing cmd: %s", ' '.join(ncl_call))
+    start_time = time.time()
     process = subprocess.Popen(ncl_call,
                                stdout=subprocess.PIPE,
                                stderr=subprocess.STDOUT,
-                               env=env)
-    output, err = process.communicate()
-    for oline in str(output.decode('utf-8')).split('\n'):
-        logger.info('[NCL] %s', oline)
-    if err:
-        logger.info('[NCL][subprocess.Popen ERROR] %s', err)
+                               cwd=out_dir,
+                               env=env,
+                               universal_newlines=True)
+    timed_out = threading.Event()
+
+    def _kill():
+        timed_out.set()
+        process.kill()
+
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, _kill)
+        timer.start()
+    usage_file = os.path.join(run_dir, dataset, 'resource_usage.txt')
+    try:
+        with resource_usage_logger(process.pid, usage_file):
+            for oline in process.stdout:
+                logger.info('[NCL][%s] %s', dataset, oline.rstrip('\n'))
+            returncode = process.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
+    logger.info("NCL script for %s finished after %.1f s, resource usage "
+                "written to %s", dataset,
+                time.time() - start_time, usage_file)
+    if returncode != 0:
+        if timed_out.is_set():
+            logger.error("NCL script for %s killed after timeout of %s s",
+                         dataset, timeout)
+        else:
+            logger.error("NCL script for %s failed with return code %s",
+                         dataset, returncode)
+    return returncode
 
 
 def _run_pyt_script(in_dir, out_dir, dataset, user_cfg):
@@ -152,6 +189,11 @@ def main():
                         default=os.path.join(os.path.dirname(__file__),
                                              'config-user.yml'),
                         help='Config file')
+    parser.add_argument('-t',
+                        '--ncl-timeout',
+                        type=float,
+                        default=None,
+                        help='Timeout in seconds for each NCL CMORizer.')
     args = parser.parse_args()
 
     # get and read config file
@@ -210,7 +252,7 @@ def main():
         obs_list = args.obs_list_cmorize
     else:
         obs_list = []
-    _cmor_reformat(config_user, obs_list)
+    _cmor_reformat(config_user, obs_list, ncl_timeout=args.ncl_timeout)
 
     # End time timing
     timestamp2 = datetime.datetime.utcnow()
@@ -220,8 +262,13 @@ def main():
                 timestamp2 - timestamp1)
 
 
-def _cmor_reformat(config, obs_list):
-    """Run the cmorization routine."""
+def _cmor_reformat(config, obs_list, ncl_timeout=None):
+    """Run the cmorization routine.
+
+    NCL scripts are run concurrently in a pool of `max_parallel_tasks`
+    workers (as given in the user configuration file) while the Python
+    scripts are run one after another.
+    """
     logger.info("Running the CMORization scripts.")
 
     # master directory
@@ -238,6 +285,8 @@ def _cmor_reformat(config, obs_list):
     logger.info("Processing datasets %s", datasets)
 
     # loop through tier/datasets to be cmorized
+    ncl_pool = ThreadPoolExecutor(max_workers=config['max_parallel_tasks'])
+    ncl_runs = {}
     for tier in datasets:
         for dataset in datasets[tier]:
             reformat_script_root = os.path.join(
@@ -252,25 +301,33 @@ def _cmor_reformat(config, obs_list):
             if not os.path.isdir(out_data_dir):
                 os.makedirs(out_data_dir)
 
-            # all operations are done in the working dir now
-            os.chdir(out_data_dir)
-
             # figure out what language the script is in
             if os.path.isfile(reformat_script_root + '.ncl'):
                 reformat_script = reformat_script_root + '.ncl'
-                _run_ncl_script(
+                ncl_runs[dataset] = ncl_pool.submit(
+                    _run_ncl_script,
                     in_data_dir,
                     out_data_dir,
                     run_dir,
                     dataset,
                     reformat_script,
                     config['log_level'],
+                    timeout=ncl_timeout,
                 )
             elif os.path.isfile(reformat_script_root + '.py'):
+                # all operations are done in the working dir now
+                os.chdir(out_data_dir)
                 _run_pyt_script(in_data_dir, out_data_dir, dataset, config)
             else:
                 logger.info('Could not find cmorizer for %s', datasets)
 
+    # wait for the NCL scripts
+    ncl_pool.shutdown(wait=True)
+    failed = [dataset for (dataset, run) in ncl_runs.items()
+              if run.result() != 0]
+    if failed:
+        logger.error("CMORization with NCL failed for %s", failed)
+
 
 if __name__ == '__main__':
     main()
@@ -41,7 +41,6 @@ from warnings import catch_warnings, filterwarnings
 import cf_units
 import iris
 
-from esmvalcore.preprocessor import regrid
 from esmvaltool.cmorizers.obs import utilities as utils
 
 logger = logging.getLogger(__name__)
@@ -123,8 +122,9 @@ def _regrid_dataset(in_dir, var, cfg):
             lai_cube = iris.load_cube(infile,
                                       constraint=utils.var_name_constraint(
                                           var['raw']))
-        lai_cube = regrid(lai_cube, cfg['custom']['regrid_resolution'],
-                          'nearest')
+        lai_cube = utils.cached_regrid(
+            lai_cube, cfg['custom']['regrid_resolution'], 'nearest',
+            cache_dir=cfg['custom'].get('regrid_cache_dir'))
         logger.info("Saving: %s", outfile)
 
         iris.save(lai_cube, outfile)
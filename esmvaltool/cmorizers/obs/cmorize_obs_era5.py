@@ -153,6 +153,7 @@ def _extract_variable(in_file, var, cfg, out_dir):
         out_dir,
         attributes,
         local_keys=['positive'],
+        **cfg.get('save', {}),
     )
 
 
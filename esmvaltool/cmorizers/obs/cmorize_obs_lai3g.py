@@ -34,8 +34,6 @@ import iris.coord_categorisation
 import numpy as np
 from cf_units import Unit
 
-from esmvalcore.preprocessor import regrid
-
 from . import utilities as utils
 
 logger = logging.getLogger(__name__)
@@ -160,8 +158,9 @@ def _get_cube_for_year(year, in_dir, cfg):
         coords = _get_coords(year, bin_file, cfg)
         cube = iris.cube.Cube(raw_data, dim_coords_and_dims=coords)
         if cfg.get('regrid'):
-            cube = regrid(cube, cfg['regrid']['target_grid'],
-                          cfg['regrid']['scheme'])
+            cube = utils.cached_regrid(
+                cube, cfg['regrid']['target_grid'], cfg['regrid']['scheme'],
+                cache_dir=cfg['regrid'].get('cache_dir'))
         cubes.append(cube)
 
     # Build cube for single year with monthly data
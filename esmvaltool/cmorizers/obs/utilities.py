@@ -1,9 +1,12 @@
 """Utils module for Python cmorizers."""
 import datetime
+import hashlib
 import logging
 import os
+import pickle
 from contextlib import contextmanager
 
+import dask
 import iris
 import numpy as np
 import yaml
@@ -12,10 +15,26 @@ from dask import array as da
 
 from esmvalcore._config import get_tag_value
 from esmvalcore.cmor.table import CMOR_TABLES
+from esmvalcore.preprocessor import regrid
 from esmvaltool import __version__ as version
 
 logger = logging.getLogger(__name__)
 
+# Regridding schemes of esmvalcore's regrid on rectilinear grids
+REGRID_SCHEMES = {
+    'linear': iris.analysis.Linear(extrapolation_mode='mask'),
+    'linear_extrapolate':
+    iris.analysis.Linear(extrapolation_mode='extrapolate'),
+    'nearest': iris.analysis.Nearest(extrapolation_mode='mask'),
+    'area_weighted': iris.analysis.AreaWeighted(),
+}
+
+# Cache of regridders, keyed on source grid, target grid and scheme
+_REGRIDDERS = {}
+
+# Target size of NetCDF4 chunks (in bytes)
+_CHUNK_BYTES = 4 * 2**20
+
 
 def add_height2m(cube):
     """Add scalar coordinate 'height' with value of 2m."""
@@ -43,6 +62,70 @@ def constant_metadata(cube):
     cube.metadata = metadata
 
 
+def cached_regrid(cube, target_grid, scheme, cache_dir=None):
+    """Regrid cube and reuse the regridder for identical grids.
+
+    The regridder is created with the public regridder interface of the
+    :mod:`iris` scheme (``scheme.regridder(src_cube, target_cube)``) and
+    holds everything the scheme precomputes for a pair of grids (e.g. the
+    area weights of ``area_weighted``). It is cached in memory, keyed on a
+    hash of the horizontal source grid, the target grid and the scheme. If
+    `cache_dir` is given, the regridder is also pickled to this directory so
+    that subsequent runs can reuse it.
+
+    Cubes without rectilinear horizontal grids and schemes not listed in
+    :const:`REGRID_SCHEMES` are regridded with
+    :func:`esmvalcore.preprocessor.regrid` without caching.
+
+    Parameters
+    ----------
+    cube : iris.cube.Cube
+        The source cube to be regridded.
+    target_grid : iris.cube.Cube or str
+        Target grid cube, file or cell specification of the form 'MxN' (see
+        :func:`esmvalcore.preprocessor.regrid`).
+    scheme : str
+        Regridding scheme, see :func:`esmvalcore.preprocessor.regrid`.
+    cache_dir : str, optional
+        Directory where regridders are persistently cached.
+
+    Returns
+    -------
+    iris.cube.Cube
+        Regridded cube.
+
+    """
+    scheme = scheme.lower()
+    if (scheme not in REGRID_SCHEMES
+            or not cube.coords(axis='x', dim_coords=True)
+            or not cube.coords(axis='y', dim_coords=True)):
+        logger.debug("Cannot cache regridder for scheme '%s' and grid of %s",
+                     scheme, cube.summary(shorten=True))
+        return regrid(cube, target_grid, scheme)
+
+    if isinstance(target_grid, str) and os.path.isfile(target_grid):
+        target_grid = iris.load_cube(target_grid)
+    if isinstance(target_grid, str):
+        target_key = target_grid
+    else:
+        target_key = _get_grid_hash(target_grid)
+    key = hashlib.sha1('_'.join(
+        [_get_grid_hash(cube), target_key, scheme]).encode()).hexdigest()
+
+    regridder = _REGRIDDERS.get(key)
+    if regridder is None and cache_dir is not None:
+        regridder = _load_regridder(key, os.path.expanduser(cache_dir))
+    if regridder is None:
+        logger.debug("Creating new regridder for grid hash %s", key)
+        if isinstance(target_grid, str):
+            target_grid = _get_target_cube(cube, target_grid, scheme)
+        regridder = REGRID_SCHEMES[scheme].regridder(cube, target_grid)
+        if cache_dir is not None:
+            _save_regridder(regridder, key, os.path.expanduser(cache_dir))
+    _REGRIDDERS[key] = regridder
+    return regridder(cube)
+
+
 def convert_timeunits(cube, start_year):
     """Convert time axis from malformed Year 0."""
     # TODO any more weird cases?
@@ -119,14 +202,20 @@ def fix_var_metadata(cube, var_info):
 
 
 def flip_dim_coord(cube, coord_name):
-    """Flip (reverse) dimensional coordinate of cube."""
+    """Flip (reverse) dimensional coordinate of cube.
+
+    The data is flipped by slicing, which gives a view of realized data and
+    keeps lazy data lazy, i.e. no additional memory is needed.
+    """
     logger.info("Flipping dimensional coordinate %s...", coord_name)
     coord = cube.coord(coord_name, dim_coords=True)
     coord_idx = cube.coord_dims(coord)[0]
-    coord.points = np.flip(coord.points)
-    if coord.bounds is not None:
-        coord.bounds = np.flip(coord.bounds, axis=0)
-    cube.data = da.flip(cube.core_data(), axis=coord_idx)
+    coord.points = coord.core_points()[::-1]
+    if coord.has_bounds():
+        coord.bounds = coord.core_bounds()[::-1]
+    slices = [slice(None)] * cube.ndim
+    slices[coord_idx] = slice(None, None, -1)
+    cube.data = cube.core_data()[tuple(slices)]
 
 
 def read_cmor_config(dataset):
@@ -142,34 +231,57 @@ def read_cmor_config(dataset):
     return cfg
 
 
-def save_variable(cube, var, outdir, attrs, **kwargs):
-    """Saver function."""
-    # CMOR standard
-    cube_time = cube.coord('time')
-    reftime = Unit(cube_time.units.origin, cube_time.units.calendar)
-    dates = reftime.num2date(cube_time.points[[0, -1]])
-    if len(cube_time.points) == 1:
-        year = str(dates[0].year)
-        time_suffix = '-'.join([year + '01', year + '12'])
+def save_variable(cube, var, outdir, attrs, access_pattern=None,
+                  split_by_year=False, **kwargs):
+    """Saver function.
+
+    Parameters
+    ----------
+    cube : iris.cube.Cube
+        Cube to be saved.
+    var : str
+        Short name of the variable.
+    outdir : str
+        Output directory.
+    attrs : dict
+        Global attributes used to build the file name.
+    access_pattern : str, optional
+        Expected access pattern of the output, either ``'timeseries'`` (read
+        long time series at a few grid points) or ``'maps'`` (read whole
+        fields at a few time steps). If given, the NetCDF4 chunk shape (and
+        the chunks of lazy data) are tuned for this pattern, unless
+        ``chunksizes`` is given explicitly.
+    split_by_year : bool, optional (default: False)
+        Write one file per year.
+    **kwargs
+        Keyword arguments passed to :func:`iris.save`, e.g. ``zlib``,
+        ``complevel``, ``shuffle``, ``chunksizes`` or
+        ``unlimited_dimensions``.
+
+    """
+    if split_by_year:
+        cubes = _split_by_year(cube)
     else:
-        date1 = str(dates[0].year) + '%02d' % dates[0].month
-        date2 = str(dates[1].year) + '%02d' % dates[1].month
-        time_suffix = '-'.join([date1, date2])
-
-    file_name = '_'.join([
-        attrs['project_id'],
-        attrs['dataset_id'],
-        attrs['modeling_realm'],
-        attrs['version'],
-        attrs['mip'],
-        var,
-        time_suffix,
-    ]) + '.nc'
-    file_path = os.path.join(outdir, file_name)
-    logger.info('Saving: %s', file_path)
-    status = 'lazy' if cube.has_lazy_data() else 'realized'
-    logger.info('Cube has %s data [lazy is preferred]', status)
-    iris.save(cube, file_path, fill_value=1e20, **kwargs)
+        cubes = [cube]
+    for single_cube in cubes:
+        save_kwargs = dict(kwargs)
+        if access_pattern is not None and 'chunksizes' not in kwargs:
+            save_kwargs['chunksizes'] = _get_chunksizes(
+                single_cube, access_pattern)
+        if save_kwargs.get('chunksizes') is not None:
+            save_kwargs['chunksizes'] = [
+                min(chunk, size) for (chunk, size) in zip(
+                    save_kwargs['chunksizes'], single_cube.shape)
+            ]
+            if single_cube.has_lazy_data():
+                # Align the dask chunks with the NetCDF chunks so that every
+                # chunk is computed and written only once
+                dask_chunks = _get_dask_chunks(single_cube,
+                                               save_kwargs['chunksizes'])
+                if dask_chunks is not None:
+                    single_cube = single_cube.copy(
+                        single_cube.lazy_data().rechunk(dask_chunks))
+        _save_cube(single_cube, var, outdir, attrs, **save_kwargs)
 
 
 def set_global_atts(cube, attrs):
@@ -229,11 +341,65 @@ def _fix_bounds(cube, dim_coord):
         cube.coord(dim_coord).guess_bounds()
 
     if cube.coord(dim_coord).has_bounds():
-        cube.coord(dim_coord).bounds = da.array(
-            cube.coord(dim_coord).core_bounds(), dtype='float64')
+        cube.coord(dim_coord).bounds = (
+            cube.coord(dim_coord).core_bounds().astype('float64', copy=False))
     return cube
 
 
+def _get_grid_hash(cube):
+    """Get hash of the horizontal grid of a cube."""
+    grid_hash = hashlib.sha1()
+    for axis in ('x', 'y'):
+        coord = cube.coord(axis=axis, dim_coords=True)
+        grid_hash.update(str(coord.units).encode())
+        grid_hash.update(str(coord.coord_system).encode())
+        grid_hash.update(np.asarray(coord.points, dtype=np.float64).tobytes())
+        if coord.has_bounds():
+            grid_hash.update(
+                np.asarray(coord.bounds, dtype=np.float64).tobytes())
+    return grid_hash.hexdigest()
+
+
+def _get_target_cube(cube, spec, scheme):
+    """Get cube on the target grid of a cell specification.
+
+    A single horizontal slice is regridded with
+    :func:`esmvalcore.preprocessor.regrid`, so that the target grid (and its
+    coordinate system) is identical to the one used there.
+
+    """
+    xcoord = cube.coord(axis='x', dim_coords=True)
+    ycoord = cube.coord(axis='y', dim_coords=True)
+    template = next(cube.slices([ycoord, xcoord]))
+    return regrid(template, spec, scheme)
+
+
+def _load_regridder(key, cache_dir):
+    """Load pickled regridder from `cache_dir` (if available)."""
+    path = os.path.join(cache_dir, f'regridder_{key}.pickle')
+    if not os.path.isfile(path):
+        return None
+    logger.debug("Loading cached regridder %s", path)
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def _save_regridder(regridder, key, cache_dir):
+    """Pickle regridder to `cache_dir` (if possible)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'regridder_{key}.pickle')
+    tmp_path = f'{path}.{os.getpid()}'
+    try:
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(regridder, file)
+    except (pickle.PicklingError, TypeError, AttributeError) as exc:
+        logger.warning("Could not cache regridder in %s: %s", path, exc)
+        os.remove(tmp_path)
+        return
+    os.replace(tmp_path, path)
+    logger.debug("Cached regridder in %s", path)
+
+
 def _fix_dim_coordnames(cube):
     """Perform a check on dim coordinate names."""
     # first check for CMOR standard coord;
@@ -275,12 +441,120 @@ def _fix_dim_coordnames(cube):
     return cube
 
 
+def _split_by_year(cube):
+    """Split cube into one cube per year (without realizing data)."""
+    time_coord = cube.coord('time')
+    time_dim = cube.coord_dims(time_coord)[0]
+    years = np.array(
+        [date.year for date in time_coord.units.num2date(time_coord.points)])
+    cubes = []
+    for year in np.unique(years):
+        slices = [slice(None)] * cube.ndim
+        slices[time_dim] = np.where(years == year)[0]
+        cubes.append(cube[tuple(slices)])
+    return cubes
+
+
 def _roll_cube_data(cube, shift, axis):
-    """Roll a cube data on specified axis."""
-    cube.data = da.roll(cube.core_data(), shift, axis=axis)
+    """Roll a cube data on specified axis.
+
+    The data is rolled lazily, so realized data is not copied until the cube
+    is saved.
+    """
+    cube.data = da.roll(cube.lazy_data(), shift, axis=axis)
     return cube
 
 
+def _get_chunksizes(cube, access_pattern):
+    """Get NetCDF4 chunk shape for the given access pattern."""
+    if access_pattern not in ('timeseries', 'maps'):
+        raise ValueError(
+            f"Expected 'timeseries' or 'maps' for access_pattern, got "
+            f"'{access_pattern}'")
+    shape = list(cube.shape)
+    chunks = [1] * len(shape)
+    max_size = max(_CHUNK_BYTES // cube.dtype.itemsize, 1)
+    time_dims = cube.coord_dims('time') if cube.coords('time') else ()
+    horizontal_dims = [
+        dim for dim in range(cube.ndim)[-2:] if dim not in time_dims
+    ]
+    if access_pattern == 'timeseries':
+        for dim in time_dims:
+            chunks[dim] = min(shape[dim], max_size)
+        size = int(np.prod(chunks))
+        edge = max(int(np.sqrt(max_size // size)), 1)
+        for dim in horizontal_dims:
+            chunks[dim] = min(shape[dim], edge)
+    else:
+        size = 1
+        for dim in horizontal_dims[::-1]:
+            chunks[dim] = min(shape[dim], max(max_size // size, 1))
+            size *= chunks[dim]
+    return chunks
+
+
+def _get_dask_chunks(cube, chunksizes):
+    """Get dask chunks aligned with the NetCDF4 chunks.
+
+    The dask chunks are multiples of the NetCDF4 chunks close to the current
+    dask chunks. They are shrunk (down to the NetCDF4 chunks) to stay below
+    the dask chunk size limit (``array.chunk-size``). Returns `None` if this
+    is not possible, in which case the dask chunks should be left as they are.
+    """
+    max_bytes = dask.utils.parse_bytes(
+        dask.config.get('array.chunk-size', '128MiB'))
+    max_size = max(max_bytes // cube.dtype.itemsize, 1)
+    chunks = [
+        max(nc_chunk, dask_chunk // nc_chunk * nc_chunk) for (
+            nc_chunk,
+            dask_chunk) in zip(chunksizes, cube.lazy_data().chunksize)
+    ]
+    for dim in reversed(range(len(chunks))):
+        size = int(np.prod(chunks))
+        if size <= max_size:
+            break
+        other_size = size // chunks[dim]
+        chunks[dim] = max(chunksizes[dim],
+                          max_size // other_size // chunksizes[dim] *
+                          chunksizes[dim])
+    if int(np.prod(chunks)) > max_size:
+        logger.debug(
+            "Not aligning dask chunks with NetCDF4 chunks %s, chunks would "
+            "exceed %s elements", chunksizes, max_size)
+        return None
+    return chunks
+
+
+def _save_cube(cube, var, outdir, attrs, **kwargs):
+    """Save single cube following the CMOR file naming."""
+    # CMOR standard
+    cube_time = cube.coord('time')
+    reftime = Unit(cube_time.units.origin, cube_time.units.calendar)
+    dates = reftime.num2date(cube_time.points[[0, -1]])
+    if len(cube_time.points) == 1:
+        year = str(dates[0].year)
+        time_suffix = '-'.join([year + '01', year + '12'])
+    else:
+        date1 = str(dates[0].year) + '%02d' % dates[0].month
+        date2 = str(dates[1].year) + '%02d' % dates[1].month
+        time_suffix = '-'.join([date1, date2])
+
+    file_name = '_'.join([
+        attrs['project_id'],
+        attrs['dataset_id'],
+        attrs['modeling_realm'],
+        attrs['version'],
+        attrs['mip'],
+        var,
+        time_suffix,
+    ]) + '.nc'
+    file_path = os.path.join(outdir, file_name)
+    logger.info('Saving: %s', file_path)
+    status = 'lazy' if cube.has_lazy_data() else 'realized'
+    logger.info('Cube has %s data [lazy is preferred]', status)
+    iris.save(cube, file_path, fill_value=1e20, **kwargs)
+
+
 def _set_units(cube, units):
     """Set units in compliance with cf_unit."""
     special = {'psu': 1.e-3, 'Sv': '1e6 m3 s-1'}
@@ -13,14 +13,17 @@ to make a rms table of a particular region.
 """
 
 import os
-import math
 import logging
-import numpy.ma as ma
-import iris
-from esmvaltool.diag_scripts.autoassess._valmod_radiation import area_avg
+import numpy as np
 
 logger = logging.getLogger(os.path.basename(__file__))
 
+# Missing data value of the RMS tables
+_MISSING = 1e+20
+
+# Region weights of the grids already seen, keyed on regions and grid
+_REGION_WEIGHTS = {}
+
 
 class RMSLISTCLASS(list):
     """
@@ -145,74 +148,40 @@ class RMSCLASS:
         toplot_cube = (cube) cube that is to be plotted
         mask_cube = (cube) the mask to be applied (land/sea)
         """
-        # Make a copy of the input cube
-        working_cube = toplot_cube.copy()
+        return calc_rms_values([self], toplot_cube, mask_cube)[0]
 
-        # What type of plot is this
-        plot_type = 'lat_lon'
-        if not toplot_cube.coords(axis='x'):
-            plot_type = 'zonal_mean'
-        else:
-            if len(toplot_cube.coords(axis='x')[0].points) == 1:
-                plot_type = 'zonal_mean'
-        if not toplot_cube.coords(axis='y'):
-            plot_type = 'meridional_mean'
-        else:
-            if len(toplot_cube.coords(axis='y')[0].points) == 1:
-                plot_type = 'meridional_mean'
+    def get_weights(self, toplot_cube, mask_cube, plot_type):
+        """
+        Get the area weights of the grid points inside this region.
+
+        Points outside the region (or masked out) have weight zero.
+        Returns None if the rms is not defined for this plot type.
+        toplot_cube = (cube) cube that is to be plotted
+        mask_cube = (cube) the mask to be applied (land/sea)
+        plot_type = (str) lat_lon, zonal_mean or meridional_mean
+        """
+        weights = _get_area_weights(toplot_cube)
 
         # Apply the mask but only for lat_lon plots
         if hasattr(self, 'mask_end'):
             if plot_type == 'lat_lon':
-                # Apply the mask
-                working_cube.data = \
-                    ma.masked_array(working_cube.data,
-                                    mask=(mask_cube.data > 0.5))
-
+                weights = np.where(mask_cube.data > 0.5, 0., weights)
             else:
                 # If there is a mask but we are using zonal
                 # mean or meridional mean, return missing
-                return 1e+20
+                return None
 
         # Extract a region
         if hasattr(self, 'region_bounds'):
+            lon_min, lat_min, lon_max, lat_max = self.region_bounds
+            if plot_type in ('lat_lon', 'meridional_mean'):
+                weights = weights * _inside(toplot_cube, 'longitude',
+                                            lon_min, lon_max)
+            if plot_type in ('lat_lon', 'zonal_mean'):
+                weights = weights * _inside(toplot_cube, 'latitude',
+                                            lat_min, lat_max)
 
-            # Extract just the latitudes you want
-            lonc = iris.Constraint()
-            latc = iris.Constraint()
-            if plot_type == 'lat_lon' or plot_type == 'meridional_mean':
-                lonc = iris.Constraint(
-                    longitude=lambda lon:
-                    self.region_bounds[0] <= lon <= self.region_bounds[2]
-                )
-            if plot_type == 'lat_lon' or plot_type == 'zonal_mean':
-                latc = iris.Constraint(
-                    latitude=lambda lat:
-                    self.region_bounds[1] <= lat <= self.region_bounds[3]
-                )
-            working_cube = working_cube.extract(lonc & latc)
-
-        # Check to see if we have any data left.
-        # If not then apply a missing data number.
-        amount_of_data = len(working_cube.data)
-        if hasattr(working_cube.data, 'compressed'):
-            amount_of_data = len(working_cube.data.compressed())
-        if amount_of_data == 0:
-            rms_float = 1e+20
-        else:
-            logger.info('Calculating RMS for %s', self.region)
-
-            # Square the values
-            squared_cube = working_cube**2
-
-            # Mean the values
-            area_average = area_avg(
-                squared_cube, coord1='latitude', coord2='longitude')
-
-            # Square root the answer
-            rms_float = math.sqrt(area_average.data)
-
-        return rms_float
+        return weights
 
     def calc_wrapper(self, toplot_cube, mask_cube, page_title):
         """
@@ -223,10 +192,19 @@ class RMSCLASS:
         page_title = (str) the page title for this plot
         """
         rms_float = self.calc(toplot_cube, mask_cube)
+        self.store(rms_float, page_title)
+        return rms_float
+
+    def store(self, rms_float, page_title):
+        """
+        Add an RMS value to its own data array.
+
+        rms_float = (float) the RMS value
+        page_title = (str) the page title for this plot
+        """
         self.data_dict[page_title] = []
         if rms_float:
             self.data_dict[page_title].append(rms_float)
-        return rms_float
 
     def tofile(self, csv_dir):
         """Output all the RMS statistics to csv files."""
@@ -281,6 +259,125 @@ def start(exper='experiment', control='control'):
     return rms_list
 
 
+def _get_plot_type(cube):
+    """Get the type of plot (lat_lon, zonal_mean or meridional_mean)."""
+    plot_type = 'lat_lon'
+    if not cube.coords(axis='x'):
+        plot_type = 'zonal_mean'
+    else:
+        if len(cube.coords(axis='x')[0].points) == 1:
+            plot_type = 'zonal_mean'
+    if not cube.coords(axis='y'):
+        plot_type = 'meridional_mean'
+    else:
+        if len(cube.coords(axis='y')[0].points) == 1:
+            plot_type = 'meridional_mean'
+    return plot_type
+
+
+def _broadcast_coord(cube, coord, values):
+    """Broadcast values along a 1D (or scalar) coord to the cube shape."""
+    dims = cube.coord_dims(coord)
+    shape = [1] * cube.ndim
+    for dim in dims:
+        shape[dim] = cube.shape[dim]
+    return np.broadcast_to(np.reshape(values, shape), cube.shape)
+
+
+def _get_area_weights(cube):
+    """Get the (unnormalised) grid cell areas of the cube."""
+    weights = np.ones(cube.shape)
+    for name, func in (('latitude', np.sin), ('longitude', lambda x: x)):
+        coord = cube.coord(name).copy()
+        if not coord.has_bounds():
+            coord.guess_bounds()
+        coord.convert_units('radians')
+        edges = func(coord.bounds)
+        weights = weights * _broadcast_coord(
+            cube, cube.coord(name), np.abs(edges[:, 1] - edges[:, 0]))
+    return weights
+
+
+def _inside(cube, name, lower, upper):
+    """
+    Get the cells of cube along coord name within [lower, upper].
+
+    Like an iris constraint, cells with bounds are inside if they overlap
+    the range, cells without bounds if their point is inside the range.
+    """
+    coord = cube.coord(name)
+    if coord.has_bounds():
+        cell_min = np.min(coord.bounds, axis=1)
+        cell_max = np.max(coord.bounds, axis=1)
+    else:
+        cell_min = cell_max = coord.points
+    return _broadcast_coord(cube, coord,
+                            (lower <= cell_max) & (cell_min <= upper))
+
+
+def _get_region_weights(rms_list, toplot_cube, mask_cube):
+    """
+    Get the weights of all regions stacked along a leading region axis.
+
+    The weights only depend on the grid and the land/sea mask, so they
+    are computed once per grid and reused for every field on that grid.
+    Regions without an rms for this plot type are flagged as missing.
+    """
+    plot_type = _get_plot_type(toplot_cube)
+    key = (tuple(rms.region for rms in rms_list), plot_type,
+           toplot_cube.shape)
+    for name in ('latitude', 'longitude'):
+        coord = toplot_cube.coord(name)
+        key += (coord.points.tobytes(), coord.core_bounds().tobytes()
+                if coord.has_bounds() else None, str(coord.units))
+    if plot_type == 'lat_lon':
+        key += (np.asarray(mask_cube.data > 0.5).tobytes(), )
+    if key not in _REGION_WEIGHTS:
+        weights = np.zeros((len(rms_list), ) + toplot_cube.shape)
+        missing = np.zeros(len(rms_list), dtype=bool)
+        for i, rms in enumerate(rms_list):
+            region_weights = rms.get_weights(toplot_cube, mask_cube,
+                                             plot_type)
+            if region_weights is None:
+                missing[i] = True
+            else:
+                weights[i] = region_weights
+        _REGION_WEIGHTS[key] = (weights, missing)
+    return _REGION_WEIGHTS[key]
+
+
+def calc_rms_values(rms_list, toplot_cube, mask_cube):
+    """
+    Calculate the rms values of a cube for all regions at once.
+
+    rms_list = list of rms classes of the regions
+    toplot_cube = (cube) cube that is to be plotted
+    mask_cube = (cube) the mask to be applied (land/sea)
+    Returns a list with the rms value of each region (1e+20 if missing).
+    """
+    weights, missing = _get_region_weights(rms_list, toplot_cube, mask_cube)
+    data = np.ma.asanyarray(toplot_cube.data)
+    valid = ~np.ma.getmaskarray(data)
+    squares = np.where(valid, np.ma.getdata(data), 0.)**2
+
+    # Area weighted mean of the squares of each region in one reduction
+    weights = weights.reshape(len(rms_list), -1)
+    sum_of_weights = weights @ valid.ravel()
+    sum_of_squares = weights @ squares.ravel()
+    missing = missing | (sum_of_weights == 0.)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rms_values = np.sqrt(sum_of_squares / sum_of_weights)
+
+    rms_float_list = []
+    for rms, rms_float, no_data in zip(rms_list, rms_values, missing):
+        if no_data:
+            rms_float_list.append(_MISSING)
+        else:
+            logger.info('Calculating RMS for %s', rms.region)
+            rms_float_list.append(float(rms_float))
+    return rms_float_list
+
+
 def calc_all(rms_list, toplot_cube, mask_cube, page_title):
     """
     Loop through all the regions.
@@ -291,13 +388,10 @@ def calc_all(rms_list, toplot_cube, mask_cube, page_title):
     toplot_cube = (cube) cube that is to be plotted
     page_title = (str) the page title for this plot.
     """
-    # Run through the loop, calculating rms values for each region
-    rms_float_list = []
-    n_rms = len(rms_list)
-    for i in range(n_rms):
-        rms_float = rms_list[i].calc_wrapper(toplot_cube, mask_cube,
-                                             page_title)
-        rms_float_list.append(rms_float)
+    # Calculate the rms values of all regions at once
+    rms_float_list = calc_rms_values(rms_list, toplot_cube, mask_cube)
+    for rms, rms_float in zip(rms_list, rms_float_list):
+        rms.store(rms_float, page_title)
 
     # Return the global rms value
     return rms_float_list[0]
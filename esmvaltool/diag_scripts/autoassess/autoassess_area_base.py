@@ -27,6 +27,7 @@ import logging
 import importlib
 import csv
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import iris
 from esmvaltool.diag_scripts.shared import run_diagnostic
 
@@ -331,6 +332,8 @@ def _create_run_dict(cfg):
     run['end'] = cfg['end']
 
     # optional parameters
+    run['n_workers'] = cfg.get('n_workers')
+    run['obs_cache_dir'] = cfg.get('obs_cache_dir')
     if 'climfiles_root' in cfg:
         run['climfiles_root'] = cfg['climfiles_root']
     if 'additional_metrics' in cfg:
@@ -358,6 +361,44 @@ def _create_run_dict(cfg):
     return run
 
 
+def _run_suite_metrics(run_obj):
+    """
+    Run all metric functions of an area for one suite.
+
+    This is run in a separate process for every suite; all output is
+    written to the explicit output directories in `run_obj`.
+
+    Parameters
+    ----------
+    run_obj: dict
+        run dictionary with `runid` and `dump_output` set to the suite.
+
+    Returns
+    -------
+    dict of all metrics of the suite.
+
+    """
+    logger.info('Calculating metrics for %s', run_obj['runid'])
+    area_package = _import_package(run_obj['_area'])
+    all_metrics = {}
+
+    # run each metric function
+    for metric_function in area_package.metrics_functions:
+        logger.info('# Call: %s', metric_function)
+
+        # run the metric
+        metrics = metric_function(run_obj)
+        # check duplication
+        duplicate_metrics = list(
+            set(all_metrics.keys()) & set(metrics.keys()))
+        if duplicate_metrics:
+            raise AssertionError('Duplicate Metrics ' +
+                                 str(duplicate_metrics))
+        all_metrics.update(metrics)
+
+    return all_metrics
+
+
 def run_area(cfg):
     """
     Kick start the area diagnostic.
@@ -370,6 +411,11 @@ def run_area(cfg):
     are set in _create_run_dict; that function is the main gateway for
     this function.
 
+    The metrics of the different suites are computed in parallel, using
+    at most `n_workers` processes (optional parameter, defaults to the
+    number of CPUs); the metrics of each suite are written to
+    `metrics.csv` in the suite's output directory.
+
     Available assessment areas: stratosphere.
 
     Parameters
@@ -383,8 +429,8 @@ def run_area(cfg):
     area_out_dir = create_output_tree(run_obj['out_dir'], run_obj['suite_id1'],
                                       run_obj['suite_id2'], run_obj['_area'])
 
-    # the areas write all output to the cwd
-    os.chdir(area_out_dir)
+    # the areas write all output to area_out_dir
+    run_obj['area_out_dir'] = area_out_dir
 
     # import area here to allow removal of areas
     area_package = _import_package(run_obj['_area'])
@@ -395,33 +441,27 @@ def run_area(cfg):
         if run_obj['additional_metrics']:
             suite_ids.extend(run_obj['additional_metrics'])
 
-    # run the metrics generation
+    # run the metrics generation, one process per suite
+    suite_runs = {}
     for suite_id in suite_ids:
-        logger.info('Calculating metrics for %s', suite_id)
         # setup for file dumping
-        run_obj['runid'] = suite_id
-        run_obj['dump_output'] = os.path.join(area_out_dir, suite_id)
-        if not os.path.exists(run_obj['dump_output']):
-            os.makedirs(run_obj['dump_output'])
-        all_metrics = {}
-
-        # run each metric function
-        for metric_function in area_package.metrics_functions:
-            logger.info('# Call: %s', metric_function)
-
-            # run the metric
-            metrics = metric_function(run_obj)
-            # check duplication
-            duplicate_metrics = list(
-                set(all_metrics.keys()) & set(metrics.keys()))
-            if duplicate_metrics:
-                raise AssertionError('Duplicate Metrics ' +
-                                     str(duplicate_metrics))
-            all_metrics.update(metrics)
-
-        # write metrics to file
-        with open(os.path.join(run_obj['dump_output'], 'metrics.csv'),
-                  'w') as file_handle:
+        suite_run = dict(run_obj)
+        suite_run['runid'] = suite_id
+        suite_run['dump_output'] = os.path.join(area_out_dir, suite_id)
+        if not os.path.exists(suite_run['dump_output']):
+            os.makedirs(suite_run['dump_output'])
+        suite_runs[suite_id] = suite_run
+    with ProcessPoolExecutor(max_workers=run_obj['n_workers']) as executor:
+        futures = {
+            suite_id: executor.submit(_run_suite_metrics, suite_run)
+            for (suite_id, suite_run) in suite_runs.items()
+        }
+
+    # write metrics to file
+    for suite_id, future in futures.items():
+        all_metrics = future.result()
+        with open(os.path.join(suite_runs[suite_id]['dump_output'],
+                               'metrics.csv'), 'w') as file_handle:
             writer = csv.writer(file_handle)
             for metric in all_metrics.items():
                 writer.writerow(metric)
@@ -32,6 +32,18 @@ logger = logging.getLogger(os.path.basename(__file__))
 
 _CMIP_TYPE = 'CMIP5'
 
+# Land/sea mask cubes, keyed on file path
+_LANDSEA_MASKS = {}
+
+
+def _get_landsea_mask(cfg):
+    """Load the land/sea mask only once for all RMS computations."""
+    landsea_mask_file = os.path.join(
+        os.path.dirname(__file__), 'autoassess_source', cfg['landsea_mask'])
+    if landsea_mask_file not in _LANDSEA_MASKS:
+        _LANDSEA_MASKS[landsea_mask_file] = iris.load_cube(landsea_mask_file)
+    return _LANDSEA_MASKS[landsea_mask_file]
+
 
 def apply_rms(data_1, data_2, cfg, component_dict, var_name):
     """Compute RMS for any data1-2 combination."""
@@ -39,12 +51,12 @@ def apply_rms(data_1, data_2, cfg, component_dict, var_name):
     plot_title = var_name + ': ' + data_names[0] + ' vs ' + data_names[1]
     rms_list = start(data_names[0], data_names[1])
     analysis_type = cfg['analysis_type']
-    landsea_mask_file = os.path.join(
-        os.path.dirname(__file__), 'autoassess_source', cfg['landsea_mask'])
-    landsea_mask_cube = iris.load_cube(landsea_mask_file)
+    landsea_mask_cube = _get_landsea_mask(cfg)
     data1_vs_data2 = perform_equation(data_1, data_2, analysis_type)
 
-    # call to rms.calc_all() to compute rms; rms.end() to write results
+    # call to rms.calc_all() to compute rms; rms.end() to write results;
+    # the region weights are computed once per grid and reused for all
+    # data combinations on that grid
     calc_all(rms_list, data1_vs_data2, landsea_mask_cube, plot_title)
     end(rms_list, cfg['work_dir'])
 
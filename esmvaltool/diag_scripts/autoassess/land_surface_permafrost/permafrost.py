@@ -7,9 +7,9 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 import iris
+import iris.analysis.trajectory
 import iris.coord_categorisation
 import iris.quickplot as qplt
-import iris.util as ut
 
 from esmvaltool.diag_scripts.autoassess.loaddata import load_run_ss
 # from esmvaltool.diag_scripts.shared._supermeans import get_supermean
@@ -66,8 +66,7 @@ def land_permafrost_top(run):
     metrics.update(permafrost_area(soiltemp, airtemp, landfrac, run))
 
     # calculate the koven temperature metrics
-    metrics.update(koven_temp_offsets(soiltemp, airtemp))
-    metrics.update(koven_temp_atten(soiltemp, airtemp))
+    metrics.update(koven_temp_metrics(soiltemp, airtemp))
 
     return metrics
 
@@ -91,7 +90,10 @@ def permafrost_area(soiltemp, airtemp, landfrac, run):
     # Make an aggregator to define the permafrost extent
     # I dont really understand this but it works
     frozen_count = iris.analysis.Aggregator(
-        'frozen_count', num_frozen, units_func=lambda units: 1)
+        'frozen_count',
+        num_frozen,
+        units_func=lambda units: 1,
+        lazy_func=lazy_num_frozen)
 
     # Calculate the permafrost locations
     pf_periods = soiltemp.collapsed(
@@ -146,7 +148,9 @@ def permafrost_area(soiltemp, airtemp, landfrac, run):
     qplt.contour(airtemp, levels, colors='k', linewidths=3)
     plt.title('Permafrost extent & zero degree isotherm ({})'.format(
         run['runid']))
-    plt.savefig('pf_extent_north_america_' + run['runid'] + '.png')
+    plt.savefig(
+        os.path.join(run['area_out_dir'],
+                     'pf_extent_north_america_' + run['runid'] + '.png'))
 
     # Figure Permafrost extent asia
     plt.figure(figsize=(8, 8))
@@ -160,7 +164,8 @@ def permafrost_area(soiltemp, airtemp, landfrac, run):
     qplt.contour(airtemp, levels, colors='k', linewidths=3)
     plt.title('Permafrost extent & zero degree isotherm ({})'.format(
         run['runid']))
-    plt.savefig('pf_extent_asia_' + run['runid'] + '.png')
+    plt.savefig(os.path.join(run['area_out_dir'],
+                             'pf_extent_asia_' + run['runid'] + '.png'))
 
     # defining metrics for return up to top level
     metrics = {
@@ -181,23 +186,58 @@ def num_frozen(data, threshold, axis, frozen_length):
 
     Generalised to operate on multiple time sequences arranged on a specific
     axis of a multidimensional array.
+
+    The sequences are streamed along the time axis, keeping only the
+    length of the current frozen run per sequence: a point ends a window
+    full of frozen values if the run reaching it is long enough. Masked
+    values do not interrupt a run, but a window needs at least one valid
+    value to be counted.
     """
     if axis < 0:
         # just cope with negative axis numbers
         axis += data.ndim
 
-    # Threshold the data to find the 'significant' points.
-    data_hits = data < threshold
-    # Make an array with data values "windowed" along the time axis.
-    hit_windows = ut.rolling_window(data_hits, window=frozen_length, axis=axis)
-    # Find the windows "full of True-s" (along the added 'window axis').
-    full_windows = np.all(hit_windows, axis=axis + 1)
-    # Count points fulfilling the condition (along the time axis).
-    frozen_point_counts = np.sum(full_windows, axis=axis, dtype=int)
+    shape = data.shape[:axis] + data.shape[axis + 1:]
+    run_length = np.zeros(shape, dtype=int)
+    valid_gap = np.full(shape, frozen_length, dtype=int)
+    frozen_point_counts = np.zeros(shape, dtype=int)
+    for values in np.moveaxis(data, axis, 0):
+        masked = np.ma.getmaskarray(values)
+        # Threshold the data to find the 'significant' points.
+        hits = masked | (np.ma.getdata(values) < threshold)
+        run_length = np.where(hits, run_length + 1, 0)
+        valid_gap = np.where(masked, valid_gap + 1, 0)
+        frozen_point_counts += ((run_length >= frozen_length) &
+                                (valid_gap < frozen_length))
+
+    # Sequences without any valid value have no count
+    all_masked = np.all(np.ma.getmaskarray(data), axis=axis)
+    if np.any(all_masked):
+        frozen_point_counts = np.ma.masked_array(frozen_point_counts,
+                                                 mask=all_masked)
 
     return frozen_point_counts
 
 
+def lazy_num_frozen(data, threshold, axis, frozen_length):
+    """
+    Count valid frozen points of lazy data chunk by chunk.
+
+    Every chunk holds the whole time axis for a part of the grid, so the
+    counts of the chunks are independent.
+    """
+    if axis < 0:
+        axis += data.ndim
+    data = data.rechunk({axis: -1})
+    return data.map_blocks(
+        num_frozen,
+        threshold=threshold,
+        axis=axis,
+        frozen_length=frozen_length,
+        drop_axis=axis,
+        dtype=int)
+
+
 # land fraction
 def get_landfr_mask(run):
     """Get the land fraction mask."""
@@ -249,39 +289,69 @@ def get_nonice_mask(run):
 
 
 def extract_sites(ex_points, cube):
-    """Extract points for the sites given."""
-    tempsite = cube.interpolate(ex_points, iris.analysis.Linear())
-    tempsite = np.diagonal(tempsite.data)
-    tempsite = np.ma.masked_array(tempsite)
-    tempsite = np.ma.masked_less(tempsite, 0.0)
-    return tempsite
+    """
+    Extract points for the sites given.
 
+    Returns a cube with the latitude and longitude dimensions replaced by a
+    trailing site dimension.
+    """
+    return iris.analysis.trajectory.interpolate(cube, ex_points,
+                                                method='linear')
+
+
+def _site_values(cube):
+    """Get the values at the sites, masking the missing ones."""
+    return np.ma.masked_less(cube.data, 0.0)
+
+
+def _interpolate_depths(cube, depths):
+    """Linearly interpolate (and extrapolate) to the given depths."""
+    return cube.interpolate([('depth', depths)], iris.analysis.Linear())
+
+
+def _ground_level(cube):
+    """Select the ground level of site data with a height dimension."""
+    if cube.ndim > 2:
+        cube = cube[:, 0]
+    return cube
 
-def koven_temp_offsets(soiltemp, airtemp):
-    """Define thermal offsets in Koven et al 2013."""
+
+def koven_temp_metrics(soiltemp, airtemp):
+    """
+    Define thermal offsets and attenuation ratios as in Koven et al 2013.
+
+    The soil and air temperatures are only read once at the sites, all
+    metrics are computed from the extracted site time series.
+    """
     # read in list of observed lats and lons from Koven paper
     ex_points = permafrost_koven_sites.site_points
 
+    # extract points for eachsite
+    soiltemp_sites = extract_sites(ex_points, soiltemp)
+    airtemp_sites = _ground_level(extract_sites(ex_points, airtemp))
+
+    metrics = {}
+    metrics.update(koven_temp_offsets(soiltemp_sites, airtemp_sites))
+    metrics.update(koven_temp_atten(soiltemp_sites, airtemp_sites))
+    return metrics
+
+
+def koven_temp_offsets(soiltemp_sites, airtemp_sites):
+    """Define thermal offsets in Koven et al 2013 from site data."""
     # interpolate to depth required
     # the soil temperatures are for the middle of the layer not the bottom of
     # the layer
-    soiltemp_surf = iris.analysis.interpolate.linear(soiltemp,
-                                                     [('depth', 0.0)])
-    soiltemp_1m = iris.analysis.interpolate.linear(soiltemp, [('depth', 1.0)])
-
-    # extract points for eachsite
-    airtemp_1d = extract_sites(ex_points, airtemp)
-    if len(airtemp_1d.shape) > 2:
-        airtemp_1d = airtemp_1d[:, :, 0]
-    soiltemp_surf_1d = extract_sites(ex_points, soiltemp_surf)
-    soiltemp_1m_1d = extract_sites(ex_points, soiltemp_1m)
+    soiltemp_depths = _interpolate_depths(soiltemp_sites, [0.0, 1.0])
+    soiltemp_surf_1d = _site_values(soiltemp_depths[:, 0])
+    soiltemp_1m_1d = _site_values(soiltemp_depths[:, 1])
+    airtemp_1d = _site_values(airtemp_sites)
 
     # assign metrics
     metrics = {}
-    metrics['offset 1m minus surface'] = np.median(soiltemp_1m_1d -
-                                                   soiltemp_surf_1d)
-    metrics['offset surface minus air'] = np.median(soiltemp_surf_1d -
-                                                    airtemp_1d)
+    metrics['offset 1m minus surface'] = np.ma.median(soiltemp_1m_1d -
+                                                      soiltemp_surf_1d)
+    metrics['offset surface minus air'] = np.ma.median(soiltemp_surf_1d -
+                                                       airtemp_1d)
     return metrics
 
 
@@ -294,36 +364,26 @@ def make_monthly_amp(cube):
     return cube_ampl
 
 
-def koven_temp_atten(soiltemp, airtemp):
+def koven_temp_atten(soiltemp_sites, airtemp_sites):
     """Define thermal attenuation ratios as in Koven et al 2013."""
-    # read in list of observed lats and lons from Koven paper
-    ex_points = permafrost_koven_sites.site_points
-
     # make amplitudes
-    airtemp_ampl = make_monthly_amp(airtemp)
-    soiltemp_ampl = make_monthly_amp(soiltemp)
+    airtemp_ampl = make_monthly_amp(airtemp_sites.copy())
+    soiltemp_ampl = make_monthly_amp(soiltemp_sites.copy())
 
     # interpolate the log to the correct depth
     soiltemp_log = iris.analysis.maths.log(soiltemp_ampl)
-    soiltemp_log_surf = iris.analysis.interpolate.linear(
-        soiltemp_log, [('depth', 0.0)])
-    soiltemp_ampl_surf = iris.analysis.maths.exp(soiltemp_log_surf)
-    soiltemp_log_1m = iris.analysis.interpolate.linear(soiltemp_log,
-                                                       [('depth', 1.0)])
-    soiltemp_ampl_1m = iris.analysis.maths.exp(soiltemp_log_1m)
+    soiltemp_ampl_depths = iris.analysis.maths.exp(
+        _interpolate_depths(soiltemp_log, [0.0, 1.0]))
 
-    # extract points for eachsite
-    airtemp_ampl_1d = extract_sites(ex_points, airtemp_ampl)
-    if len(airtemp_ampl_1d.shape) > 1:
-        airtemp_ampl_1d = airtemp_ampl_1d[:, 0]
-    soiltemp_ampl_surf_1d = extract_sites(ex_points, soiltemp_ampl_surf)
-    soiltemp_ampl_1m_1d = extract_sites(ex_points, soiltemp_ampl_1m)
+    airtemp_ampl_1d = _site_values(airtemp_ampl)
+    soiltemp_ampl_surf_1d = _site_values(soiltemp_ampl_depths[0])
+    soiltemp_ampl_1m_1d = _site_values(soiltemp_ampl_depths[1])
 
     # assign metrics
     metrics = {}
-    metrics['attenuation 1m over surface'] = np.median(
+    metrics['attenuation 1m over surface'] = np.ma.median(
         soiltemp_ampl_1m_1d / soiltemp_ampl_surf_1d)
-    metrics['attenuation surface over air'] = np.median(
+    metrics['attenuation surface over air'] = np.ma.median(
         soiltemp_ampl_surf_1d / airtemp_ampl_1d)
 
     return metrics
@@ -11,55 +11,105 @@ Unified Model Documentation Paper F03: "Input and Output File Formats"
 available here: https://code.metoffice.gov.uk/doc/um/vn10.5/umdp.html.
 """
 
+import hashlib
 import os.path
 import re
 import datetime
-from datetime import timedelta as td
+from collections import OrderedDict
 from datetime import datetime as dd
 
 import cf_units
 import iris
 import iris.coord_categorisation as coord_cat
+import numpy as np
+
+from esmvaltool.diag_scripts.shared import FileCache
+
+# Catalogues of the loaded cube lists
+_CATALOGUES = FileCache()
+
+# Averaging periods of the most recently classified time coordinates, keyed
+# on time units and a hash of the bounds (least recently used first)
+_PERIODS = OrderedDict()
+_MAX_PERIODS = 256
+
+
+def _get_time_bound_lengths(time_coord):
+    """Return the lengths of all time bounds in days."""
+    step = time_coord.units.origin.split(' since ')[0]
+    to_days = cf_units.Unit(step).convert(1., 'days')
+    bounds = time_coord.bounds
+    return (bounds[:, 1] - bounds[:, 0]) * to_days
+
+
+def _classify_time_bounds(time_coord):
+    """
+    Classify the averaging period of a time coordinate.
+
+    The classification is done with array operations on the lengths of the
+    time bounds and cached (for the last `_MAX_PERIODS` coordinates), keyed
+    on a hash of the bounds and the time units.
+
+    :param Coord time_coord: Time coordinate with bounds.
+    :returns: One of 'daily', 'monthly', 'seasonal' and 'annual', or `None`
+        if the bounds do not correspond to a single averaging period.
+    :rtype: string
+    """
+    if not time_coord.has_bounds():
+        return None
+    bounds = np.ascontiguousarray(time_coord.bounds)
+    key = (time_coord.units.origin, time_coord.units.calendar,
+           bounds.dtype.str, bounds.shape,
+           hashlib.sha1(bounds.tobytes()).hexdigest())
+    if key in _PERIODS:
+        _PERIODS.move_to_end(key)
+        return _PERIODS[key]
+    lengths = _get_time_bound_lengths(time_coord)
+    year_lengths = [360., 365.]
+    if time_coord.units.calendar not in (cf_units.CALENDAR_360_DAY,
+                                         cf_units.CALENDAR_365_DAY,
+                                         cf_units.CALENDAR_NO_LEAP):
+        year_lengths.append(366.)
+    periods = {
+        # a day is 24 hours
+        'daily': np.isclose(lengths, 1.),
+        # a month is a period of at least 28 days, up to 31 days
+        'monthly': (lengths >= 28.) & (lengths <= 31.),
+        # a season is 3 months, i.e. at least 89 days, and up to 92 days
+        'seasonal': ((lengths >= 28. + 31. + 30.) &
+                     (lengths <= 31. + 30. + 31.)),
+        # a year is a period of 360 or 365 (366 in leap years) days
+        'annual': np.isin(lengths, year_lengths),
+    }
+    period = None
+    for (name, is_period) in periods.items():
+        if np.all(is_period):
+            period = name
+            break
+    _PERIODS[key] = period
+    if len(_PERIODS) > _MAX_PERIODS:
+        _PERIODS.popitem(last=False)
+    return period
 
 
 def is_daily(cube):
     """Test whether the time coordinate contains only daily bound periods."""
-    def is_day(bound):
-        """Check if day."""
-        time_span = td(hours=(bound[1] - bound[0]))
-        return td(days=1) == time_span
-
-    return all([is_day(bound) for bound in cube.coord('time').bounds])
+    return _classify_time_bounds(cube.coord('time')) == 'daily'
 
 
 def is_monthly(cube):
     """A month is a period of at least 28 days, up to 31 days."""
-    def is_month(bound):
-        """Check if month."""
-        time_span = td(days=(bound[1] - bound[0]))
-        return td(days=31) >= time_span >= td(days=28)
-
-    return all([is_month(bound) for bound in cube.coord('time').bounds])
+    return _classify_time_bounds(cube.coord('time')) == 'monthly'
 
 
 def is_seasonal(cube):
     """Season is 3 months, i.e. at least 89 days, and up to 92 days."""
-    def is_season(bound):
-        """Check if season."""
-        time_span = td(days=(bound[1] - bound[0]))
-        return td(days=31 + 30 + 31) >= time_span >= td(days=28 + 31 + 30)
-
-    return all([is_season(bound) for bound in cube.coord('time').bounds])
+    return _classify_time_bounds(cube.coord('time')) == 'seasonal'
 
 
 def is_yearly(cube):
     """A year is a period of at least 360 days, up to 366 days."""
-    def is_year(bound):
-        """Check if year."""
-        time_span = td(days=(bound[1] - bound[0]))
-        return td(days=365) == time_span or td(days=360) == time_span
-
-    return all([is_year(bound) for bound in cube.coord('time').bounds])
+    return _classify_time_bounds(cube.coord('time')) == 'annual'
 
 
 def is_time_mean(cube):
@@ -149,6 +199,14 @@ def annual_mean(mycube):
     return yr_mean.extract(t_bound)
 
 
+def _get_time_slice(cube):
+    """Return cube with the first element of all non-time dimensions."""
+    time_dims = cube.coord_dims('time')
+    slices = tuple(
+        slice(None) if dim in time_dims else 0 for dim in range(cube.ndim))
+    return cube[slices]
+
+
 def select_by_averaging_period(cubes, averaging_period):
     """
     Select subset from CubeList depending on averaging period.
@@ -167,15 +225,16 @@ def select_by_averaging_period(cubes, averaging_period):
         'seasonal': is_seasonal,
         'annual': is_yearly
     }
+    # only the time coordinate is needed for the classification
     if averaging_period == 'seasonal':
         selected_cubes = [
-            cube for cube in cubes
-            if select_period[averaging_period](seasonal_mean(cube))
+            cube for cube in cubes if select_period[averaging_period](
+                seasonal_mean(_get_time_slice(cube)))
         ]
     elif averaging_period == 'annual':
         selected_cubes = [
-            cube for cube in cubes
-            if select_period[averaging_period](annual_mean(cube))
+            cube for cube in cubes if select_period[averaging_period](
+                annual_mean(_get_time_slice(cube)))
         ]
     else:
         selected_cubes = [
@@ -328,6 +387,72 @@ def select_certain_months(cubes, lbmon):
         month_constraint)  # CubeList.extract returns always CubeList
 
 
+class CubeCatalogue:
+    """
+    Catalogue of the cubes in a `cubeList.nc` file.
+
+    The cube list is loaded once (with lazy data); cubes are indexed by
+    variable name and the results of the selections in `load_run_ss` are
+    cached, keyed on all selection parameters.
+
+    :param string path: Path to the `cubeList.nc` file.
+    """
+
+    def __init__(self, path):
+        """Load the cube list."""
+        self.path = path
+        self.cubes = iris.load(path)
+        self.cubes.sort(key=lambda c: c.standard_name)
+        self._by_variable_name = {}
+        self._selections = {}
+
+    def select_by_variable_name(self, variable_name):
+        """
+        Select copies of the cubes matching a CF-name or STASH code.
+
+        :param sting variable_name: CF-name or model-section-item STASH code.
+        :returns: CubeList with copies of the matching cubes.
+        :rtype: CubeList
+        """
+        if variable_name not in self._by_variable_name:
+            self._by_variable_name[variable_name] = select_by_variable_name(
+                self.cubes, variable_name)
+        return iris.cube.CubeList(
+            cube.copy() for cube in self._by_variable_name[variable_name])
+
+    def get_selection(self, key):
+        """Get copy of a previously selected cube (or `None`)."""
+        cube = self._selections.get(key)
+        if cube is None:
+            return None
+        return cube.copy()
+
+    def add_selection(self, key, cube):
+        """Cache a selected cube."""
+        self._selections[key] = cube.copy()
+
+
+def get_catalogue(cubelist_path):
+    """
+    Get the catalogue of a `cubeList.nc` file.
+
+    The catalogue is created on the first call and recreated when the file
+    has changed.
+
+    :param string cubelist_path: Path to the `cubeList.nc` file.
+    :returns: Catalogue of the cubes in the file.
+    :rtype: CubeCatalogue
+    """
+    return _CATALOGUES.get(cubelist_path, CubeCatalogue)
+
+
+def _to_key(value):
+    """Convert selection parameter to hashable key."""
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
 def get_time_offset(time_unit):
     """Return a datetime object equivalent to tunit."""
     # tunit e.g. 'day since 1950-01-01 00:00:00.0000000 UTC'
@@ -417,20 +542,27 @@ def load_run_ss(run_object,
     cubelist_path = os.path.join(run_object['data_root'], run_object['runid'],
                                  run_object['_area'], cubelist_file)
 
-    cubes = iris.load(cubelist_path)
-    cubes.sort(key=lambda c: c.standard_name)
-
-    return _load_run_ss(
-        cubes,
-        run_object,
-        averaging_period,
-        variable_name,
-        lbmon=lbmon,
-        lbproc=lbproc,
-        lblev=lblev,
-        lbtim=lbtim,
-        from_dt=from_dt,
-        to_dt=to_dt)
+    # the cube list is only loaded once per run, selections are cached
+    catalogue = get_catalogue(cubelist_path)
+    key = (averaging_period, variable_name, _to_key(lbmon), lbproc,
+           _to_key(lblev), _to_key(lbtim), from_dt, to_dt,
+           run_object.get('from_' + averaging_period),
+           run_object.get('to_' + averaging_period))
+    cube = catalogue.get_selection(key)
+    if cube is None:
+        cube = _load_run_ss(
+            catalogue.select_by_variable_name(variable_name),
+            run_object,
+            averaging_period,
+            variable_name,
+            lbmon=lbmon,
+            lbproc=lbproc,
+            lblev=lblev,
+            lbtim=lbtim,
+            from_dt=from_dt,
+            to_dt=to_dt)
+        catalogue.add_selection(key, cube)
+    return cube
 
 
 def _load_run_ss(cubes,
@@ -1,4 +1,5 @@
 """Stratospheric assessment code; ESMValTool-autoassess version."""
+import hashlib
 import logging
 import os
 
@@ -19,6 +20,13 @@ from .plotting import segment2list
 
 logger = logging.getLogger(__name__)
 
+# Version of the reduced observations in the on-disk cache; increase it
+# whenever the processing in calc_merra or calc_erai changes
+OBS_CACHE_VERSION = 1
+
+# Hashes of the observation files, keyed on path and file stamp
+_FILE_HASHES = {}
+
 # Candidates for general utility functions
 
 
@@ -48,6 +56,65 @@ def cmap_and_norm(cmap, levels, reverse=False):
     return colourmap, normalisation
 
 
+class MetricsContext:
+    """
+    Reductions of the zonal mean U, T and q cubes shared by the metrics.
+
+    Each reduction is computed on first use and then reused by all metric
+    functions needing it.
+    """
+
+    def __init__(self, ucube, tcube, qcube):
+        """Store the zonal mean cubes (keys 'u', 't' and 'q')."""
+        self.cubes = {'u': ucube, 't': tcube, 'q': qcube}
+        self._reductions = {}
+
+    def _reduce(self, key, func):
+        """Compute a reduction once, keyed on key."""
+        if key not in self._reductions:
+            self._reductions[key] = func()
+        return self._reductions[key]
+
+    def lat_ave(self, var, cube):
+        """Calculate the weighted latitudinal average of a cube of var."""
+        has_longitude = self._reduce(
+            (var, 'has_longitude'),
+            lambda: 'longitude' in
+            [cdt.standard_name for cdt in self.cubes[var].coords()])
+        if has_longitude:
+            return weight_lat_ave(cube)
+        return weight_cosine(cube)
+
+    def month_mean(self, month_number):
+        """Calculate the multi-annual mean U of a month."""
+        return self._reduce(
+            ('u', 'month_number', month_number),
+            lambda: self.cubes['u'].extract(
+                iris.Constraint(month_number=month_number)).collapsed(
+                    'time', iris.analysis.MEAN))
+
+    def season_mean(self, season):
+        """Calculate the multi-annual mean T of a season."""
+        t_seas_mean = self._reduce(
+            ('t', 'clim_season'),
+            lambda: self.cubes['t'].aggregated_by('clim_season',
+                                                  iris.analysis.MEAN))
+        return t_seas_mean.extract(iris.Constraint(clim_season=season))
+
+    def tropical_months(self, var, pressure):
+        """
+        Calculate multi-annual monthly means at one level from 10S to 10N.
+
+        Narrower equatorial bands can be extracted from the result.
+        """
+        return self._reduce(
+            (var, 'month', pressure),
+            lambda: self.cubes[var].extract(
+                iris.Constraint(latitude=lambda lat: -10 <= lat <= 10,
+                                air_pressure=pressure)).aggregated_by(
+                                    'month', iris.analysis.MEAN))
+
+
 def plot_zmean(cube, levels, title, log=False, ax1=None):
     """
     Plot zonal means.
@@ -166,62 +233,52 @@ def calc_qbo_index(qbo):
     # Translate upwards and downwards indices into U wind values
     periodsmin = counterup - kup
     periodsmax = counterdown - kdown
-    valsup = np.zeros(periodsmax)
-    valsdown = np.zeros(periodsmin)
-    for i in range(periodsmin):
-        valsdown[i] = np.amin(ufin[indiciesdown[i]:indiciesup[i + kup]])
-    for i in range(periodsmax):
-        valsup[i] = np.amax(ufin[indiciesup[i]:indiciesdown[i + kdown]])
+    valsdown = segment_extremes(ufin, indiciesdown[:periodsmin],
+                                indiciesup[kup:kup + periodsmin], np.minimum)
+    valsup = segment_extremes(ufin, indiciesup[:periodsmax],
+                              indiciesdown[kdown:kdown + periodsmax],
+                              np.maximum)
     # Calculate eastward QBO amplitude
-    counter = 0
-    totvals = 0
     # valsup limit was initially hardcoded to +10.0
-    for i in range(periodsmax):
-        if valsup[i] > 0.:
-            totvals = totvals + valsup[i]
-            counter = counter + 1
-    if counter == 0:
-        ampl_east = 0.
-    else:
-        totvals = totvals / counter
-        ampl_east = totvals
+    valsup = valsup[valsup > 0.]
+    ampl_east = np.mean(valsup) if valsup.size else 0.
     # Calculate westward QBO amplitude
-    counter = 0
-    totvals = 0
-    for i in range(periodsmin):
-        # valdown limit was initially hardcoded to -20.0
-        if valsdown[i] < 0.:
-            totvals = totvals + valsdown[i]
-            counter = counter + 1
-    if counter == 0:
-        ampl_west = 0.
-    else:
-        totvals = totvals / counter
-        ampl_west = -totvals
+    # valdown limit was initially hardcoded to -20.0
+    valsdown = valsdown[valsdown < 0.]
+    ampl_west = -np.mean(valsdown) if valsdown.size else 0.
     # Calculate QBO period, set to zero if no full oscillations in data
     period1 = 0.0
     period2 = 0.0
     if counterdown > 1:
-        period1 = (indiciesdown[counterdown - 1] - indiciesdown[0]) / (
-            counterdown - 1)
+        period1 = (indiciesdown[-1] - indiciesdown[0]) / (counterdown - 1)
     if counterup > 1:
-        period2 = (indiciesup[counterup - 1] - indiciesup[0]) / (counterup - 1)
+        period2 = (indiciesup[-1] - indiciesup[0]) / (counterup - 1)
     # Pick larger oscillation period
-    if period1 < period2:
-        period = period2
-    else:
-        period = period1
+    period = max(period1, period2)
     return (period, ampl_west, ampl_east)
 
 
-def flatten_list(list_):
+def segment_extremes(array, starts, ends, ufunc):
     """
-    Flatten list.
+    Reduce consecutive segments of a 1D array in one call.
+
+    Segment i is array[starts[i]:ends[i]]; the segments must be non-empty,
+    ascending and must not overlap.
 
-    Turn list of lists into a list of all elements.
-    [[1], [2, 3]] -> [1, 2, 3]
+    :param array: 1D array.
+    :param starts: Start indices of the segments.
+    :param ends: End indices (exclusive) of the segments.
+    :param ufunc: Reducing ufunc, e.g. numpy.minimum or numpy.maximum.
+    :returns: Array with the reduced value of each segment.
     """
-    return [item for sublist in list_ for item in sublist]
+    if not len(starts):
+        return np.zeros(0)
+    # reduceat reduces between consecutive indices: reduce over the
+    # segments and their gaps, then drop the gaps
+    bounds = np.ravel(np.column_stack((starts, ends)))
+    if bounds[-1] == len(array):
+        bounds = bounds[:-1]
+    return ufunc.reduceat(array, bounds)[::2]
 
 
 def find_zero_crossings(array):
@@ -245,16 +302,12 @@ def find_zero_crossings(array):
     # signed: [-1, 0, 1]
     # diff:   [ 1, 1]
     # sum:    [ 0, 2]
-    for i, d in enumerate(diff):
-        if i < len(diff) - 1:  # not last item
-            if d != 0 and d == diff[i + 1]:
-                diff[i + 1] = d + diff[i + 1]
-                diff[i] = 0
-
-    last_neg = np.argwhere(diff == 2)
-    last_pos = np.argwhere(diff == -2)
-    last_neg = flatten_list(last_neg)
-    last_pos = flatten_list(last_pos)
+    pairs = (diff[:-1] != 0) & (diff[:-1] == diff[1:])
+    diff[1:][pairs] += diff[:-1][pairs]
+    diff[:-1][pairs] = 0
+
+    last_neg = np.flatnonzero(diff == 2).tolist()
+    last_pos = np.flatnonzero(diff == -2).tolist()
     return last_pos, last_neg
 
 
@@ -283,7 +336,7 @@ def pnj_strength(cube, winter=True):
     return (pnj_max, pnj_min)
 
 
-def pnj_metrics(run, ucube, metrics):
+def pnj_metrics(run, context, metrics):
     """
     Calculate PNJ strength.
 
@@ -293,12 +346,10 @@ def pnj_metrics(run, ucube, metrics):
     # TODO side effect: changes metrics without returning
 
     # Extract U for January and average over years
-    jancube = ucube.extract(iris.Constraint(month_number=1))
-    jan_annm = jancube.collapsed('time', iris.analysis.MEAN)
+    jan_annm = context.month_mean(1)
 
     # Extract U for July and average over years
-    julcube = ucube.extract(iris.Constraint(month_number=7))
-    jul_annm = julcube.collapsed('time', iris.analysis.MEAN)
+    jul_annm = context.month_mean(7)
 
     # Calculate PNJ and ENJ strengths
     (jan_pnj, jan_enj) = pnj_strength(jan_annm, winter=True)
@@ -311,27 +362,28 @@ def pnj_metrics(run, ucube, metrics):
     metrics['Easterly jet: northern hem (July)'] = jul_enj.data
 
     # Plot U(Jan) and U(Jul)
-    plot_uwind(jan_annm, 'January', '{}_u_jan.png'.format(run['runid']))
-    plot_uwind(jul_annm, 'July', '{}_u_jul.png'.format(run['runid']))
+    plot_uwind(
+        jan_annm, 'January',
+        os.path.join(run['area_out_dir'], '{}_u_jan.png'.format(run['runid'])))
+    plot_uwind(
+        jul_annm, 'July',
+        os.path.join(run['area_out_dir'], '{}_u_jul.png'.format(run['runid'])))
 
 
-def qbo_metrics(run, ucube, metrics):
+def qbo_metrics(run, context, metrics):
     """Routine to calculate QBO metrics from zonal mean U."""
     # TODO side effect: changes metrics without returning
     # Extract equatorial zonal mean U
     tropics = iris.Constraint(latitude=lambda lat: -5 <= lat <= 5)
     p30 = iris.Constraint(air_pressure=3000.)
-    ucube_cds = [cdt.standard_name for cdt in ucube.coords()]
-    if 'longitude' in ucube_cds:
-        qbo = weight_lat_ave(ucube.extract(tropics))
-    else:
-        qbo = weight_cosine(ucube.extract(tropics))
+    qbo = context.lat_ave('u', context.cubes['u'].extract(tropics))
     qbo30 = qbo.extract(p30)
 
-    # write results to current working directory
+    # write results to area output directory
     outfile = '{0}_qbo30_{1}.nc'
     with iris.FUTURE.context(netcdf_no_unlimited=True):
-        iris.save(qbo30, outfile.format(run['runid'], run['period']))
+        iris.save(qbo30, os.path.join(run['area_out_dir'], outfile.format(
+            run['runid'], run['period'])))
 
     # Calculate QBO metrics
     (period, amp_west, amp_east) = calc_qbo_index(qbo30)
@@ -342,10 +394,12 @@ def qbo_metrics(run, ucube, metrics):
     metrics['QBO amplitude at 30 hPa (eastward)'] = amp_east
 
     # Plot QBO and timeseries of QBO at 30hPa
-    plot_qbo(qbo, '{}_qbo.png'.format(run['runid']))
+    plot_qbo(qbo,
+             os.path.join(run['area_out_dir'],
+                          '{}_qbo.png'.format(run['runid'])))
 
 
-def tpole_metrics(run, tcube, metrics):
+def tpole_metrics(run, context, metrics):
     """
     Compute 50hPa polar temp.
 
@@ -355,11 +409,10 @@ def tpole_metrics(run, tcube, metrics):
     """
     # TODO side effect: changes metrics without returning
     # Calculate and extract seasonal mean temperature
-    t_seas_mean = tcube.aggregated_by('clim_season', iris.analysis.MEAN)
-    t_djf = t_seas_mean.extract(iris.Constraint(clim_season='djf'))
-    t_mam = t_seas_mean.extract(iris.Constraint(clim_season='mam'))
-    t_jja = t_seas_mean.extract(iris.Constraint(clim_season='jja'))
-    t_son = t_seas_mean.extract(iris.Constraint(clim_season='son'))
+    t_djf = context.season_mean('djf')
+    t_mam = context.season_mean('mam')
+    t_jja = context.season_mean('jja')
+    t_son = context.season_mean('son')
 
     # Calculate area averages over polar regions at 50hPa
     nhpole = iris.Constraint(latitude=lambda la: la >= 60,
@@ -367,17 +420,10 @@ def tpole_metrics(run, tcube, metrics):
     shpole = iris.Constraint(latitude=lambda la: la <= -60,
                              air_pressure=5000.0)
 
-    tcube_cds = [cdt.standard_name for cdt in tcube.coords()]
-    if 'longitude' in tcube_cds:
-        djf_polave = weight_lat_ave(t_djf.extract(nhpole))
-        mam_polave = weight_lat_ave(t_mam.extract(nhpole))
-        jja_polave = weight_lat_ave(t_jja.extract(shpole))
-        son_polave = weight_lat_ave(t_son.extract(shpole))
-    else:
-        djf_polave = weight_cosine(t_djf.extract(nhpole))
-        mam_polave = weight_cosine(t_mam.extract(nhpole))
-        jja_polave = weight_cosine(t_jja.extract(shpole))
-        son_polave = weight_cosine(t_son.extract(shpole))
+    djf_polave = context.lat_ave('t', t_djf.extract(nhpole))
+    mam_polave = context.lat_ave('t', t_mam.extract(nhpole))
+    jja_polave = context.lat_ave('t', t_jja.extract(shpole))
+    son_polave = context.lat_ave('t', t_son.extract(shpole))
 
     # Calculate metrics and add to metrics dictionary
     # TODO Why take off 180.0?
@@ -387,8 +433,12 @@ def tpole_metrics(run, tcube, metrics):
     metrics['50 hPa temperature: 90S-60S (SON)'] = son_polave.data - 180.
 
     # Plot T(DJF) and T(JJA)
-    plot_temp(t_djf, 'DJF', '{}_t_djf.png'.format(run['runid']))
-    plot_temp(t_jja, 'JJA', '{}_t_jja.png'.format(run['runid']))
+    plot_temp(
+        t_djf, 'DJF',
+        os.path.join(run['area_out_dir'], '{}_t_djf.png'.format(run['runid'])))
+    plot_temp(
+        t_jja, 'JJA',
+        os.path.join(run['area_out_dir'], '{}_t_jja.png'.format(run['runid'])))
 
 
 def mean_and_strength(cube):
@@ -415,25 +465,20 @@ def q_mean(cube):
     return (1000000. * 29. / 18.) * qmean.data  # ppmv
 
 
-def teq_metrics(run, tcube, metrics):
+def teq_metrics(run, context, metrics):
     """Routine to calculate equatorial 100hPa temperature metrics."""
     # Extract equatorial temperature at 100hPa
     equator = iris.Constraint(latitude=lambda lat: -2 <= lat <= 2)
-    p100 = iris.Constraint(air_pressure=10000.)
-    teq100 = tcube.extract(equator & p100)
 
     # Calculate area-weighted global monthly means from multi-annual data
-    t_months = teq100.aggregated_by('month', iris.analysis.MEAN)
-    tcube_cds = [cdt.standard_name for cdt in tcube.coords()]
-    if 'longitude' in tcube_cds:
-        t_months = weight_lat_ave(t_months)
-    else:
-        t_months = weight_cosine(t_months)
+    t_months = context.tropical_months('t', 10000.).extract(equator)
+    t_months = context.lat_ave('t', t_months)
 
-    # write results to current working directory
+    # write results to area output directory
     outfile = '{0}_teq100_{1}.nc'
     with iris.FUTURE.context(netcdf_no_unlimited=True):
-        iris.save(t_months, outfile.format(run['runid'], run['period']))
+        iris.save(t_months, os.path.join(run['area_out_dir'], outfile.format(
+            run['runid'], run['period'])))
 
     # Calculate metrics
     (tmean, tstrength) = mean_and_strength(t_months)
@@ -443,26 +488,18 @@ def teq_metrics(run, tcube, metrics):
     metrics['100 hPa equatorial temp (annual cycle strength)'] = tstrength
 
 
-def t_metrics(run, tcube, metrics):
+def t_metrics(run, context, metrics):
     """Routine to calculate 10S-10N 100hPa temperature metrics."""
     # TODO side effect: changes metrics without returning
-    # Extract 10S-10N temperature at 100hPa
-    equator = iris.Constraint(latitude=lambda lat: -10 <= lat <= 10)
-    p100 = iris.Constraint(air_pressure=10000.)
-    t100 = tcube.extract(equator & p100)
-
-    # Calculate area-weighted global monthly means from multi-annual data
-    t_months = t100.aggregated_by('month', iris.analysis.MEAN)
-    tcube_cds = [cdt.standard_name for cdt in tcube.coords()]
-    if 'longitude' in tcube_cds:
-        t_months = weight_lat_ave(t_months)
-    else:
-        t_months = weight_cosine(t_months)
+    # Extract 10S-10N temperature at 100hPa and calculate area-weighted
+    # global monthly means from multi-annual data
+    t_months = context.lat_ave('t', context.tropical_months('t', 10000.))
 
-    # write results to current working directory
+    # write results to area output directory
     outfile = '{0}_t100_{1}.nc'
     with iris.FUTURE.context(netcdf_no_unlimited=True):
-        iris.save(t_months, outfile.format(run['runid'], run['period']))
+        iris.save(t_months, os.path.join(run['area_out_dir'], outfile.format(
+            run['runid'], run['period'])))
 
     # Calculate metrics
     (tmean, tstrength) = mean_and_strength(t_months)
@@ -472,26 +509,18 @@ def t_metrics(run, tcube, metrics):
     metrics['100 hPa 10Sto10N temp (annual cycle strength)'] = tstrength
 
 
-def q_metrics(run, qcube, metrics):
+def q_metrics(run, context, metrics):
     """Routine to calculate 10S-10N 70hPa water vapour metrics."""
     # TODO side effect: changes metrics without returning
-    # Extract 10S-10N humidity at 100hPa
-    tropics = iris.Constraint(latitude=lambda lat: -10 <= lat <= 10)
-    p70 = iris.Constraint(air_pressure=7000.)
-    q70 = qcube.extract(tropics & p70)
+    # Extract 10S-10N humidity at 70hPa and calculate area-weighted
+    # global monthly means from multi-annual data
+    q_months = context.lat_ave('q', context.tropical_months('q', 7000.))
 
-    # Calculate area-weighted global monthly means from multi-annual data
-    q_months = q70.aggregated_by('month', iris.analysis.MEAN)
-    qcube_cds = [cdt.standard_name for cdt in qcube.coords()]
-    if 'longitude' in qcube_cds:
-        q_months = weight_lat_ave(q_months)
-    else:
-        q_months = weight_cosine(q_months)
-
-    # write results to current working directory
+    # write results to area output directory
     outfile = '{0}_q70_{1}.nc'
     with iris.FUTURE.context(netcdf_no_unlimited=True):
-        iris.save(q_months, outfile.format(run['runid'], run['period']))
+        iris.save(q_months, os.path.join(run['area_out_dir'], outfile.format(
+            run['runid'], run['period'])))
 
     # Calculate metrics
     qmean = q_mean(q_months)
@@ -597,23 +626,26 @@ def mainfunc(run):
     if 'clim_season' not in aux_coord_names:
         icc.add_season(qcube, 'time', name='clim_season')
 
+    # Reductions shared by the metrics are only computed once
+    context = MetricsContext(ucube, tcube, qcube)
+
     # Calculate PNJ metrics
-    pnj_metrics(run, ucube, metrics)
+    pnj_metrics(run, context, metrics)
 
     # Calculate QBO metrics
-    qbo_metrics(run, ucube, metrics)
+    qbo_metrics(run, context, metrics)
 
     # Calculate polar temperature metrics
-    tpole_metrics(run, tcube, metrics)
+    tpole_metrics(run, context, metrics)
 
     # Calculate equatorial temperature metrics
-    teq_metrics(run, tcube, metrics)
+    teq_metrics(run, context, metrics)
 
     # Calculate tropical temperature metrics
-    t_metrics(run, tcube, metrics)
+    t_metrics(run, context, metrics)
 
     # Calculate tropical water vapour metric
-    q_metrics(run, qcube, metrics)
+    q_metrics(run, context, metrics)
 
     # Summary metric
     summary_metric(metrics)
@@ -631,8 +663,8 @@ def multi_qbo_plot(run):
     # TODO avoid running mainfunc
 
     # Run mainfunc for each run.
-    # mainfunc returns metrics and writes results into an *.nc in the current
-    # working directory.
+    # mainfunc returns metrics and writes results into an *.nc in the area
+    # output directory.
     # To make this function indendent of previous call to mainfunc, mainfunc
     # is run again for each run in this function
     #
@@ -646,10 +678,12 @@ def multi_qbo_plot(run):
     infile = '{0}_qbo30_{1}.nc'
 
     # Create control filename
-    cntlfile = infile.format(run['suite_id1'], run['period'])
+    cntlfile = os.path.join(run['area_out_dir'],
+                            infile.format(run['suite_id1'], run['period']))
 
     # Create experiment filename
-    exptfile = infile.format(run['suite_id2'], run['period'])
+    exptfile = os.path.join(run['area_out_dir'],
+                            infile.format(run['suite_id2'], run['period']))
 
     # If no control data then stop ...
     if not os.path.exists(cntlfile):
@@ -672,7 +706,7 @@ def multi_qbo_plot(run):
     ax1.set_xlabel('Time', fontsize='small')
     ax1.set_ylabel('U (m/s)', fontsize='small')
     ax1.legend(loc='upper left', fontsize='small')
-    fig.savefig('qbo_30hpa.png')
+    fig.savefig(os.path.join(run['area_out_dir'], 'qbo_30hpa.png'))
     plt.close()
 
 
@@ -686,8 +720,8 @@ def multi_teq_plot(run):
     # TODO avoid running mainfunc
 
     # Run mainfunc for each run.
-    # mainfunc returns metrics and writes results into an *.nc in the current
-    # working directory.
+    # mainfunc returns metrics and writes results into an *.nc in the area
+    # output directory.
     # To make this function indendent of previous call to mainfunc, mainfunc
     # is run again for each run in this function
     #
@@ -699,10 +733,12 @@ def multi_teq_plot(run):
     infile = '{0}_teq100_{1}.nc'
 
     # Create control filename
-    cntlfile = infile.format(run['suite_id1'], run['period'])
+    cntlfile = os.path.join(run['area_out_dir'],
+                            infile.format(run['suite_id1'], run['period']))
 
     # Create experiment filename
-    exptfile = infile.format(run['suite_id2'], run['period'])
+    exptfile = os.path.join(run['area_out_dir'],
+                            infile.format(run['suite_id2'], run['period']))
 
     # If no control data then stop ...
     if not os.path.exists(cntlfile):
@@ -734,12 +770,98 @@ def multi_teq_plot(run):
     ax1.set_xticklabels(tmon.coord('month').points, fontsize='small')
     ax1.set_ylabel('T (K)', fontsize='small')
     ax1.legend(loc='upper left', fontsize='small')
-    fig.savefig('teq_100hpa.png')
+    fig.savefig(os.path.join(run['area_out_dir'], 'teq_100hpa.png'))
     plt.close()
 
 
+def _get_file_hash(path):
+    """Get the sha256 hash of the contents of a file."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _FILE_HASHES:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as file_:
+            for block in iter(lambda: file_.read(2**20), b''):
+                sha.update(block)
+        _FILE_HASHES[key] = sha.hexdigest()
+    return _FILE_HASHES[key]
+
+
+def _load_obs_cache(cache_file, key):
+    """Load reduced observations from the cache, None if not usable."""
+    try:
+        cubes = {cube.var_name: cube for cube in iris.load(cache_file)}
+        cubes = [cubes[name] for name in ('t', 'q')]
+    except (OSError, KeyError, ValueError) as exc:
+        logger.warning("Ignoring unreadable observation cache %s: %s",
+                       cache_file, exc)
+        return None
+    for cube in cubes:
+        if (cube.attributes.get('obs_cache_version') != OBS_CACHE_VERSION
+                or cube.attributes.get('obs_cache_key') != key):
+            logger.warning("Ignoring outdated observation cache %s",
+                           cache_file)
+            return None
+    return tuple(cube.data for cube in cubes)
+
+
+def _save_obs_cache(cache_file, key, t_data, q_data):
+    """Save reduced observations to the cache as compressed NetCDF."""
+    attributes = {'obs_cache_version': OBS_CACHE_VERSION,
+                  'obs_cache_key': key}
+    cubes = iris.cube.CubeList([
+        iris.cube.Cube(np.ma.asanyarray(t_data), var_name='t', units='K',
+                       attributes=attributes),
+        iris.cube.Cube(np.ma.asanyarray(q_data), var_name='q', units='1e-6',
+                       attributes=attributes),
+    ])
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    # write to a temporary file first, so concurrent runs never read a
+    # partially written cache
+    tmp_file = '{}.{}.tmp.nc'.format(cache_file[:-3], os.getpid())
+    iris.save(cubes, tmp_file, zlib=True)
+    os.replace(tmp_file, cache_file)
+
+
+def _cached_obs(run, name, calc_func):
+    """
+    Get reduced observations, using the on-disk cache if configured.
+
+    The cache is keyed on the hash of the observation file and the
+    processing parameters, so it can be shared between model runs.
+    """
+    cache_dir = run.get('obs_cache_dir')
+    if not cache_dir:
+        return calc_func(run)
+    obsfile = os.path.join(run['clim_root'], 'ERA-Interim_cubeList.nc')
+    params = (name, OBS_CACHE_VERSION, _get_file_hash(obsfile),
+              run['from_monthly'].isoformat(), run['to_monthly'].isoformat())
+    key = hashlib.sha256(repr(params).encode()).hexdigest()
+    cache_file = os.path.join(
+        os.path.expanduser(cache_dir), '{}_{}.nc'.format(name, key[:16]))
+    if os.path.exists(cache_file):
+        result = _load_obs_cache(cache_file, key)
+        if result is not None:
+            logger.info("Using cached %s observations from %s", name,
+                        cache_file)
+            return result
+    result = calc_func(run)
+    _save_obs_cache(cache_file, key, *result)
+    return result
+
+
 def calc_merra(run):
     """Use MERRA as obs to compare."""
+    return _cached_obs(run, 'merra', _calc_merra)
+
+
+def calc_erai(run):
+    """Use ERA-Interim as obs to compare."""
+    return _cached_obs(run, 'erai', _calc_erai)
+
+
+def _calc_merra(run):
+    """Calculate MERRA obs to compare."""
     # Load data
     merrafile = os.path.join(run['clim_root'], 'ERA-Interim_cubeList.nc')
     (t, q) = iris.load_cubes(merrafile,
@@ -798,8 +920,8 @@ def calc_merra(run):
     return tmerra, qmerra
 
 
-def calc_erai(run):
-    """Use ERA-Interim as obs to compare."""
+def _calc_erai(run):
+    """Calculate ERA-Interim obs to compare."""
     # Load data
     eraifile = os.path.join(run['clim_root'], 'ERA-Interim_cubeList.nc')
     (t, q) = iris.load_cubes(eraifile,
@@ -826,8 +948,8 @@ def multi_t100_vs_q70_plot(run):
     # TODO avoid running mainfunc
 
     # Run mainfunc for each run.
-    # mainfunc returns metrics and writes results into an *.nc in the current
-    # working directory.
+    # mainfunc returns metrics and writes results into an *.nc in the area
+    # output directory.
     # To make this function indendent of previous call to mainfunc, mainfunc
     # is run again for each run in this function
     #
@@ -840,12 +962,16 @@ def multi_t100_vs_q70_plot(run):
     q_file = '{0}_q70_{1}.nc'
 
     # Create control filenames
-    t_cntl = t_file.format(run['suite_id1'], run['period'])
-    q_cntl = q_file.format(run['suite_id1'], run['period'])
+    t_cntl = os.path.join(run['area_out_dir'],
+                          t_file.format(run['suite_id1'], run['period']))
+    q_cntl = os.path.join(run['area_out_dir'],
+                          q_file.format(run['suite_id1'], run['period']))
 
     # Create experiment filenames
-    t_expt = t_file.format(run['suite_id2'], run['period'])
-    q_expt = q_file.format(run['suite_id2'], run['period'])
+    t_expt = os.path.join(run['area_out_dir'],
+                          t_file.format(run['suite_id2'], run['period']))
+    q_expt = os.path.join(run['area_out_dir'],
+                          q_file.format(run['suite_id2'], run['period']))
 
     # If no control data then stop ...
     if not os.path.exists(t_cntl):
@@ -938,5 +1064,5 @@ def multi_t100_vs_q70_plot(run):
         ax1.scatter(tmean, qmean, s=100, label=label, marker='v')
 
     ax1.legend(loc='upper right', scatterpoints=1, fontsize='medium')
-    fig.savefig('t100_vs_q70.png')
+    fig.savefig(os.path.join(run['area_out_dir'], 't100_vs_q70.png'))
     plt.close()
@@ -5,7 +5,10 @@
 Description
 -----------
 Calculate the effective climate sensitivity (ECS) using the regression method
-proposed by Andrews et al. (2012).
+proposed by Andrews et al. (2012). If gridded input data is given, the
+regression of the local TOA radiance against the global mean surface
+temperature is additionally calculated for every grid point, which gives maps
+of the local climate feedback parameter and forcing.
 
 Author
 ------
@@ -24,13 +27,15 @@ read_external_file : str, optional
 
 import logging
 import os
+from collections import namedtuple
 from pprint import pformat
 
 import cf_units
+import dask
+import dask.array as da
 import iris
 import numpy as np
 import yaml
-from scipy import stats
 
 from esmvaltool.diag_scripts.shared import (
     ProvenanceLogger, extract_variables, get_diagnostic_filename,
@@ -44,6 +49,22 @@ EXP_4XCO2 = {
     'CMIP6': 'abrupt-4xCO2',
 }
 
+LOCAL_VAR_ATTRS = [
+    {
+        'short_name': 'lambda_local',
+        'long_name': 'Local Climate Feedback Parameter',
+        'units': cf_units.Unit('W m-2 K-1'),
+    },
+    {
+        'short_name': 'forcing_local',
+        'long_name': 'Local Radiative Forcing',
+        'units': cf_units.Unit('W m-2'),
+    },
+]
+
+LinregressResult = namedtuple('LinregressResult',
+                              ['slope', 'intercept', 'rvalue'])
+
 
 def check_input_data(cfg):
     """Check input data."""
@@ -67,46 +88,200 @@ def check_input_data(cfg):
                                                       exps))
 
 
-def get_anomaly_data(tas_data, rtnt_data, dataset):
-    """Calculate anomaly data for both variables."""
+def _annual_mean(cube):
+    """Calculate lazy annual means of a cube with time as first dimension.
+
+    Returns
+    -------
+    tuple
+        Years (:class:`numpy.ndarray`) and annual means
+        (:class:`dask.array.Array`).
+
+    """
+    (years, index) = np.unique(cube.coord('year').points, return_inverse=True)
+    weights = np.zeros((len(years), cube.shape[0]))
+    weights[index.ravel(), np.arange(cube.shape[0])] = 1.0
+    weights /= np.sum(weights, axis=1, keepdims=True)
+    return (years, da.tensordot(weights, cube.lazy_data(), axes=1))
+
+
+def _get_area_weights(cube):
+    """Get normalized horizontal area weights of a gridded cube."""
+    cube = cube[0].copy()
+    for coord_name in ('latitude', 'longitude'):
+        if not cube.coord(coord_name).has_bounds():
+            cube.coord(coord_name).guess_bounds()
+    weights = iris.analysis.cartography.area_weights(cube)
+    return weights / np.sum(weights)
+
+
+def _global_mean(data, area_weights):
+    """Calculate area-weighted global mean of annual mean data."""
+    return np.tensordot(data, area_weights, axes=area_weights.ndim)
+
+
+def batch_linregress(x_data, y_data):
+    """Calculate many linear regressions in one pass.
+
+    The regressions are performed along the first axis. `x_data` needs to be
+    broadcastable to `y_data`, i.e. trailing dimensions can be used to
+    regress many time series (e.g. different models or grid points) at once.
+
+    Parameters
+    ----------
+    x_data : numpy.ndarray
+        Independent variable.
+    y_data : numpy.ndarray
+        Dependent variable.
+
+    Returns
+    -------
+    LinregressResult
+        Named tuple containing `slope`, `intercept` and `rvalue` as
+        :class:`numpy.ndarray`.
+
+    """
+    x_data = np.broadcast_to(x_data, y_data.shape)
+    x_anom = x_data - np.mean(x_data, axis=0)
+    y_anom = y_data - np.mean(y_data, axis=0)
+    ssx = np.sum(x_anom * x_anom, axis=0)
+    sxy = np.sum(x_anom * y_anom, axis=0)
+    ssy = np.sum(y_anom * y_anom, axis=0)
+    slope = sxy / ssx
+    intercept = np.mean(y_data, axis=0) - slope * np.mean(x_data, axis=0)
+    rvalue = np.clip(sxy / np.sqrt(ssx * ssy), -1.0, 1.0)
+    return LinregressResult(slope, intercept, rvalue)
+
+
+def _stacked_linregress(x_series, y_series):
+    """Calculate linear regressions for dictionaries of time series.
+
+    Time series with identical shapes are stacked along a new second axis
+    and regressed together.
+
+    """
+    groups = {}
+    for (key, y_data) in y_series.items():
+        groups.setdefault(y_data.shape, []).append(key)
+    results = {}
+    for keys in groups.values():
+        y_data = np.stack([y_series[key] for key in keys], axis=1)
+        x_data = np.stack([x_series[key] for key in keys], axis=1)
+        x_data = x_data.reshape(x_data.shape + (1, ) *
+                                (y_data.ndim - x_data.ndim))
+        reg = batch_linregress(x_data, y_data)
+        for (idx, key) in enumerate(keys):
+            results[key] = LinregressResult(*[val[idx] for val in reg])
+    return results
+
+
+def get_anomaly_data(tas_data, rtnt_data):
+    """Calculate anomaly data for both variables of all datasets.
+
+    All input files are read in a single pass, the linear fits of the
+    piControl runs of all datasets and variables are calculated together.
+
+    Returns
+    -------
+    dict
+        Dictionary with datasets as keys and a dictionary containing the
+        global mean anomalies `tas` and `rtnt` (:class:`iris.cube.Cube`),
+        the `rtnt` anomalies on the input grid `rtnt_grid`
+        (:class:`iris.cube.Cube`, only for gridded input data) and the
+        `ancestors` as values.
+
+    """
     project = tas_data[0]['project']
     exp_4xco2 = EXP_4XCO2[project]
-    paths = {
-        'tas_4x': select_metadata(tas_data, dataset=dataset, exp=exp_4xco2),
-        'tas_pi': select_metadata(tas_data, dataset=dataset, exp='piControl'),
-        'rtnt_4x': select_metadata(rtnt_data, dataset=dataset, exp=exp_4xco2),
-        'rtnt_pi': select_metadata(
-            rtnt_data, dataset=dataset, exp='piControl'),
-    }
-    ancestor_files = []
+    datasets = list(group_metadata(tas_data, 'dataset'))
+
+    # Lazy annual means of all datasets
+    anomaly_data = {}
     cubes = {}
-    for (key, [path]) in paths.items():
-        ancestor_files.append(path['filename'])
-        cube = iris.load_cube(path['filename'])
-        cube = cube.aggregated_by('year', iris.analysis.MEAN)
-        cubes[key] = cube
+    lazy_data = {}
+    years = {}
+    for dataset in datasets:
+        paths = {
+            'tas_4x': select_metadata(
+                tas_data, dataset=dataset, exp=exp_4xco2),
+            'tas_pi': select_metadata(
+                tas_data, dataset=dataset, exp='piControl'),
+            'rtnt_4x': select_metadata(
+                rtnt_data, dataset=dataset, exp=exp_4xco2),
+            'rtnt_pi': select_metadata(
+                rtnt_data, dataset=dataset, exp='piControl'),
+        }
+        anomaly_data[dataset] = {'ancestors': []}
+        for (key, [path]) in paths.items():
+            anomaly_data[dataset]['ancestors'].append(path['filename'])
+            cube = iris.load_cube(path['filename'])
+            cubes[(dataset, key)] = cube
+            (years[(dataset, key)],
+             lazy_data[(dataset, key)]) = _annual_mean(cube)
+        shapes = {lazy_data[(dataset, key)].shape for key in paths}
+        if len(shapes) > 1:
+            raise ValueError(
+                "Expected all cubes of dataset '{}' to have identical "
+                "shapes, got {}".format(dataset, sorted(shapes)))
+
+    # Read all data at once
+    keys = list(lazy_data)
+    data = dict(zip(keys, dask.compute(*[lazy_data[key] for key in keys])))
 
     # Substract linear fit of piControl run from abrupt4xCO2 experiment
-    shape = None
-    for cube in cubes.values():
-        if shape is None:
-            shape = cube.shape
-        else:
-            if cube.shape != shape:
-                raise ValueError(
-                    "Expected all cubes of dataset '{}' to have identical "
-                    "shapes, got {} and {}".format(dataset, shape, cube.shape))
-    tas_pi_reg = stats.linregress(cubes['tas_pi'].coord('year').points,
-                                  cubes['tas_pi'].data)
-    rtnt_pi_reg = stats.linregress(cubes['rtnt_pi'].coord('year').points,
-                                   cubes['rtnt_pi'].data)
-    cubes['tas_4x'].data -= (
-        tas_pi_reg.slope * cubes['tas_pi'].coord('year').points +
-        tas_pi_reg.intercept)
-    cubes['rtnt_4x'].data -= (
-        rtnt_pi_reg.slope * cubes['rtnt_pi'].coord('year').points +
-        rtnt_pi_reg.intercept)
-    return (cubes['tas_4x'], cubes['rtnt_4x'], ancestor_files)
+    pi_keys = [key for key in keys if key[1].endswith('_pi')]
+    pi_regs = _stacked_linregress(years, {key: data[key] for key in pi_keys})
+    for (dataset, pi_key) in pi_keys:
+        reg = pi_regs[(dataset, pi_key)]
+        x_data = years[(dataset, pi_key)].reshape(
+            (-1, ) + (1, ) * (data[(dataset, pi_key)].ndim - 1))
+        key = pi_key.replace('_pi', '_4x')
+        anom = data[(dataset, key)] - (reg.slope * x_data + reg.intercept)
+
+        # Global means and gridded anomalies
+        cube = cubes[(dataset, key)]
+        var = key.replace('_4x', '')
+        year_coord = iris.coords.DimCoord(
+            years[(dataset, key)],
+            var_name='year',
+            long_name='year',
+            units=cf_units.Unit('year'))
+        if cube.ndim > 1:
+            grid_cube = cube[:len(year_coord.points)].copy(anom)
+            grid_cube.remove_coord(grid_cube.coord(dimensions=0,
+                                                   dim_coords=True))
+            for coord in grid_cube.coords(dimensions=0):
+                grid_cube.remove_coord(coord)
+            grid_cube.add_dim_coord(year_coord.copy(), 0)
+            if var == 'rtnt':
+                anomaly_data[dataset]['rtnt_grid'] = grid_cube
+            anom = _global_mean(anom, _get_area_weights(cube))
+        anomaly_data[dataset][var] = iris.cube.Cube(
+            anom,
+            dim_coords_and_dims=[(year_coord, 0)],
+            **cube.metadata._asdict())
+    return anomaly_data
+
+
+def get_regressions(anomaly_data):
+    """Calculate ECS regressions of all datasets together.
+
+    Returns
+    -------
+    tuple of dict
+        Regression results of the global means and of the grid points
+        (only for gridded input data) for every dataset.
+
+    """
+    tas = {dataset: data['tas'].data for (dataset, data) in
+           anomaly_data.items()}
+    regs = _stacked_linregress(
+        tas, {dataset: data['rtnt'].data for (dataset, data) in
+              anomaly_data.items()})
+    grid_regs = _stacked_linregress(
+        tas, {dataset: data['rtnt_grid'].data for (dataset, data) in
+              anomaly_data.items() if 'rtnt_grid' in data})
+    return (regs, grid_regs)
 
 
 def get_provenance_record(caption):
@@ -227,6 +402,30 @@ def plot_ecs_regression(cfg, dataset_name, tas_cube, rtnt_cube, reg_stats):
     return (netcdf_path, provenance_record)
 
 
+def write_local_feedback(cfg, dataset_name, rtnt_grid_cube, reg_stats,
+                         ancestor_files):
+    """Write local climate feedback parameter and forcing of gridded data."""
+    for (var_attrs, data) in zip(LOCAL_VAR_ATTRS,
+                                 [-reg_stats.slope, reg_stats.intercept]):
+        cube = rtnt_grid_cube[0].copy(data)
+        cube.remove_coord('year')
+        cube.var_name = var_attrs['short_name']
+        cube.long_name = var_attrs['long_name']
+        cube.standard_name = None
+        cube.units = var_attrs['units']
+        cube.attributes['dataset'] = dataset_name
+        path = get_diagnostic_filename(
+            '{}_{}'.format(var_attrs['short_name'], dataset_name), cfg)
+        io.iris_save(cube, path)
+        provenance_record = get_provenance_record(
+            "{} (regression of local TOA radiance against global mean "
+            "surface temperature anomaly) for {}.".format(
+                var_attrs['long_name'], dataset_name))
+        provenance_record['ancestors'] = ancestor_files
+        with ProvenanceLogger(cfg) as provenance_logger:
+            provenance_logger.log(path, provenance_record)
+
+
 def write_data(ecs_data, feedback_parameter_data, ancestor_files, cfg):
     """Write netcdf files."""
     data = [ecs_data, feedback_parameter_data]
@@ -269,25 +468,33 @@ def main(cfg):
     tas_data = select_metadata(input_data, short_name='tas')
     rtnt_data = select_metadata(input_data, short_name='rtnt')
 
+    # Calculate anomalies and regressions of all datasets at once
+    if tas_data:
+        anomaly_data = get_anomaly_data(tas_data, rtnt_data)
+        (regs, grid_regs) = get_regressions(anomaly_data)
+    else:
+        anomaly_data = {}
+
     # Iterate over all datasets and save ECS and feedback parameter
-    for dataset in group_metadata(tas_data, 'dataset'):
+    for (dataset, data) in anomaly_data.items():
         logger.info("Processing %s", dataset)
-        (tas_cube, rtnt_cube, ancestor_files) = get_anomaly_data(
-            tas_data, rtnt_data, dataset)
-
-        # Perform linear regression
-        reg = stats.linregress(tas_cube.data, rtnt_cube.data)
+        reg = regs[dataset]
 
         # Plot ECS regression if desired
         (path, provenance_record) = plot_ecs_regression(
-            cfg, dataset, tas_cube, rtnt_cube, reg)
+            cfg, dataset, data['tas'], data['rtnt'], reg)
 
         # Provenance
         if path is not None:
-            provenance_record['ancestors'] = ancestor_files
+            provenance_record['ancestors'] = data['ancestors']
             with ProvenanceLogger(cfg) as provenance_logger:
                 provenance_logger.log(path, provenance_record)
 
+        # Local feedback parameter for gridded data
+        if dataset in grid_regs:
+            write_local_feedback(cfg, dataset, data['rtnt_grid'],
+                                 grid_regs[dataset], data['ancestors'])
+
         # Save data
         if cfg.get('read_external_file') and dataset in ecs:
             logger.info(
@@ -5,7 +5,8 @@
 Description
 -----------
 Calculate global temperature variability metric psi following Cox et al.
-(2018).
+(2018). If the input data is not averaged over the globe, psi is calculated
+for every grid point.
 
 Author
 ------
@@ -30,7 +31,6 @@ import os
 import cf_units
 import iris
 import numpy as np
-from scipy import stats
 
 from esmvaltool.diag_scripts.shared import (
     ProvenanceLogger, get_diagnostic_filename, group_metadata, io,
@@ -39,30 +39,90 @@ from esmvaltool.diag_scripts.shared import (
 logger = logging.getLogger(os.path.basename(__file__))
 
 
-def calculate_psi(cube, cfg):
-    """Calculate temperature variability metric psi for a given cube."""
-    window_length = cfg.get('window_length', 55)
-    lag = cfg.get('lag', 1)
-    psi_years = []
-    psis = []
+def _rolling_sum(array, window_length, n_windows):
+    """Sum `array` over `n_windows` moving windows along the first axis."""
+    cumsum = np.cumsum(array, axis=0)
+    cumsum = np.concatenate((np.zeros((1, ) + cumsum.shape[1:]), cumsum))
+    return (cumsum[window_length:window_length + n_windows] -
+            cumsum[:n_windows])
+
 
-    # Moving average
-    for yr_idx in range(cube.shape[0] - window_length):
-        slc = slice(yr_idx, yr_idx + window_length)
-        years = cube.coord('year').points[slc]
-        tas = np.copy(cube.data[slc])
+def _get_other_coords(cube):
+    """Get all coordinates of `cube` which do not span the first dimension."""
+    coords = []
+    for coord in cube.coords():
+        dims = cube.coord_dims(coord)
+        if dims and 0 not in dims:
+            coords.append((coord.copy(), dims))
+    return coords
 
-        # De-trend data
-        reg = stats.linregress(years, tas)
-        tas -= reg.slope * years + reg.intercept
 
-        # Autocorrelation
-        norm = np.sum(np.square(tas))
-        [autocorr] = np.correlate(tas[:-lag], tas[lag:], mode='valid') / norm
+def calculate_psi(cube, cfg):
+    """Calculate temperature variability metric psi for a given cube.
+
+    All moving windows are processed at once using rolling sums of the data,
+    the years and their (lagged) products. The first dimension of `cube`
+    needs to be `year`, all other dimensions (if any) are kept, i.e. a
+    gridded cube results in a psi map for every window.
 
-        # Psi
-        psi_years.append(years[-1])
-        psis.append(np.std(tas) / np.sqrt(-np.log(autocorr)))
+    """
+    window_length = cfg.get('window_length', 55)
+    lag = cfg.get('lag', 1)
+    n_windows = cube.shape[0] - window_length
+    if n_windows < 1:
+        raise ValueError(
+            "Time series with {:d} years is too short for window length "
+            "{:d}".format(cube.shape[0], window_length))
+
+    # Center data to avoid loss of precision in the rolling sums
+    years = cube.coord('year').points
+    mask = np.ma.getmaskarray(cube.data)
+    tas = np.ma.filled(cube.data, 0.0).astype(np.float64)
+    tas -= np.mean(tas, axis=0)
+    x_vals = (years - np.mean(years)).astype(np.float64)
+    x_vals = x_vals.reshape((-1, ) + (1, ) * (tas.ndim - 1))
+
+    def rolling(array, length=window_length):
+        return _rolling_sum(array, length, n_windows)
+
+    # Linear regression for every window
+    sum_x = rolling(x_vals)
+    sum_y = rolling(tas)
+    mean_x = sum_x / window_length
+    mean_y = sum_y / window_length
+    sxx = rolling(x_vals**2) - sum_x * mean_x
+    sxy = rolling(x_vals * tas) - sum_x * mean_y
+    syy = rolling(tas**2) - sum_y * mean_y
+    slope = sxy / sxx
+    intercept = mean_y - slope * mean_x
+
+    # Sum of squares of the de-trended data
+    norm = syy - slope * sxy
+
+    # Lagged sum of products of the de-trended data
+    # (residual = tas - slope * year - intercept)
+    lag_length = window_length - lag
+    x_head = x_vals[:-lag]
+    x_tail = x_vals[lag:]
+    y_head = tas[:-lag]
+    y_tail = tas[lag:]
+    lagged = (rolling(y_head * y_tail, lag_length) - slope *
+              (rolling(x_head * y_tail, lag_length) +
+               rolling(y_head * x_tail, lag_length)) + slope**2 *
+              rolling(x_head * x_tail, lag_length))
+    head = (rolling(y_head, lag_length) -
+            slope * rolling(x_head, lag_length))
+    tail = (rolling(y_tail, lag_length) -
+            slope * rolling(x_tail, lag_length))
+    lagged += (lag_length * intercept - head - tail) * intercept
+    autocorr = lagged / norm
+
+    # Psi
+    psis = np.sqrt(norm / window_length) / np.sqrt(-np.log(autocorr))
+    if mask.any():
+        psis = np.ma.masked_where(
+            rolling(mask.astype(np.float64)) > 0.0, psis)
+    psi_years = years[window_length - 1:window_length - 1 + n_windows]
 
     # Return new cube
     year_coord = iris.coords.DimCoord(
@@ -71,12 +131,17 @@ def calculate_psi(cube, cfg):
         long_name='year',
         units=cf_units.Unit('year'))
     psi_cube = iris.cube.Cube(
-        np.array(psis),
+        psis,
         dim_coords_and_dims=[(year_coord, 0)],
         attributes={
             'window_length': window_length,
             'lag': lag
         })
+    for (coord, dims) in _get_other_coords(cube):
+        if isinstance(coord, iris.coords.DimCoord):
+            psi_cube.add_dim_coord(coord, dims)
+        else:
+            psi_cube.add_aux_coord(coord, dims)
     return psi_cube
 
 
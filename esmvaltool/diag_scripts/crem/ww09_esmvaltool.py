@@ -46,6 +46,7 @@ Cloud Regime Error Metrics (CREM).
 import logging
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pprint import pformat
 
 import matplotlib.pyplot as plt
@@ -53,10 +54,22 @@ import numpy as np
 from netCDF4 import Dataset
 
 from esmvaltool.diag_scripts.shared import (
-    group_metadata, ProvenanceLogger, run_diagnostic, select_metadata)
+    get_file_stamp, group_metadata, ProvenanceLogger, run_diagnostic,
+    select_metadata)
 
 logger = logging.getLogger(os.path.basename(__file__))
 
+# number of time steps read and processed at once by crem_calc
+TIME_CHUNK = 90
+
+# maximum number of worker processes reading the input data concurrently
+# (lowered further by the optional parameter max_parallel_tasks)
+MAX_READ_WORKERS = 4
+
+# input files with a successfully validated grid, keyed on file stamp and
+# target grid
+_VALID_GRIDS = set()
+
 
 def main(cfg):
     """Run the diagnostic.
@@ -109,6 +122,10 @@ def main(cfg):
     # create list of dataset names (plot labels)
     models = []
 
+    # number of worker processes reading the input data
+    max_workers = min(MAX_READ_WORKERS,
+                      cfg.get('max_parallel_tasks') or MAX_READ_WORKERS)
+
     i = 0
     missing_vars = []
 
@@ -174,7 +191,7 @@ def main(cfg):
 
         # calculate CREM
 
-        (crem_pd, r_crem_pd) = crem_calc(pointers)
+        (crem_pd, r_crem_pd) = crem_calc(pointers, max_workers)
 
         crems[i] = crem_pd
 
@@ -284,7 +301,8 @@ def main(cfg):
         provenance_logger.log(oname, provenance_record)
 
 
-def read_and_check(srcfilename, varname, lons2, lats2, time2):
+def read_and_check(srcfilename, varname, lons2, lats2, time2,
+                   time_slice=slice(None)):
     """
     Function for reading and checking for correct regridding of input data.
 
@@ -300,41 +318,71 @@ def read_and_check(srcfilename, varname, lons2, lats2, time2):
         latitudes of target grid (ISCCP)
     time2: integer
         number of time steps
+    time_slice: slice, optional
+        time steps to read (default: all)
     """
+    check_grid(srcfilename, lons2, lats2, time2)
+    return read_data(srcfilename, varname, time_slice)
+
+
+def check_grid(srcfilename, lons2, lats2, time2):
+    """
+    Check that input data were regridded correctly.
+
+    Only the file header and coordinates are read. Files that passed the
+    check are remembered and not checked again.
+
+    Parameters
+    ----------
+    srcfilename : str
+        filename containing input data
+    lons2 : float
+        longitudes of target grid (ISCCP)
+    lats2 : float
+        latitudes of target grid (ISCCP)
+    time2: integer
+        number of time steps
+    """
+    key = (srcfilename, get_file_stamp(srcfilename), time2,
+           np.asarray(lons2).tobytes(), np.asarray(lats2).tobytes())
+    if key in _VALID_GRIDS:
+        return
+
     nlon = len(lons2)
     nlat = len(lats2)
 
-    src_dataset = Dataset(srcfilename, 'r')
+    with Dataset(srcfilename, 'r') as src_dataset:
 
-    n_time = len(src_dataset.variables['time'][:])
-    logger.debug('Number of data times in file %s is %i', srcfilename, n_time)
+        n_time = len(src_dataset.variables['time'])
+        logger.debug('Number of data times in file %s is %i', srcfilename,
+                     n_time)
 
-    # check number of time steps is matching
+        # check number of time steps is matching
 
-    if n_time != time2:
-        logger.error("error: number of time steps in input files are "
-                     "not equal")
-        raise Exception('Variables contain different number of time steps '
-                        '(see log file for details).')
+        if n_time != time2:
+            logger.error("error: number of time steps in input files are "
+                         "not equal")
+            raise Exception('Variables contain different number of time '
+                            'steps (see log file for details).')
 
-    grid_mismatch = False
-    coord_mismatch = False
+        grid_mismatch = False
+        coord_mismatch = False
 
-    # check longitudes
+        # check longitudes
 
-    lons = src_dataset.variables['lon'][:]
-    if nlon != len(lons):
-        grid_mismatch = True
-    if np.amax(np.absolute(lons - lons2)) > 1.0e-3:
-        coord_mismatch = True
+        lons = src_dataset.variables['lon'][:]
+        if nlon != len(lons):
+            grid_mismatch = True
+        if np.amax(np.absolute(lons - lons2)) > 1.0e-3:
+            coord_mismatch = True
 
-    # check latitudes
+        # check latitudes
 
-    lats = src_dataset.variables['lat'][:]
-    if nlat != len(lats):
-        grid_mismatch = True
-    if np.amax(np.absolute(lats - lats2)) > 1.0e-3:
-        coord_mismatch = True
+        lats = src_dataset.variables['lat'][:]
+        if nlat != len(lats):
+            grid_mismatch = True
+        if np.amax(np.absolute(lats - lats2)) > 1.0e-3:
+            coord_mismatch = True
 
     if grid_mismatch:
         logger.error("error: input data are not on 2.5x2.5 deg ISCCP grid."
@@ -350,21 +398,86 @@ def read_and_check(srcfilename, varname, lons2, lats2, time2):
         raise Exception('Input variables are not on 2.5x2.5 deg ISCCP grid '
                         '(see log file for details).')
 
-    # read data
-    src_data = src_dataset.variables[varname]
+    _VALID_GRIDS.add(key)
+
+
+def read_data(srcfilename, varname, time_slice=slice(None)):
+    """
+    Read input data, setting missing values to zero.
+
+    Parameters
+    ----------
+    srcfilename : str
+        filename containing input data
+    varname : str
+        variable name in netcdf
+    time_slice: slice, optional
+        time steps to read (default: all)
+    """
+    with Dataset(srcfilename, 'r') as src_dataset:
+
+        # read data (only the requested time steps)
+        src_data = src_dataset.variables[varname]
+        data = src_data[time_slice]
 
-    # create mask (missing values)
-    try:
-        data = np.ma.masked_equal(src_data, getattr(src_data, "_FillValue"))
-        rgmasked = np.ma.masked_invalid(data)
-    except AttributeError:
-        rgmasked = np.ma.masked_invalid(src_data)
-    np.ma.set_fill_value(rgmasked, 0.0)
+        # create mask (missing values)
+        try:
+            data = np.ma.masked_equal(data, getattr(src_data, "_FillValue"))
+            rgmasked = np.ma.masked_invalid(data)
+        except AttributeError:
+            rgmasked = np.ma.masked_invalid(data)
+        np.ma.set_fill_value(rgmasked, 0.0)
 
     return np.ma.filled(rgmasked)
 
 
-def crem_calc(pointers):
+def _submit_reads(executor, pointers, variables, time_slice):
+    """Start reading a chunk of time steps of all variables."""
+    return {var: executor.submit(read_data, pointers[var + '_nc'],
+                                 pointers[var], time_slice)
+            for var in variables}
+
+
+def _read_chunks(pointers, variables, ntime, max_workers=1):
+    """
+    Read the input data in chunks of TIME_CHUNK time steps.
+
+    The variables are read concurrently in at most `max_workers` worker
+    processes (the netCDF library is not thread-safe) and the next chunk is
+    read while the current one is processed. With a single worker, the data
+    are read in this process.
+
+    Yields
+    ------
+    dict
+        data of the chunk for each variable
+    """
+    chunks = [slice(start, min(start + TIME_CHUNK, ntime))
+              for start in range(0, ntime, TIME_CHUNK)]
+    max_workers = min(max_workers, len(variables))
+    if max_workers <= 1:
+        for time_slice in chunks:
+            logger.debug('Reading time steps %i to %i', time_slice.start,
+                         time_slice.stop - 1)
+            yield {var: read_data(pointers[var + '_nc'], pointers[var],
+                                  time_slice)
+                   for var in variables}
+        return
+    if not chunks:
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        next_reads = _submit_reads(executor, pointers, variables, chunks[0])
+        for idx_chunk, time_slice in enumerate(chunks):
+            logger.debug('Reading time steps %i to %i', time_slice.start,
+                         time_slice.stop - 1)
+            data = {var: read.result() for var, read in next_reads.items()}
+            if idx_chunk + 1 < len(chunks):
+                next_reads = _submit_reads(executor, pointers, variables,
+                                           chunks[idx_chunk + 1])
+            yield data
+
+
+def crem_calc(pointers, max_workers=1):
     """
     Main program for calculating Cloud Regime Error Metric.
 
@@ -375,6 +488,9 @@ def crem_calc(pointers):
     pointers : dict
         Keys in dictionary are: albisccp_nc, pctisccp_nc, cltisccp_nc,
         rsut_nc, rsutcs_nc, rlut_nc, rlutcs_nc, snc_nc, sic_nc
+    max_workers : int, optional
+        maximum number of worker processes reading the input data
+        (default: 1, i.e. read in this process)
 
     For CMIP5, snc is in the CMIP5 table 'day'. All other variables
     are in the CMIP5 table 'cfday'. A minimum of 2 years, and ideally 5
@@ -452,39 +568,18 @@ def crem_calc(pointers):
     # pointers['xxx_nc'] = file name of input file
     # pointers['xxx'] = actual variable name in input file
 
-    logger.debug('Reading albisccp')
-    ntime2 = len(Dataset(pointers['albisccp_nc'], 'r').variables['time'][:])
-    albisccp_data = read_and_check(pointers['albisccp_nc'],
-                                   pointers['albisccp'], lons2, lats2, ntime2)
-    logger.debug('Reading pctisccp')
-    pctisccp_data = read_and_check(pointers['pctisccp_nc'],
-                                   pointers['pctisccp'], lons2, lats2, ntime2)
-    logger.debug('Reading cltisccp')
-    cltisccp_data = read_and_check(pointers['cltisccp_nc'],
-                                   pointers['cltisccp'], lons2, lats2, ntime2)
-    logger.debug('Reading rsut')
-    rsut_data = read_and_check(pointers['rsut_nc'],
-                               pointers['rsut'], lons2, lats2, ntime2)
-    logger.debug('Reading rsutcs')
-    rsutcs_data = read_and_check(pointers['rsutcs_nc'],
-                                 pointers['rsutcs'], lons2, lats2, ntime2)
-    logger.debug('Reading rlut')
-    rlut_data = read_and_check(pointers['rlut_nc'],
-                               pointers['rlut'], lons2, lats2, ntime2)
-    logger.debug('Reading rlutcs')
-    rlutcs_data = read_and_check(pointers['rlutcs_nc'],
-                                 pointers['rlutcs'], lons2, lats2, ntime2)
-    logger.debug('Reading sic')
-    sic_data = read_and_check(pointers['sic_nc'],
-                              pointers['sic'], lons2, lats2, ntime2)
+    with Dataset(pointers['albisccp_nc'], 'r') as src_dataset:
+        ntime2 = len(src_dataset.variables['time'])
+    variables = ['albisccp', 'pctisccp', 'cltisccp', 'rsut', 'rsutcs',
+                 'rlut', 'rlutcs', 'sic']
     if not pointers['snc_nc']:
-        logger.debug('Reading snw')
-        snc_data = read_and_check(pointers['snw_nc'],
-                                  pointers['snw'], lons2, lats2, ntime2)
+        variables.append('snw')
     else:
-        logger.debug('Reading snc')
-        snc_data = read_and_check(pointers['snc_nc'],
-                                  pointers['snc'], lons2, lats2, ntime2)
+        variables.append('snc')
+
+    # Check the grid of all input files once (header only)
+    for var in variables:
+        check_grid(pointers[var + '_nc'], lons2, lats2, ntime2)
 
     # -----------------------------------------------------------
 
@@ -499,62 +594,64 @@ def crem_calc(pointers):
     model_ncf[:] = 999.9
     r_crem_pd[:] = 999.9
 
-    # Normalize data used for assignment to regimes to be in the range 0-1
-    pctisccp_data = pctisccp_data / 100000.0
-    cltisccp_data = cltisccp_data / 100.0
-
-    # Calculate cloud forcing
-    swcf_data = rsutcs_data - rsut_data
-    lwcf_data = rlutcs_data - rlut_data
+    # Observational regime centroids (albedo, cloud top pressure, total
+    # cloud cover) of each region
+    centroids = np.stack([obs_alb, obs_pct, obs_clt], axis=-1)
+
+    # Number of points, regime members and their summed cloud forcings
+    # per region, accumulated over all time chunks
+    npoints = np.zeros(numreg)
+    counts = np.zeros((numreg, numrgm))
+    sum_swcf = np.zeros((numreg, numrgm))
+    sum_lwcf = np.zeros((numreg, numrgm))
+
+    # Stream the daily data in chunks of time steps, so only one chunk
+    # of every variable is held in memory (two while the next one is read)
+    for data in _read_chunks(pointers, variables, ntime2, max_workers):
+        snc_data = data[variables[-1]]
+
+        # Normalize data used for assignment to regimes to be in the
+        # range 0-1
+        pctisccp_data = data['pctisccp'] / 100000.0
+        cltisccp_data = data['cltisccp'] / 100.0
+
+        # Calculate cloud forcing
+        swcf_data = data['rsutcs'] - data['rsut']
+        lwcf_data = data['rlutcs'] - data['rlut']
+
+        # loop over 3 regions
+        # (0 = tropics, 1 = ice-free extra-tropics, 2 = snow/ice covered)
+        for idx_region, (region, regime) in enumerate(nregimes.items()):
+
+            # Set up validity mask for region
+            points = _get_region_points(region, lats2, pctisccp_data,
+                                        cltisccp_data, snc_data,
+                                        data['sic'])
+            npoints[idx_region] += np.count_nonzero(points)
+
+            # Assign model data to observed regimes
+            group = assign_regimes(
+                np.stack([data['albisccp'][points], pctisccp_data[points],
+                          cltisccp_data[points]], axis=-1),
+                centroids[idx_region, 0:regime])
+
+            counts[idx_region, 0:regime] += np.bincount(group,
+                                                        minlength=regime)
+            sum_swcf[idx_region, 0:regime] += np.bincount(
+                group, weights=swcf_data[points], minlength=regime)
+            sum_lwcf[idx_region, 0:regime] += np.bincount(
+                group, weights=lwcf_data[points], minlength=regime)
 
-    # loop over 3 regions
-    # (0 = tropics, 1 = ice-free extra-tropics, 2 = snow/ice covered)
     for idx_region, (region, regime) in enumerate(nregimes.items()):
-
-        # Set up validity mask for region
-
-        mask = pctisccp_data.copy()
-        if region == 'tropics':
-            mask[:, (lats2 < -20) | (lats2 > 20), :] = np.NAN
-        elif region == 'extra-tropics':
-            mask[:, (lats2 >= -20) & (lats2 <= 20), :] = np.NAN
-            mask[(snc_data >= 0.1) | (sic_data >= 0.1)] = np.NAN
-        elif region == 'snow-ice':
-            mask[:, (lats2 >= -20) & (lats2 <= 20), :] = np.NAN
-            mask[(snc_data < 0.1) & (sic_data < 0.1)] = np.NAN
-
-        mask[cltisccp_data == 0.0] = np.NAN
-
-        points = np.isfinite(mask)
-        npoints = len(mask[points])  # Number of valid data points in region
-
-        group = np.zeros(npoints)
-        e_d = np.zeros((npoints, regime))
-
-        swcf_data_pts = swcf_data[points]
-        lwcf_data_pts = lwcf_data[points]
-
-        # Assign model data to observed regimes
-
         for i in range(regime):
-            e_d[:, i] = \
-                ((albisccp_data[points] - obs_alb[idx_region, i]) ** 2) + \
-                ((pctisccp_data[points] - obs_pct[idx_region, i]) ** 2) + \
-                ((cltisccp_data[points] - obs_clt[idx_region, i]) ** 2)
-
-        group[:] = np.argmin(e_d, axis=1)
-
-        for i in range(regime):
-            mem = (group == i)
-
-            count = len(group[mem])
+            count = counts[idx_region, i]
 
             if count > 0:
 
-                model_rfo[idx_region, i] = float(count) / float(npoints)
-                model_ncf[idx_region, i] = np.average(swcf_data_pts[mem]) \
+                model_rfo[idx_region, i] = count / npoints[idx_region]
+                model_ncf[idx_region, i] = sum_swcf[idx_region, i] / count \
                     * solar_weights[idx_region] +                         \
-                    np.average(lwcf_data_pts[mem])
+                    sum_lwcf[idx_region, i] / count
             else:
                 logger.info("Model does not reproduce all observed cloud "
                             "regimes.")
@@ -589,6 +686,42 @@ def crem_calc(pointers):
     return crem_pd, r_crem_pd
 
 
+def _get_region_points(region, lats2, pctisccp_data, cltisccp_data,
+                       snc_data, sic_data):
+    """Get boolean array of the valid data points of a region."""
+    tropics = ((lats2 >= -20) & (lats2 <= 20))[np.newaxis, :, np.newaxis]
+    points = np.isfinite(pctisccp_data) & (cltisccp_data != 0.0)
+    if region == 'tropics':
+        points &= tropics
+    elif region == 'extra-tropics':
+        points &= ~tropics & ~((snc_data >= 0.1) | (sic_data >= 0.1))
+    elif region == 'snow-ice':
+        points &= ~tropics & ~((snc_data < 0.1) & (sic_data < 0.1))
+    return points
+
+
+def assign_regimes(values, centroids):
+    """
+    Assign data points to the nearest regime centroid.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        data points, shape (npoints, nvars)
+    centroids : numpy.ndarray
+        regime centroids, shape (nregimes, nvars)
+
+    Returns
+    -------
+    numpy.ndarray
+        index of the nearest (squared euclidean distance) regime for each
+        data point.
+    """
+    e_d = np.sum((values[:, np.newaxis, :] - centroids[np.newaxis]) ** 2,
+                 axis=-1)
+    return np.argmin(e_d, axis=1)
+
+
 if __name__ == '__main__':
 
     with run_diagnostic() as config:
@@ -2,7 +2,7 @@
 import logging
 
 import numpy as np
-from scipy import integrate, stats
+from scipy import stats
 
 logger = logging.getLogger(__name__)
 
@@ -87,6 +87,96 @@ def regression_line(x_data, y_data, n_points=100):
     return out
 
 
+def _regression_stats(x_data, y_data):
+    """Calculate linear regression statistics along the last axis.
+
+    Leading axes are treated as independent samples (e.g. bootstrap
+    resamples).
+
+    Returns
+    -------
+    dict
+        `numpy.array`s for the keys `slope`, `intercept`, `see` (standard
+        estimate of the error), `x_mean`, `ssx` and the number of points
+        `n_data`.
+
+    """
+    n_data = x_data.shape[-1]
+    x_mean = np.mean(x_data, axis=-1)
+    y_mean = np.mean(y_data, axis=-1)
+    x_anom = x_data - x_mean[..., np.newaxis]
+    y_anom = y_data - y_mean[..., np.newaxis]
+    ssx = np.sum(x_anom * x_anom, axis=-1)
+    sxy = np.sum(x_anom * y_anom, axis=-1)
+    ssy = np.sum(y_anom * y_anom, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = sxy / ssx
+        see = np.sqrt(np.maximum(ssy - slope * sxy, 0.0) / (n_data - 2))
+    return {
+        'slope': slope,
+        'intercept': y_mean - slope * x_mean,
+        'see': see,
+        'x_mean': x_mean,
+        'ssx': ssx,
+        'n_data': n_data,
+    }
+
+
+def _target_pdf(y_lin, obs_mean, obs_std, reg_stats, max_chunk_size=10**7):
+    """Calculate PDF of target variable P(y) = int P(y|x) P(x) dx.
+
+    The integral is evaluated for all `y_lin` (and all samples in
+    `reg_stats`) at once with the trapezoidal rule on a grid of x spanning
+    +-10 standard deviations of the observations. The grid spacing is chosen
+    to resolve the narrowest conditional PDF P(y|x).
+
+    """
+    slope = np.atleast_1d(reg_stats['slope'])
+    intercept = np.atleast_1d(reg_stats['intercept'])
+    see = np.atleast_1d(reg_stats['see'])
+    x_mean = np.atleast_1d(reg_stats['x_mean'])
+    ssx = np.atleast_1d(reg_stats['ssx'])
+    n_data = reg_stats['n_data']
+
+    # Width of P(y|x) in units of the observational standard deviation
+    with np.errstate(divide='ignore', invalid='ignore'):
+        widths = see / np.abs(slope) / obs_std
+    widths = widths[np.isfinite(widths) & (widths > 0.0)]
+    min_width = min(1.0, np.min(widths)) if widths.size else 1.0
+    n_x = int(np.clip(np.ceil(80.0 / min_width), 200, 20000)) + 1
+
+    # Integrate in standardized coordinates t = (x - obs_mean) / obs_std, in
+    # which P(x) dx is the standard normal distribution
+    t_lin = np.linspace(-10.0, 10.0, n_x)
+    weights = stats.norm.pdf(t_lin) * (t_lin[1] - t_lin[0])
+    weights[[0, -1]] /= 2.0
+    x_lin = obs_mean + obs_std * t_lin
+
+    # Evaluate in chunks of samples to limit memory usage
+    n_samples = slope.shape[0]
+    chunk_size = max(1, max_chunk_size // (n_x * len(y_lin)))
+    y_pdf = np.empty((n_samples, len(y_lin)))
+    for start in range(0, n_samples, chunk_size):
+        slc = slice(start, start + chunk_size)
+        spe = see[slc, np.newaxis] * np.sqrt(
+            1.0 + 1.0 / n_data +
+            (x_lin - x_mean[slc, np.newaxis])**2 / ssx[slc, np.newaxis])
+        y_estim = (slope[slc, np.newaxis] * x_lin +
+                   intercept[slc, np.newaxis])
+        cond_pdf = np.exp(
+            -(y_lin[np.newaxis, np.newaxis, :] - y_estim[..., np.newaxis])**2
+            / 2.0 / spe[..., np.newaxis]**2) / (
+                np.sqrt(2.0 * np.pi) * spe[..., np.newaxis])
+        y_pdf[slc] = np.einsum('sxy,x->sy', cond_pdf, weights)
+    return y_pdf
+
+
+def _get_y_lin(y_data, n_points):
+    """Get evenly spaced points for the target variable."""
+    y_range = max(y_data) - min(y_data)
+    return np.linspace(min(y_data) - y_range, max(y_data) + y_range, n_points)
+
+
 def gaussian_pdf(x_data, y_data, obs_mean, obs_std, n_points=100):
     """Calculate Gaussian probability densitiy function for target variable.
 
@@ -110,32 +200,63 @@ def gaussian_pdf(x_data, y_data, obs_mean, obs_std, n_points=100):
 
     """
     _check_input_arrays(x_data, y_data)
-    spe = standard_prediction_error(x_data, y_data)
-    reg = stats.linregress(x_data, y_data)
+    x_data = np.asarray(x_data, dtype=np.float64)
+    y_data = np.asarray(y_data, dtype=np.float64)
+    y_lin = _get_y_lin(y_data, n_points)
+    [y_pdf] = _target_pdf(y_lin, obs_mean, obs_std,
+                          _regression_stats(x_data, y_data))
+    return (y_lin, y_pdf)
 
-    def obs_pdf(x_new):
-        """Return PDF of observations P(x)."""
-        norm = np.sqrt(2.0 * np.pi * obs_std**2)
-        return np.exp(-(x_new - obs_mean)**2 / 2.0 / obs_std**2) / norm
 
-    def cond_pdf(x_new, y_new):
-        """Return conditional PDF P(y|x)."""
-        y_estim = reg.slope * x_new + reg.intercept
-        norm = np.sqrt(2.0 * np.pi * spe(x_new)**2)
-        return np.exp(-(y_new - y_estim)**2 / 2.0 / spe(x_new)**2) / norm
+def bootstrap_gaussian_pdf(x_data,
+                           y_data,
+                           obs_mean,
+                           obs_std,
+                           n_points=100,
+                           n_bootstrap=1000,
+                           random_state=None):
+    """Calculate Gaussian PDFs for target variable for bootstrap resamples.
 
-    def comb_pdf(x_new, y_new):
-        """Return combined PDF P(y,x)."""
-        return obs_pdf(x_new) * cond_pdf(x_new, y_new)
+    The points are resampled with replacement and the PDF of
+    :func:`gaussian_pdf` is calculated for every resample. All resamples are
+    processed in batched array operations.
 
-    # PDF of target variable P(y)
-    y_range = max(y_data) - min(y_data)
-    y_lin = np.linspace(min(y_data) - y_range, max(y_data) + y_range, n_points)
-    y_pdf = [
-        integrate.quad(comb_pdf, -np.inf, +np.inf, args=(y, ))[0]
-        for y in y_lin
-    ]
-    return (y_lin, np.array(y_pdf))
+    Parameters
+    ----------
+    x_data : numpy.array
+        x coordinates of the points.
+    y_data : numpy.array
+        y coordinates of the points.
+    obs_mean : float
+        Mean of observational data.
+    obs_std : float
+        Standard deviation of observational data.
+    n_points : int, optional (default: 100)
+        Number of points for the regression lines.
+    n_bootstrap : int, optional (default: 1000)
+        Number of bootstrap resamples.
+    random_state : int or numpy.random.RandomState, optional
+        Seed or random number generator used for resampling.
+
+    Returns
+    -------
+    tuple of numpy.array
+        x values (shape `(n_points,)`) and y values (shape `(n_bootstrap,
+        n_points)`) of the PDFs. Resamples for which the regression is
+        undefined (e.g. all x values identical) give `nan`.
+
+    """
+    _check_input_arrays(x_data, y_data)
+    x_data = np.asarray(x_data, dtype=np.float64)
+    y_data = np.asarray(y_data, dtype=np.float64)
+    if not isinstance(random_state, np.random.RandomState):
+        random_state = np.random.RandomState(random_state)
+    idx = random_state.randint(0, len(x_data), (n_bootstrap, len(x_data)))
+    y_lin = _get_y_lin(y_data, n_points)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y_pdfs = _target_pdf(y_lin, obs_mean, obs_std,
+                             _regression_stats(x_data[idx], y_data[idx]))
+    return (y_lin, y_pdfs)
 
 
 def cdf(data, pdf):
@@ -146,7 +267,9 @@ def cdf(data, pdf):
     data : numpy.array
         Data points (x axis).
     pdf : numpy.array
-        Corresponding probability density function (PDF).
+        Corresponding probability density function (PDF). Multiple PDFs
+        (e.g. from :func:`bootstrap_gaussian_pdf`) can be given along
+        leading axes.
 
     Returns
     -------
@@ -154,6 +277,7 @@ def cdf(data, pdf):
         Corresponding cumulative distribution function (CDF).
 
     """
-    idx_range = range(1, len(data) + 1)
-    cum_dens = [integrate.simps(pdf[:idx], data[:idx]) for idx in idx_range]
-    return np.array(cum_dens)
+    cum_dens = np.cumsum(
+        (pdf[..., 1:] + pdf[..., :-1]) / 2.0 * np.diff(data), axis=-1)
+    return np.concatenate(
+        (np.zeros(cum_dens.shape[:-1] + (1, )), cum_dens), axis=-1)
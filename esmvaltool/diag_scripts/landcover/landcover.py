@@ -39,6 +39,7 @@ import logging
 import os
 import numpy as np
 
+import dask
 import iris
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
@@ -241,22 +242,23 @@ def make_landcover_bars(cfg, regnam, modnam, values, var):
         pdf.close()
 
 
-def sel_lats(latlist, bounds):
-    """Return subset of latitudes within bounds.
+def get_region_weights(latlist, regdef):
+    """Return matrix selecting the latitudes of every region.
 
     Parameters
     ----------
     latlist : numpy array
         contains all latitudes for the cube
-    bounds : list
-        bounds for latitude selection
+    regdef : dict
+        latitude bounds for every region (``None`` for the whole globe)
     """
-    subset = []
-    for lat in latlist.tolist():
-        if min(bounds) < lat < max(bounds):
-            subset.append(lat)
+    weights = np.ones((len(regdef), len(latlist)))
+    for (ireg, bounds) in enumerate(regdef.values()):
+        if bounds is not None:
+            weights[ireg] = ((min(bounds) < latlist) &
+                             (latlist < max(bounds)))
 
-    return subset
+    return weights
 
 
 def get_timmeans(attr, cubes, refset, prov_rec):
@@ -284,7 +286,7 @@ def get_timmeans(attr, cubes, refset, prov_rec):
     if new_cube.units != '%':
         raise ValueError('Unit % is expected for ' +
                          new_cube.long_name.lower() + ' area fraction')
-    # Compute long term mean
+    # Compute long term mean (lazily, see realise_timmeans)
     mean_cube = new_cube.collapsed([diag.names.TIME], iris.analysis.MEAN)
     # Rename variable in cube
     mean_cube.var_name = "_".join([
@@ -324,6 +326,23 @@ def get_timmeans(attr, cubes, refset, prov_rec):
         prov_rec[var]['ancestors'].append(attr['filename'])
 
 
+def realise_timmeans(cubes):
+    """Compute the data of all lazy time averaged cubes in one pass.
+
+    Parameters
+    ----------
+    cubes : dict
+        collection of iris data cubes.
+    """
+    lazy_cubes = [
+        cube for group in cubes.values() for var_cubes in group.values()
+        for cube in var_cubes if cube.has_lazy_data()
+    ]
+    all_data = dask.compute(*[cube.lazy_data() for cube in lazy_cubes])
+    for (cube, data) in zip(lazy_cubes, all_data):
+        cube.data = data
+
+
 def write_data(cfg, cubes, var, prov_rec):
     """Write intermediate datafield for one variable.
 
@@ -373,54 +392,34 @@ def compute_landcover(var, lcdata, cubes):
         'South. Hem.': [-90, -30]
     }
 
-    values = {'area': [], 'frac': [], 'bias': []}
-    modnam = {'area': [], 'frac': [], 'bias': []}
-    # Compute metrices for all datasets of a given variable
-    for sub_cube in cubes:
-        modnam['area'].append(sub_cube.var_name)
-        modnam['frac'].append(sub_cube.var_name)
-        cellarea = sub_cube.copy()
-        cellarea.name = 'cellarea'
-        cellarea.data = iris.analysis.cartography.area_weights(cubes[0])
-        row = {'area': [], 'frac': []}
-        # Compute land cover area in million km2:
-        # area = Percentage * 0.01 * area [m2]
-        #      / 1.0e+6 [km2]
-        #      / 1.0e+6 [1.0e+6 km2]
-        coverarea = sub_cube.copy()
-        coverarea.data *= (0.01 * cellarea.data / 1.0E+6 / 1.0e+6)
-        # Sum over area for different regions
-        for reg in regdef:
-            if regdef[reg] is not None:
-                zone = iris.Constraint(
-                    latitude=sel_lats(
-                        sub_cube.coord('latitude').points, regdef[reg]))
-                row['area'].append(
-                    coverarea.extract(zone).collapsed(
-                        ['longitude', 'latitude'],
-                        iris.analysis.SUM).data.tolist())
-                row['frac'].append(
-                    sub_cube.extract(zone).collapsed(
-                        ['longitude', 'latitude'],
-                        iris.analysis.MEAN,
-                        weights=cellarea.extract(zone).data).data.tolist())
-
-            else:
-                row['area'].append(
-                    coverarea.collapsed(['longitude', 'latitude'],
-                                        iris.analysis.SUM).data.tolist())
-                row['frac'].append(
-                    sub_cube.collapsed(['longitude', 'latitude'],
-                                       iris.analysis.MEAN,
-                                       weights=cellarea.data).data.tolist())
-        values['area'].append(row['area'])
-        values['frac'].append(row['frac'])
+    names = [sub_cube.var_name for sub_cube in cubes]
+    modnam = {'area': names, 'frac': list(names), 'bias': names[:-1]}
+    # Compute metrices for all datasets of a given variable at once
+    latlon_dims = [
+        cubes[0].coord_dims(coord)[0] for coord in ['latitude', 'longitude']
+    ]
+    cellarea = np.moveaxis(iris.analysis.cartography.area_weights(cubes[0]),
+                           latlon_dims, [-2, -1])
+    data = np.moveaxis(
+        np.ma.stack([sub_cube.data for sub_cube in cubes]),
+        [dim + 1 for dim in latlon_dims], [-2, -1])
+    validarea = np.where(np.ma.getmaskarray(data), 0.0, cellarea)
+    # Sum zonally, then over the latitudes of all regions
+    regweights = get_region_weights(cubes[0].coord('latitude').points,
+                                    regdef).T
+    regsum = np.sum(np.ma.filled(data, 0.0) * validarea, axis=-1) @ regweights
+    regarea = np.sum(validarea, axis=-1) @ regweights
+    # Compute land cover area in million km2:
+    # area = Percentage * 0.01 * area [m2]
+    #      / 1.0e+6 [km2]
+    #      / 1.0e+6 [1.0e+6 km2]
+    frac = regsum / regarea
     # Compute relative bias in average fractions compared to reference
-    reffrac = np.array(values['frac'][-1])
-    for imod, modfrac in enumerate(values['frac'][:-1]):
-        values['bias'].append(
-            ((np.array(modfrac) - reffrac) / reffrac * 100.0).tolist())
-        modnam['bias'].append(modnam['frac'][imod])
+    values = {
+        'area': (regsum * 0.01 / 1.0E+6 / 1.0e+6).tolist(),
+        'frac': frac.tolist(),
+        'bias': ((frac[:-1] - frac[-1]) / frac[-1] * 100.0).tolist(),
+    }
 
     lcdata[var] = {'values': values, 'groups': modnam}
 
@@ -506,6 +505,7 @@ def main(cfg):
     for standard_name in grouped_input_data:
         for attributes in grouped_input_data[standard_name]:
             get_timmeans(attributes, timcubes, refset, prov_rec)
+    realise_timmeans(timcubes)
 
     for var in diag.Variables(cfg).short_names():
         # Write regridded and temporal aggregated netCDF data files
@@ -1,11 +1,13 @@
 """Code that is shared between multiple diagnostic scripts."""
 from . import io, iris_helpers, names, plot
+from ._cache import FileCache, get_file_stamp
 from ._base import (ProvenanceLogger, extract_variables, get_cfg,
                     get_diagnostic_filename, get_plot_filename, group_metadata,
                     run_diagnostic, select_metadata, sorted_group_metadata,
                     sorted_metadata, variables_available)
 from ._diag import Datasets, Variable, Variables
-from ._validation import apply_supermeans, get_control_exper_obs
+from ._validation import (apply_supermeans, get_control_exper_obs,
+                          get_dataset_supermean)
 
 __all__ = [
     # Main entry point for diagnostics
@@ -29,6 +31,9 @@ __all__ = [
     'get_cfg',
     # IO module
     'io',
+    # Cache objects derived from files
+    'FileCache',
+    'get_file_stamp',
     # Iris helpers module
     'iris_helpers',
     # Plotting module
@@ -36,4 +41,5 @@ __all__ = [
     # Validation module
     'get_control_exper_obs',
     'apply_supermeans',
+    'get_dataset_supermean',
 ]
@@ -0,0 +1,67 @@
+"""Cache objects derived from files until the files change."""
+import os
+
+
+def get_file_stamp(path):
+    """Get modification time and size of a file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    tuple
+        Modification time (in ns) and size (in bytes).
+
+    Raises
+    ------
+    OSError
+        File is not accessible.
+
+    """
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class FileCache:
+    """Cache of objects derived from files.
+
+    Every object is created once per file and recreated when the file
+    changed, i.e. when its modification time or size differ (see
+    :func:`get_file_stamp`).
+
+    """
+
+    def __init__(self):
+        """Create empty cache."""
+        self._entries = {}
+
+    def get(self, path, create):
+        """Get object derived from a file.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file.
+        create : callable
+            Function which creates the object, called with `path` if the
+            object is not cached yet or the file changed.
+
+        Returns
+        -------
+        object
+            Cached object.
+
+        """
+        stamp = get_file_stamp(path)
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != stamp:
+            entry = (stamp, create(path))
+            self._entries[path] = entry
+        return entry[1]
+
+    def clear(self):
+        """Remove all objects from the cache."""
+        self._entries.clear()
@@ -10,12 +10,18 @@ Annual 'Supermeans' are averages over several full years.
 
 import os.path
 
-import cf_units
 import iris
 import iris.coord_categorisation
 from iris.coord_categorisation import _pt_date
 import numpy as np
 
+from ._cache import FileCache
+
+SEASONS = ['djf', 'mam', 'jja', 'son']
+
+# Cubes and supermeans of the cube list files
+_SUPERMEANS = FileCache()
+
 
 class NoBoundsError(ValueError):
     """Return error and pass."""
@@ -44,13 +50,32 @@ def get_supermean(name, season, data_dir, obs_flag=None):
     The annual supermean is a continuous mean over multiple years.
 
     Supermeans are only applied to full clima years (Starting Dec 1st).
+
+    The cube list in `data_dir` is only loaded once, and the annual and
+    seasonal supermeans of a cube are calculated together (see
+    `all_supermeans`) and cached until the cube list file changes.
     """
-    name_constraint = iris.Constraint(name=name)
+    if season not in ['ann'] + SEASONS:
+        raise ValueError(
+            "Argument 'season' must be one of "
+            "['ann', 'djf', 'mam', 'jja', 'son']. "
+            "It is: " + str(season))
 
     if not obs_flag:
         cubes_path = os.path.join(data_dir, 'cubeList.nc')
     else:
         cubes_path = os.path.join(data_dir, obs_flag + '_cubeList.nc')
+
+    cache = _SUPERMEANS.get(cubes_path, _load_cube_list)
+    if name not in cache['supermeans']:
+        cube = cache['cubes'].extract_strict(iris.Constraint(name=name))
+        cache['supermeans'][name] = all_supermeans(cube)
+
+    return cache['supermeans'][name][season].copy()
+
+
+def _load_cube_list(cubes_path):
+    """Load cube list for the supermean cache."""
     cubes = iris.load(cubes_path)
 
     # use STASH if no standard name
@@ -58,18 +83,53 @@ def get_supermean(name, season, data_dir, obs_flag=None):
         if cube.name() == 'unknown':
             cube.rename(str(cube.attributes['STASH']))
 
-    cube = cubes.extract_strict(name_constraint)
+    return {'cubes': cubes, 'supermeans': {}}
+
+
+def all_supermeans(cube):
+    """Return annual and seasonal supermeans calculated in one pass.
+
+    The duration weighted sums of the data are aggregated by season (and
+    sampling hour for diurnal data) once; the annual supermean is derived
+    from these seasonal sums. The results are identical to those of
+    `periodic_mean`.
 
-    if season in ['djf', 'mam', 'jja', 'son']:
-        supermeans_cube = periodic_mean(cube, period='season')
-        return supermeans_cube.extract(iris.Constraint(season=season))
-    elif season == 'ann':
-        return periodic_mean(cube)
+    :param cube: Cube with data for full climate years.
+    :returns: Supermeaned cubes keyed on 'ann', 'djf', 'mam', 'jja' and
+              'son'.
+    :rtype: dict
+    """
+    _cube = _add_start_hour_coord(cube.copy())
+    iris.coord_categorisation.add_season(_cube, 'time')
+    time_points_per_day = len(set(_cube.coord('start_hour').points))
+    if time_points_per_day > 1:
+        periods = ['start_hour']
     else:
-        raise ValueError(
-            "Argument 'season' must be one of "
-            "['ann', 'djf', 'mam', 'jja', 'son']. "
-            "It is: " + str(season))
+        _cube.remove_coord('start_hour')
+        periods = []
+
+    orig_cell_methods = _cube.cell_methods
+    sums, weights = _weighted_sums(_cube, ['season'] + periods)
+    seasonal = _weighted_mean(sums, weights, orig_cell_methods,
+                              ['season'] + periods)
+    supermeans = {
+        season: seasonal.extract(iris.Constraint(season=season))
+        for season in SEASONS
+    }
+
+    # annual supermean from seasonal sums
+    sums.remove_coord('season')
+    weights.remove_coord('season')
+    if periods:
+        sums = sums.aggregated_by(periods, iris.analysis.SUM)
+        weights = weights.aggregated_by(periods, iris.analysis.SUM)
+    else:
+        periods = ['time']
+        sums = sums.collapsed(periods, iris.analysis.SUM)
+        weights = weights.collapsed(periods, iris.analysis.SUM)
+    supermeans['ann'] = _weighted_mean(sums, weights, orig_cell_methods,
+                                       periods)
+    return supermeans
 
 
 def contains_full_climate_years(cube):
@@ -87,43 +147,33 @@ def contains_full_climate_years(cube):
               in cube are at YYYY-12-01 00:00:00.
     :rtype: boolean
     """
-    origin = cube.coord('time').units.origin
-    calendar = cube.coord('time').units.calendar
-    format_ = 'YYYY-%m-%d %H:%M:%S'
-
-    if not cube.coord('time').has_bounds():
+    time_coord = cube.coord('time')
+    if not time_coord.has_bounds():
         raise NoBoundsError()
 
-    def _num2date(num):
-        return cf_units.num2date(num, origin, calendar)
-
+    points = time_coord.points
+    bounds = time_coord.bounds
     if is_24h_sampled(cube):
         # find out number of sampling intervals (difference < 24 h)
-        intervals = []
-        for i in range(len(cube.coord('time').points) - 1):
-            diff = cube.coord('time').points[i] - cube.coord('time').points[0]
-            if diff < 24:
-                intervals.append(round(diff))
-        intervals = len(intervals)
-
-        year_boundaries = [
-            'YYYY-12-01 {:02d}:00:00'.format(hour) for hour in range(24)
-        ]
-
-        bounding_datetimes = []
-        time_bounds = cube.coord('time').bounds
-        for i in range(intervals):
-            start = _num2date(time_bounds[i][0]).strftime(format_)
-            end = _num2date(time_bounds[i - intervals][1]).strftime(format_)
-            bounding_datetimes.append((start, end))
-        return all(start == end and start in year_boundaries and
-                   end in year_boundaries
-                   for start, end in bounding_datetimes)
+        intervals = np.count_nonzero(points[:-1] - points[0] < 24)
+        hours = range(24)
     else:
-        start = _num2date(cube.coord('time').bounds[0][0]).strftime(format_)
-        end = _num2date(cube.coord('time').bounds[-1][1]).strftime(format_)
-        year_boundary = 'YYYY-12-01 00:00:00'
-        return start == year_boundary and end == year_boundary
+        intervals = 1
+        hours = (0, )
+
+    # compare first start bounds and last end bounds of each interval
+    starts = time_coord.units.num2date(bounds[:intervals, 0])
+    ends = time_coord.units.num2date(bounds[len(bounds) - intervals:, 1])
+    return all(
+        _climate_year_boundary(start, hours) and
+        _climate_year_boundary(end, hours) and start.hour == end.hour
+        for start, end in zip(np.atleast_1d(starts), np.atleast_1d(ends)))
+
+
+def _climate_year_boundary(date, hours):
+    """Check if date is at YYYY-12-01 HH:00:00 with HH in `hours`."""
+    return (date.month, date.day, date.minute, date.second) == \
+        (12, 1, 0, 0) and date.hour in hours
 
 
 def is_24h_sampled(cube):
@@ -164,12 +214,7 @@ def periodic_mean(cube, period=None):
     if period not in [None, 'month', 'season']:
         raise InvalidPeriod('Invalid period: ' + str(period))
 
-    _cube = cube.copy()
-
-    if _cube.coord('time').has_bounds():
-        add_start_hour(_cube, 'time', name='start_hour')
-    else:
-        iris.coord_categorisation.add_hour(_cube, 'time', name='start_hour')
+    _cube = _add_start_hour_coord(cube.copy())
 
     if period == 'month':
         iris.coord_categorisation.add_month(_cube, 'time', name='month')
@@ -197,6 +242,15 @@ def periodic_mean(cube, period=None):
     return _cube
 
 
+def _add_start_hour_coord(cube):
+    """Add AuxCoord 'start_hour' from the time bounds (or points)."""
+    if cube.coord('time').has_bounds():
+        add_start_hour(cube, 'time', name='start_hour')
+    else:
+        iris.coord_categorisation.add_hour(cube, 'time', name='start_hour')
+    return cube
+
+
 def add_start_hour(cube, coord, name='diurnal_sampling_hour'):
     """Add AuxCoord for diurnal data. Diurnal data is sampled every 24 hours.
 
@@ -276,11 +330,18 @@ def time_average_by(cube, periods='time'):
     """
     if isinstance(periods, str):
         periods = [periods]
+    orig_cell_methods = cube.cell_methods
+    sums, weights = _weighted_sums(cube, periods)
+    return _weighted_mean(sums, weights, orig_cell_methods, periods)
+
 
+def _weighted_sums(cube, periods):
+    """Return duration weighted sums of cube and sums of the durations."""
     # create new cube with time coord and orig duration as data
+    time_durations = durations(cube.coord('time'))
     durations_cube = iris.cube.Cube(
         # durations normalised to 1
-        durations(cube.coord('time')) / np.max(durations(cube.coord('time'))),
+        time_durations / np.max(time_durations),
         long_name='duration',
         units='1',
         attributes=None,
@@ -290,14 +351,9 @@ def time_average_by(cube, periods='time'):
         if period != 'time':
             durations_cube.add_aux_coord(cube.coord(period), 0)
 
-    # calculate weighted sum
-    orig_cell_methods = cube.cell_methods
-
-    # multiply each time slice by its duration
-    idx_obj = [None] * cube.data.ndim
-    idx_obj[cube.coord_dims('time')[0]] = slice(
-        None)  # [None, slice(None), None] == [np.newaxis, :, np.newaxis]
-    cube.data *= durations_cube.data[idx_obj]
+    # multiply each time slice by its duration (lazily)
+    cube = cube.copy(cube.core_data() *
+                     durations_cube.data[_time_index(cube)])
 
     if periods == ['time']:  # duration weighted averaging
         cube = cube.collapsed(periods, iris.analysis.SUM)
@@ -306,12 +362,16 @@ def time_average_by(cube, periods='time'):
         cube = cube.aggregated_by(periods, iris.analysis.SUM)
         durations_cube = durations_cube.aggregated_by(periods,
                                                       iris.analysis.SUM)
+    return cube, durations_cube
+
 
-    # divide by aggregated weights
+def _weighted_mean(sums, durations_cube, orig_cell_methods, periods):
+    """Divide weighted sums by the aggregated durations."""
     if durations_cube.data.shape == ():
-        cube.data /= durations_cube.data
+        weights = durations_cube.data
     else:
-        cube.data /= durations_cube.data[idx_obj]
+        weights = durations_cube.data[_time_index(sums)]
+    cube = sums.copy(sums.core_data() / weights)
 
     # correct cell methods
     cube.cell_methods = orig_cell_methods
@@ -322,9 +382,17 @@ def time_average_by(cube, periods='time'):
     return cube
 
 
+def _time_index(cube):
+    """Index to broadcast a time series along the time dimension of cube."""
+    idx_obj = [None] * cube.ndim
+    # [None, slice(None), None] == [np.newaxis, :, np.newaxis]
+    if cube.coord_dims('time'):
+        idx_obj[cube.coord_dims('time')[0]] = slice(None)
+    return tuple(idx_obj)
+
+
 def durations(time_coord):
     """Return durations of time periods."""
     assert time_coord.has_bounds(), 'No bounds. Do not guess.'
-    durs = np.array(
-        [bounds[1] - bounds[0] for bounds in time_coord.bounds])
-    return durs
+    bounds = time_coord.bounds
+    return bounds[:, 1] - bounds[:, 0]
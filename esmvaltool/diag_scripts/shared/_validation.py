@@ -5,9 +5,14 @@ import iris
 from esmvalcore.preprocessor import climate_statistics
 from esmvaltool.diag_scripts.shared import select_metadata
 
+from ._cache import FileCache
+
 
 logger = logging.getLogger(os.path.basename(__file__))
 
+# Supermeaned cubes of the input files
+_SUPERMEANS = FileCache()
+
 
 def get_control_exper_obs(short_name, input_data, cfg, cmip_type):
     """
@@ -22,19 +27,21 @@ def get_control_exper_obs(short_name, input_data, cfg, cmip_type):
     input_data: dict containing the input data info
     cfg: config file as used in this module
     """
-    # select data per short name and CMIP type
-    dataset_selection = select_metadata(
-        input_data, short_name=short_name, project=cmip_type)
+    # select data per short name (once) and CMIP type
+    var_selection = select_metadata(input_data, short_name=short_name)
+    dataset_selection = select_metadata(var_selection, project=cmip_type)
 
     # get the obs datasets if specified in recipe
-    if 'observational_datasets' in cfg:
-        obs_selection = [
-            select_metadata(
-                input_data, short_name=short_name, dataset=obs_dataset)[0]
-            for obs_dataset in cfg['observational_datasets']
-        ]
-    else:
-        obs_selection = []
+    by_dataset = {}
+    for data in var_selection:
+        by_dataset.setdefault(data['dataset'], data)
+    obs_datasets = cfg.get('observational_datasets', [])
+    missing = [name for name in obs_datasets if name not in by_dataset]
+    if missing:
+        raise ValueError(
+            "No data for variable {} of observational dataset(s) {}".format(
+                short_name, missing))
+    obs_selection = [by_dataset[obs_dataset] for obs_dataset in obs_datasets]
 
     # determine CONTROL and EXPERIMENT datasets
     for model in dataset_selection:
@@ -65,22 +72,30 @@ def apply_supermeans(ctrl, exper, obs_list):
     exper: dictionary of EXPERIMENT dataset
     obs_lis: list of dicts for OBS datasets (0, 1 or many)
 
+    Supermeans are cached per file, so datasets that are used in several
+    comparisons are only loaded and meaned once.
+
     Returns: control and experiment cubes and list of obs cubes
     """
-    ctrl_file = ctrl['filename']
-    exper_file = exper['filename']
-    ctrl_cube = iris.load_cube(ctrl_file)
-    exper_cube = iris.load_cube(exper_file)
-    ctrl_cube = climate_statistics(ctrl_cube)
-    exper_cube = climate_statistics(exper_cube)
+    ctrl_cube = get_dataset_supermean(ctrl)
+    exper_cube = get_dataset_supermean(exper)
     if obs_list:
-        obs_cube_list = []
-        for obs in obs_list:
-            obs_file = obs['filename']
-            obs_cube = iris.load_cube(obs_file)
-            obs_cube = climate_statistics(obs_cube)
-            obs_cube_list.append(obs_cube)
+        obs_cube_list = [get_dataset_supermean(obs) for obs in obs_list]
     else:
         obs_cube_list = None
 
     return ctrl_cube, exper_cube, obs_cube_list
+
+
+def get_dataset_supermean(data_set_dict):
+    """
+    Compute the time mean (supermean) of a single dataset.
+
+    The supermean is cached per file and a copy of it is returned, so it
+    can be modified freely.
+    data_set_dict: dictionary of the dataset
+    """
+    cube = _SUPERMEANS.get(
+        data_set_dict['filename'],
+        lambda filename: climate_statistics(iris.load_cube(filename)))
+    return cube.copy()
@@ -1,12 +1,21 @@
 """Convenience functions for writing netcdf files."""
+import bisect
 import fnmatch
+import itertools
+import json
 import logging
 import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+import cf_units
 import iris
+import netCDF4
 import numpy as np
 
-from .iris_helpers import unify_1d_cubes
+from ._cache import get_file_stamp
+from .iris_helpers import _get_ref_indices, _get_union_coord
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +30,66 @@ NECESSARY_KEYS = VAR_KEYS + [
     'short_name',
 ]
 
+# Index of the files in the ancestor directories (see _get_ancestor_index)
+_ANCESTOR_INDEX = {}
+
+# Coarsest timestamp resolution of the supported file systems (in ns)
+MTIME_RESOLUTION_NS = 2 * 10**9
+
+# File (in the work directory of the diagnostic) caching netcdf metadata
+METADATA_INDEX = '.netcdf_metadata.json'
+METADATA_INDEX_VERSION = 2
+
+# Minimum number of files to scan in parallel and maximum number of worker
+# processes (netCDF-C is not thread-safe, so separate processes are used;
+# the optional parameter max_parallel_tasks lowers the number of workers)
+MIN_FILES_FOR_PARALLEL_SCAN = 16
+MAX_SCAN_WORKERS = 4
+
+# Attributes which are interpreted by iris and not part of cube.attributes
+_CF_ATTRIBUTES = (
+    '_FillValue',
+    'add_offset',
+    'ancillary_variables',
+    'axis',
+    'bounds',
+    'calendar',
+    'cell_measures',
+    'cell_methods',
+    'climatology',
+    'compress',
+    'coordinates',
+    'flag_masks',
+    'flag_meanings',
+    'flag_values',
+    'formula_terms',
+    'grid_mapping',
+    'leap_month',
+    'leap_year',
+    'long_name',
+    'missing_value',
+    'month_lengths',
+    'positive',
+    'scale_factor',
+    'standard_error_multiplier',
+    'standard_name',
+    'units',
+    'valid_max',
+    'valid_min',
+    'valid_range',
+)
+
+# Attributes which reference other variables
+_REFERENCE_ATTRIBUTES = (
+    'ancillary_variables',
+    'bounds',
+    'cell_measures',
+    'climatology',
+    'coordinates',
+    'formula_terms',
+    'grid_mapping',
+)
+
 
 def _has_necessary_attributes(metadata,
                               only_var_attrs=False,
@@ -38,15 +107,113 @@ def _has_necessary_attributes(metadata,
     return True
 
 
-def get_all_ancestor_files(cfg, pattern=None):
+def _scan_dir(path, index):
+    """Add all files of a directory tree (top-down, sorted) to the index."""
+    try:
+        index['dir_mtimes'][path] = os.stat(path).st_mtime_ns
+        with os.scandir(path) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+    except OSError:
+        return
+    sub_dirs = []
+    for entry in entries:
+        if entry.is_dir():
+            if not entry.is_symlink():
+                sub_dirs.append(entry.path)
+        elif entry.name != METADATA_INDEX:
+            index['names'].append((entry.name, len(index['paths'])))
+            index['paths'].append(entry.path)
+    for sub_dir in sub_dirs:
+        _scan_dir(sub_dir, index)
+
+
+def _is_outdated(index):
+    """Check if files were added to or removed from an indexed directory.
+
+    Directories modified shortly before or during the scan are always
+    considered outdated: with coarse timestamps, files added in the same
+    tick as the scan do not change the modification time of the directory.
+
+    """
+    racy_mtime = index['scan_time'] - MTIME_RESOLUTION_NS
+    for (path, mtime) in index['dir_mtimes'].items():
+        if mtime >= racy_mtime:
+            return True
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+def _get_ancestor_index(input_dir, refresh=False):
+    """Get index of all files in an ancestor directory.
+
+    The index is built once and only rebuilt if the modification time of one
+    of the (sub-)directories changed (or if `refresh` is given).
+
+    """
+    index = _ANCESTOR_INDEX.get(input_dir)
+    if index is None or refresh or _is_outdated(index):
+        index = {
+            'dir_mtimes': {},
+            'names': [],
+            'paths': [],
+            'matches': {},
+            'scan_time': time.time_ns(),
+        }
+        _scan_dir(input_dir, index)
+        index['names'].sort()
+        _ANCESTOR_INDEX[input_dir] = index
+    return index
+
+
+def _match_ancestor_index(index, pattern, regex):
+    """Get all paths of an index whose file name matches the patterns."""
+    key = (pattern, regex)
+    if key in index['matches']:
+        return index['matches'][key]
+    if pattern is None:
+        candidates = index['names']
+    else:
+        # Only names starting with the literal prefix of the pattern can match
+        prefix = re.match(r'[^*?[]*', pattern).group(0)
+        start = bisect.bisect_left(index['names'], (prefix, ))
+        candidates = itertools.takewhile(
+            lambda name_idx: name_idx[0].startswith(prefix),
+            index['names'][start:])
+        regex_pattern = re.compile(fnmatch.translate(pattern))
+        candidates = [(name, idx) for (name, idx) in candidates
+                      if regex_pattern.match(name)]
+    if regex is not None:
+        regex_compiled = re.compile(regex)
+        candidates = [(name, idx) for (name, idx) in candidates
+                      if regex_compiled.fullmatch(name)]
+    matches = [index['paths'][idx] for idx in sorted(
+        idx for (_, idx) in candidates)]
+    index['matches'][key] = matches
+    return matches
+
+
+def get_all_ancestor_files(cfg, pattern=None, regex=None, refresh=False):
     """Return a list of all files in the ancestor directories.
 
+    The files of every ancestor directory are indexed once per run, all
+    queries use this index. It is refreshed when files are added to or
+    removed from the directories (or if `refresh` is given).
+
     Parameters
     ----------
     cfg : dict
         Diagnostic script configuration.
     pattern : str, optional
-        Only return files which match a certain pattern.
+        Only return files which match a certain (glob) pattern.
+    regex : str, optional
+        Only return files whose name matches a certain regular expression
+        (the whole file name needs to match).
+    refresh : bool, optional (default: False)
+        Rescan the ancestor directories.
 
     Returns
     -------
@@ -59,23 +226,24 @@ def get_all_ancestor_files(cfg, pattern=None):
         d for d in cfg['input_files'] if not d.endswith('metadata.yml')
     ]
     for input_dir in input_dirs:
-        for (root, _, files) in os.walk(input_dir):
-            if pattern is not None:
-                files = fnmatch.filter(files, pattern)
-            files = [os.path.join(root, f) for f in files]
-            ancestor_files.extend(files)
+        index = _get_ancestor_index(input_dir, refresh=refresh)
+        ancestor_files.extend(_match_ancestor_index(index, pattern, regex))
     return ancestor_files
 
 
-def get_ancestor_file(cfg, pattern):
+def get_ancestor_file(cfg, pattern=None, regex=None, refresh=False):
     """Return a desired file in the ancestor directories.
 
     Parameters
     ----------
     cfg : dict
         Diagnostic script configuration.
-    pattern : str
+    pattern : str, optional
         Pattern which specifies the name of the file.
+    regex : str, optional
+        Regular expression which specifies the name of the file.
+    refresh : bool, optional (default: False)
+        Rescan the ancestor directories.
 
     Returns
     -------
@@ -83,22 +251,214 @@ def get_ancestor_file(cfg, pattern):
         Full path to the file or `None` if file not found.
 
     """
-    files = get_all_ancestor_files(cfg, pattern=pattern)
+    files = get_all_ancestor_files(cfg,
+                                   pattern=pattern,
+                                   regex=regex,
+                                   refresh=refresh)
+    name = pattern if regex is None else regex
     if not files:
         logger.warning(
             "No file with requested name %s found in ancestor "
-            "directories", pattern)
+            "directories", name)
         return None
     if len(files) != 1:
         logger.warning(
             "Multiple files with requested pattern %s found (%s), returning "
-            "first appearance", pattern, files)
+            "first appearance", name, files)
     return files[0]
 
 
+def _encode_attribute(value):
+    """Convert :mod:`numpy` attribute values to JSON-serializable types."""
+    if isinstance(value, np.ndarray):
+        return {'ndarray': value.tolist(), 'dtype': value.dtype.str}
+    if isinstance(value, np.generic):
+        return {'scalar': value.item(), 'dtype': value.dtype.str}
+    return value
+
+
+def _decode_attribute(value):
+    """Restore :mod:`numpy` attribute values (see :func:`_encode_attribute`).
+
+    """
+    if isinstance(value, dict):
+        if 'ndarray' in value:
+            return np.array(value['ndarray'], dtype=value['dtype'])
+        return np.array(value['scalar'], dtype=value['dtype'])[()]
+    return value
+
+
+def _is_valid_standard_name(standard_name):
+    """Check if a standard name is accepted by :mod:`iris`."""
+    try:
+        iris.cube.Cube(0, standard_name=standard_name)
+    except ValueError:
+        return False
+    return True
+
+
+def _read_netcdf_header(path):
+    """Read metadata of the data variable of a netcdf file from its header.
+
+    The metadata is assembled like :mod:`iris` does it: attributes of the
+    variable take precedence over global attributes and invalid standard
+    names are moved to the long name (if not given) or to the attribute
+    ``invalid_standard_name``.
+
+    Returns
+    -------
+    dict or None
+        Metadata (JSON-serializable, see :func:`_encode_attribute`) or `None`
+        if the file cannot be opened or does not contain exactly one data
+        variable.
+
+    """
+    try:
+        dataset = netCDF4.Dataset(path)
+    except OSError:
+        return None
+    with dataset:
+        referenced = set(dataset.dimensions)
+        for var in dataset.variables.values():
+            for attr in _REFERENCE_ATTRIBUTES:
+                if attr in var.ncattrs():
+                    referenced.update(
+                        name for name in str(var.getncattr(attr)).split()
+                        if not name.endswith(':'))
+        data_vars = [
+            name for name in dataset.variables if name not in referenced
+        ]
+        if len(data_vars) != 1:
+            return None
+        var = dataset.variables[data_vars[0]]
+        var_attrs = {attr: var.getncattr(attr) for attr in var.ncattrs()}
+        attributes = {
+            attr: _encode_attribute(dataset.getncattr(attr))
+            for attr in dataset.ncattrs()
+        }
+        attributes.update({
+            attr: _encode_attribute(value)
+            for (attr, value) in var_attrs.items()
+            if attr not in _CF_ATTRIBUTES
+        })
+        long_name = var_attrs.get('long_name')
+        standard_name = var_attrs.get('standard_name')
+        if (standard_name is not None
+                and not _is_valid_standard_name(standard_name)):
+            if long_name is None:
+                long_name = standard_name
+            else:
+                attributes['invalid_standard_name'] = standard_name
+            standard_name = None
+        return {
+            'attributes': attributes,
+            'long_name': long_name,
+            'units': str(var_attrs.get('units', 'unknown')),
+            'calendar': var_attrs.get('calendar'),
+            'short_name': var.name,
+            'standard_name': standard_name,
+        }
+
+
+def _get_file_stamp(path):
+    """Get modification time and size of a file (`None` if not available)."""
+    try:
+        return list(get_file_stamp(path))
+    except OSError:
+        return None
+
+
+def _load_metadata_index(index_path):
+    """Load file containing cached netcdf metadata."""
+    if index_path is None:
+        return {}
+    try:
+        with open(index_path, 'r') as infile:
+            index = json.load(infile)
+    except (OSError, ValueError):
+        return {}
+    if index.get('version') != METADATA_INDEX_VERSION:
+        return {}
+    return index.get('files', {})
+
+
+def _save_metadata_index(index_path, files):
+    """Save file containing cached netcdf metadata."""
+    if index_path is None:
+        return
+    tmp_path = '{}.{}.tmp'.format(index_path, os.getpid())
+    try:
+        with open(tmp_path, 'w') as outfile:
+            json.dump({
+                'version': METADATA_INDEX_VERSION,
+                'files': files,
+            }, outfile)
+        os.replace(tmp_path, index_path)
+    except (OSError, TypeError, ValueError) as exc:
+        logger.debug("Could not write metadata index %s: %s", index_path,
+                     exc)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _read_netcdf_headers(paths, index_path=None, max_workers=1):
+    """Read headers of netcdf files, using and updating the metadata index."""
+    headers = {}
+    index = _load_metadata_index(index_path)
+    missing = []
+    for path in paths:
+        stamp = _get_file_stamp(path)
+        cached = index.get(os.path.abspath(path))
+        if stamp is not None and cached is not None and (cached['stamp']
+                                                         == stamp):
+            headers[path] = cached['metadata']
+        else:
+            missing.append((path, stamp))
+
+    # Read headers of new or modified files
+    if max_workers > 1 and len(missing) >= MIN_FILES_FOR_PARALLEL_SCAN:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            new_headers = list(
+                executor.map(_read_netcdf_header,
+                             [path for (path, _) in missing]))
+    else:
+        new_headers = [_read_netcdf_header(path) for (path, _) in missing]
+
+    # Update metadata index
+    changed = False
+    for ((path, stamp), header) in zip(missing, new_headers):
+        headers[path] = header
+        if stamp is None:
+            continue
+        index[os.path.abspath(path)] = {'stamp': stamp, 'metadata': header}
+        changed = True
+    if changed:
+        _save_metadata_index(index_path, index)
+    return headers
+
+
+def _get_cube_metadata(path):
+    """Get metadata of a netcdf file by loading it with :mod:`iris`."""
+    cube = iris.load_cube(path)
+    dataset_info = dict(cube.attributes)
+    for var_key in VAR_KEYS:
+        dataset_info[var_key] = getattr(cube, var_key)
+    dataset_info['short_name'] = cube.var_name
+    dataset_info['standard_name'] = cube.standard_name
+    return dataset_info
+
+
 def netcdf_to_metadata(cfg, pattern=None, root=None):
     """Convert attributes of netcdf files to list of metadata.
 
+    Only the headers of the files are read, for many files in parallel by at
+    most :const:`MAX_SCAN_WORKERS` processes (or `max_parallel_tasks` if
+    given in ``cfg`` and smaller). The results are cached in the file
+    ``.netcdf_metadata.json`` in the work directory of the diagnostic (if
+    given in ``cfg``) and reused as long as the files are not modified.
+    Files whose data variable cannot be determined from the header are loaded
+    with :mod:`iris`.
+
     Parameters
     ----------
     cfg : dict
@@ -124,16 +484,30 @@ def netcdf_to_metadata(cfg, pattern=None, root=None):
             files = [os.path.join(base, f) for f in files]
             all_files.extend(files)
     all_files = fnmatch.filter(all_files, '*.nc')
+    if 'work_dir' in cfg:
+        index_path = os.path.join(cfg['work_dir'], METADATA_INDEX)
+    else:
+        index_path = None
+    max_workers = min(MAX_SCAN_WORKERS,
+                      cfg.get('max_parallel_tasks') or MAX_SCAN_WORKERS)
+    headers = _read_netcdf_headers(all_files, index_path, max_workers)
 
     # Iterate over netcdf files
     metadata = []
     for path in all_files:
-        cube = iris.load_cube(path)
-        dataset_info = dict(cube.attributes)
-        for var_key in VAR_KEYS:
-            dataset_info[var_key] = getattr(cube, var_key)
-        dataset_info['short_name'] = cube.var_name
-        dataset_info['standard_name'] = cube.standard_name
+        header = headers[path]
+        if header is None:
+            dataset_info = _get_cube_metadata(path)
+        else:
+            dataset_info = {
+                attr: _decode_attribute(value)
+                for (attr, value) in header['attributes'].items()
+            }
+            dataset_info['long_name'] = header['long_name']
+            dataset_info['units'] = cf_units.Unit(header['units'],
+                                                  calendar=header['calendar'])
+            dataset_info['short_name'] = header['short_name']
+            dataset_info['standard_name'] = header['standard_name']
         dataset_info['filename'] = path
 
         # Check if necessary keys are available
@@ -177,13 +551,19 @@ def metadata_to_netcdf(cube, metadata):
     iris_save(cube, metadata['filename'])
 
 
-def save_1d_data(cubes, path, coord_name, var_attrs, attributes=None):
+def save_1d_data(cubes,
+                 path,
+                 coord_name,
+                 var_attrs,
+                 attributes=None,
+                 chunksizes=None):
     """Save 1D data for multiple datasets.
 
     Create 2D cube with the dimensionsal coordinate `coord_name` and the
     auxiliary coordinate `dataset` and save 1D data for every dataset given.
     The cube is filled with missing values where no data exists for a dataset
-    at a certain point.
+    at a certain point. The data of the `cubes` is written directly into the
+    2D array, one cube at a time.
 
     Note
     ----
@@ -202,6 +582,8 @@ def save_1d_data(cubes, path, coord_name, var_attrs, attributes=None):
         Attributes for the variable (`short_name`, `long_name`, or `units`).
     attributes : dict, optional
         Additional attributes for the cube.
+    chunksizes : tuple of int, optional
+        Chunk sizes (dataset, `coord_name`) of the netCDF variable.
 
     """
     var_attrs = dict(var_attrs)
@@ -214,23 +596,33 @@ def save_1d_data(cubes, path, coord_name, var_attrs, attributes=None):
         return
     datasets = list(cubes.keys())
     cube_list = iris.cube.CubeList(list(cubes.values()))
-    cube_list = unify_1d_cubes(cube_list, coord_name)
-    data = [c.data for c in cube_list]
+    coord = _get_union_coord(cube_list, coord_name)
+    try:
+        # Convert AuxCoord to DimCoord if necessary and possible
+        coord = iris.coords.DimCoord.from_coord(coord)
+    except ValueError:
+        pass
+    data = np.full((len(datasets), coord.shape[0]), np.nan)
+    for (idx, cube) in enumerate(cube_list):
+        indices = _get_ref_indices(coord.points, cube.coord(coord_name).points)
+        data[idx, indices] = np.ma.filled(cube.data, np.nan)
     dataset_coord = iris.coords.AuxCoord(datasets, long_name='dataset')
-    coord = cube_list[0].coord(coord_name)
     if attributes is None:
         attributes = {}
     var_attrs['var_name'] = var_attrs.pop('short_name')
 
     # Create new cube
-    cube = iris.cube.Cube(np.ma.array(data),
+    cube = iris.cube.Cube(np.ma.masked_invalid(data, copy=False),
                           aux_coords_and_dims=[(dataset_coord, 0), (coord, 1)],
                           attributes=attributes,
                           **var_attrs)
-    iris_save(cube, path)
+    if chunksizes is None:
+        iris_save(cube, path)
+    else:
+        iris_save(cube, path, chunksizes=chunksizes)
 
 
-def iris_save(source, path):
+def iris_save(source, path, **kwargs):
     """Save :mod:`iris` objects with correct attributes.
 
     Parameters
@@ -239,6 +631,9 @@ def iris_save(source, path):
         Cube(s) to be saved.
     path : str
         Path to the new file.
+    **kwargs
+        Additional keyword arguments for :func:`iris.save` (e.g.
+        `chunksizes`).
 
     """
     if isinstance(source, iris.cube.Cube):
@@ -246,7 +641,7 @@ def iris_save(source, path):
     else:
         for cube in source:
             cube.attributes['filename'] = path
-    iris.save(source, path)
+    iris.save(source, path, **kwargs)
     logger.info("Wrote %s", path)
 
 
@@ -10,6 +10,21 @@ from ._base import group_metadata
 logger = logging.getLogger(__name__)
 
 
+def _get_ref_indices(ref_points, points):
+    """Get indices of `points` in `ref_points`.
+
+    Returns `None` if not all `points` are elements of `ref_points`.
+
+    """
+    sorter = np.argsort(ref_points, kind='stable')
+    positions = np.searchsorted(ref_points, points, sorter=sorter)
+    positions = np.clip(positions, 0, len(ref_points) - 1)
+    indices = sorter[positions]
+    if not np.array_equal(ref_points[indices], points):
+        return None
+    return indices
+
+
 def _transform_coord_to_ref(cubes, ref_coord):
     """Transform coordinates of cubes to reference."""
     try:
@@ -26,12 +41,16 @@ def _transform_coord_to_ref(cubes, ref_coord):
     new_cubes = iris.cube.CubeList()
     for cube in cubes:
         coord = cube.coord(coord_name)
-        if not np.all(np.isin(coord.points, ref_coord.points)):
+        if len(np.unique(coord.points)) != len(coord.points):
+            raise ValueError(
+                f"Coordinate '{coord_name}' of cube\n{cube}\n is not unique, "
+                f"transformation not possible")
+        indices = _get_ref_indices(ref_coord.points, coord.points)
+        if indices is None:
             raise ValueError(
                 f"Coordinate {coord} of cube\n{cube}\nis not subset of "
                 f"reference coordinate {ref_coord}")
         new_data = np.full(ref_coord.shape, np.nan)
-        indices = np.where(np.in1d(ref_coord.points, coord.points))
         new_data[indices] = np.ma.filled(cube.data, np.nan)
         new_cube = iris.cube.Cube(np.ma.masked_invalid(new_data))
         if isinstance(ref_coord, iris.coords.DimCoord):
@@ -51,6 +70,31 @@ def _transform_coord_to_ref(cubes, ref_coord):
     return new_cubes
 
 
+def _get_union_coord(cubes, coord_name):
+    """Get union of the coordinates `coord_name` of 1D cubes."""
+    coords = []
+    for cube in cubes:
+        if cube.ndim != 1:
+            raise ValueError(f"Dimension of cube\n{cube}\nis not 1")
+        try:
+            new_coord = cube.coord(coord_name)
+        except iris.exceptions.CoordinateNotFoundError:
+            raise iris.exceptions.CoordinateNotFoundError(
+                f"'{coord_name}' is not a coordinate of cube\n{cube}")
+        if len(np.unique(new_coord.points)) != len(new_coord.points):
+            raise ValueError(
+                f"Coordinate '{coord_name}' of cube\n{cube}\n is not unique, "
+                f"unifying not possible")
+        coords.append(new_coord)
+    if coord_name == 'time':
+        iris.util.unify_time_units(cubes)
+        coords = [cube.coord(coord_name) for cube in cubes]
+    if len(coords) == 1:
+        return coords[0]
+    return coords[0].copy(
+        np.unique(np.concatenate([coord.points for coord in coords])))
+
+
 def check_coordinate(cubes, coord_name):
     """Compare coordinate of cubes and raise error if not identical.
 
@@ -240,29 +284,7 @@ def unify_1d_cubes(cubes, coord_name):
         are subsets of longest coordinate.
 
     """
-    ref_coord = None
-
-    # Get reference coordinate
-    for cube in cubes:
-        if cube.ndim != 1:
-            raise ValueError(f"Dimension of cube\n{cube}\nis not 1")
-        try:
-            new_coord = cube.coord(coord_name)
-        except iris.exceptions.CoordinateNotFoundError:
-            raise iris.exceptions.CoordinateNotFoundError(
-                f"'{coord_name}' is not a coordinate of cube\n{cube}")
-        if not np.array_equal(
-                np.unique(new_coord.points), np.sort(new_coord.points)):
-            raise ValueError(
-                f"Coordinate '{coord_name}' of cube\n{cube}\n is not unique, "
-                f"unifying not possible")
-        if ref_coord is None:
-            ref_coord = new_coord
-        else:
-            new_points = np.union1d(ref_coord.points, new_coord.points)
-            ref_coord = ref_coord.copy(new_points)
-    if coord_name == 'time':
-        iris.util.unify_time_units(cubes)
+    ref_coord = _get_union_coord(cubes, coord_name)
 
     # Transform all cubes
     return _transform_coord_to_ref(cubes, ref_coord)
@@ -13,20 +13,29 @@ import os
 
 import iris
 import iris.analysis.maths as imath
+import iris.coord_categorisation
 import iris.quickplot as qplt
 import matplotlib.pyplot as plt
 import numpy as np
 
-from esmvaltool.diag_scripts.shared import (apply_supermeans,
-                                            get_control_exper_obs,
+from esmvaltool.diag_scripts.shared import (get_control_exper_obs,
+                                            get_dataset_supermean,
                                             group_metadata, run_diagnostic)
-from esmvalcore.preprocessor import extract_region, extract_season
+from esmvalcore.preprocessor import extract_region
 
 logger = logging.getLogger(os.path.basename(__file__))
 
 
 _CMIP_TYPE = 'CMIP5'
 
+SEASONS = ['DJF', 'MAM', 'JJA', 'SON']
+
+# Analysed cubes per season (and 'alltime'), keyed on file name
+_PRODUCTS = {}
+
+# 2D masks, keyed on (mask file, threshold)
+_MASKS = {}
+
 
 def plot_contour(cube, plt_title, file_name):
     """Plot a contour with iris.quickplot (qplot)"""
@@ -101,23 +110,49 @@ def plot_zonal_cubes(cube_1, cube_2, cfg, plot_data):
     plt.close()
 
 
-def apply_seasons(data_set_dict):
-    """Extract seaons and apply a time mean per season"""
-    data_file = data_set_dict['filename']
-    logger.info("Loading %s for seasonal extraction", data_file)
-    data_cube = iris.load_cube(data_file)
-    seasons = ['DJF', 'MAM', 'JJA', 'SON']
-    season_cubes = [extract_season(data_cube, season) for season in seasons]
-    season_meaned_cubes = [
-        season_cube.collapsed('time', iris.analysis.MEAN)
-        for season_cube in season_cubes
-    ]
+def _seasonal_means(data_cube):
+    """
+    Time mean of each season in one pass over the data.
 
-    return season_meaned_cubes
+    Returns a cube with a leading season dimension ordered as `SEASONS`.
+    """
+    if not data_cube.coords('clim_season'):
+        iris.coord_categorisation.add_season(data_cube, 'time',
+                                             name='clim_season')
+    season_cube = data_cube.aggregated_by('clim_season', iris.analysis.MEAN)
+    found = list(season_cube.coord('clim_season').points)
+    missing = [season for season in SEASONS if season.lower() not in found]
+    if missing:
+        raise ValueError(
+            "No data for season(s) {} in cube {}".format(
+                missing, data_cube.summary(shorten=True)))
+    return season_cube[[found.index(season.lower()) for season in SEASONS]]
+
+
+def _get_mask(cfg):
+    """Load the 2D mask given in the configuration (cached)."""
+    mask_file = os.path.join(cfg['2d_mask'])
+    threshold = cfg.get('mask_threshold')
+    key = (mask_file, threshold)
+    if key not in _MASKS:
+        mask_data = iris.load_cube(mask_file).data
+        if threshold is not None:
+            _MASKS[key] = np.ma.filled(mask_data > threshold, False)
+        else:
+            logger.warning('Could not find masking threshold')
+            logger.warning('Please specify it if needed')
+            logger.warning('Masking on 0-values = True (masked value)')
+            _MASKS[key] = np.ma.filled(mask_data == 0, False)
+    return _MASKS[key]
 
 
 def coordinate_collapse(data_set, cfg):
-    """Perform coordinate-specific collapse and (if) area slicing and mask"""
+    """
+    Perform coordinate-specific collapse and (if) area slicing and mask
+
+    Extra leading dimensions (e.g. seasons) are carried through unchanged,
+    so several time periods are processed at once.
+    """
     # see what analysis needs performing
     analysis_type = cfg['analysis_type']
 
@@ -132,18 +167,10 @@ def coordinate_collapse(data_set, cfg):
 
     # if apply mask
     if '2d_mask' in cfg:
-        mask_file = os.path.join(cfg['2d_mask'])
-        mask_cube = iris.load_cube(mask_file)
-        if 'mask_threshold' in cfg:
-            thr = cfg['mask_threshold']
-            data_set.data = np.ma.masked_array(
-                data_set.data, mask=(mask_cube.data > thr))
-        else:
-            logger.warning('Could not find masking threshold')
-            logger.warning('Please specify it if needed')
-            logger.warning('Masking on 0-values = True (masked value)')
-            data_set.data = np.ma.masked_array(
-                data_set.data, mask=(mask_cube.data == 0))
+        mask = _get_mask(cfg)
+        data_set.data = np.ma.masked_array(
+            data_set.data,
+            mask=np.broadcast_to(mask, data_set.shape))
 
     # if zonal mean on LON
     if analysis_type == 'zonal_mean':
@@ -160,10 +187,37 @@ def coordinate_collapse(data_set, cfg):
     return data_set
 
 
+def get_analysed_data(data_set_dict, cfg, seasonal=False):
+    """
+    Time mean(s) of a dataset with the configured analysis applied (cached).
+
+    The products of every dataset are computed only once, however many
+    comparisons they take part in.
+
+    Returns
+    -------
+    dict
+        Analysed cube for `'alltime'` and, if `seasonal`, for each of
+        `SEASONS`.
+    """
+    data_file = data_set_dict['filename']
+    products = _PRODUCTS.setdefault(data_file, {})
+    if 'alltime' not in products:
+        products['alltime'] = coordinate_collapse(
+            get_dataset_supermean(data_set_dict), cfg)
+    if seasonal and not all(season in products for season in SEASONS):
+        logger.info("Loading %s for seasonal extraction", data_file)
+        season_cube = _seasonal_means(iris.load_cube(data_file))
+        season_cube = coordinate_collapse(season_cube, cfg)
+        for (idx, season) in enumerate(SEASONS):
+            products[season] = season_cube[idx]
+    return products
+
+
 def do_preamble(cfg):
     """Execute some preamble functionality"""
     # prepare output dirs
-    time_chunks = ['alltime', 'DJF', 'MAM', 'JJA', 'SON']
+    time_chunks = ['alltime'] + SEASONS
     time_plot_dirs = [
         os.path.join(cfg['plot_dir'], t_dir) for t_dir in time_chunks
     ]
@@ -193,13 +247,12 @@ def plot_ctrl_exper(ctrl, exper, cfg, plot_key):
 
 def plot_ctrl_exper_seasons(ctrl_seasons, exper_seasons, cfg, plot_key):
     """Call plotting functions and make plots with seasons"""
-    seasons = ['DJF', 'MAM', 'JJA', 'SON']
     if cfg['analysis_type'] == 'zonal_mean':
-        for c_i, e_i, s_n in zip(ctrl_seasons, exper_seasons, seasons):
+        for c_i, e_i, s_n in zip(ctrl_seasons, exper_seasons, SEASONS):
             plot_info = [plot_key, 'latitude', s_n]
             plot_zonal_cubes(c_i, e_i, cfg, plot_info)
     elif cfg['analysis_type'] == 'meridional_mean':
-        for c_i, e_i, s_n in zip(ctrl_seasons, exper_seasons, seasons):
+        for c_i, e_i, s_n in zip(ctrl_seasons, exper_seasons, SEASONS):
             plot_info = [plot_key, 'longitude', s_n]
             plot_zonal_cubes(c_i, e_i, cfg, plot_info)
 
@@ -220,33 +273,25 @@ def main(cfg):
         plot_key = short_name + '_' + ctrl['dataset'] \
             + '_vs_' + exper['dataset']
 
-        # get seasons if needed then apply analysis
-        if cfg['seasonal_analysis']:
-            ctrl_seasons = apply_seasons(ctrl)
-            exper_seasons = apply_seasons(exper)
-            ctrl_seasons = [
-                coordinate_collapse(cts, cfg) for cts in ctrl_seasons
-            ]
-            exper_seasons = [
-                coordinate_collapse(exps, cfg) for exps in exper_seasons
-            ]
-            plot_ctrl_exper_seasons(ctrl_seasons, exper_seasons, cfg, plot_key)
-
-        # apply the supermeans (MEAN on time), collapse a coord and plot
-        ctrl, exper, obs_list = apply_supermeans(ctrl, exper, obs)
-        ctrl = coordinate_collapse(ctrl, cfg)
-        exper = coordinate_collapse(exper, cfg)
-        plot_ctrl_exper(ctrl, exper, cfg, plot_key)
+        # analyse each dataset once, then compare the cached products
+        seasonal = cfg['seasonal_analysis']
+        ctrl_data = get_analysed_data(ctrl, cfg, seasonal=seasonal)
+        exper_data = get_analysed_data(exper, cfg, seasonal=seasonal)
+        if seasonal:
+            plot_ctrl_exper_seasons(
+                [ctrl_data[season] for season in SEASONS],
+                [exper_data[season] for season in SEASONS], cfg, plot_key)
+        plot_ctrl_exper(ctrl_data['alltime'], exper_data['alltime'], cfg,
+                        plot_key)
 
         # apply desired analysis on obs's
-        if obs_list:
-            for obs_i, obsfile in zip(obs_list, obs):
-                obs_analyzed = coordinate_collapse(obs_i, cfg)
-                obs_name = obsfile['dataset']
-                plot_key = short_name + '_CONTROL_vs_' + obs_name
-                if cfg['analysis_type'] == 'lat_lon':
-                    plot_latlon_cubes(
-                        ctrl, obs_analyzed, cfg, plot_key, obs_name=obs_name)
+        for obsfile in obs:
+            obs_analyzed = get_analysed_data(obsfile, cfg)['alltime']
+            obs_name = obsfile['dataset']
+            plot_key = short_name + '_CONTROL_vs_' + obs_name
+            if cfg['analysis_type'] == 'lat_lon':
+                plot_latlon_cubes(ctrl_data['alltime'], obs_analyzed, cfg,
+                                  plot_key, obs_name=obs_name)
 
 
 if __name__ == '__main__':
@@ -5,6 +5,7 @@ Author: Federico Serva (ISAC-CNR & ISMAR-CNR, Italy)
 Copernicus C3S 34a lot 2 (MAGIC)
 """
 
+import iris
 import numpy as np
 import netCDF4 as nc4
 from scipy import signal
@@ -29,149 +30,134 @@ def butter_filter(data, freq, lowcut=None, order=2):
     return ysig
 
 
-def zmnam_calc(da_fname, outdir, src_props):
-    """Function to do EOF/PC decomposition of zg field."""
-    deg_to_r = np.pi / 180.
-    lat_weighting = True
-    outfiles = []
-
-    # Note: daily/monthly means have been
-    # already subtracted from daily/monthly files
-
-    # Open daily data
+def coord_metadata(coord):
+    """Get the netCDF attributes of a coordinate."""
+    return {
+        'long_name': coord.long_name or coord.standard_name,
+        'units': str(coord.units.origin if coord.units.is_time_reference()
+                     else coord.units),
+        'positive': coord.attributes.get('positive', 'down'),
+        'axis': iris.util.guess_coord_axis(coord),
+    }
 
-    in_file = nc4.Dataset(da_fname, "r")
-    time_dim = in_file.variables['time'][:]
-    time_nam = in_file.variables['time'].long_name
-    time_uni = in_file.variables['time'].units
-    time_cal = in_file.variables['time'].calendar
-    time = np.array(time_dim[:], dtype='d')
-    # startdate = nc4.num2date(time[0], time_uni, time_cal)
-    date = nc4.num2date(time, in_file.variables['time'].units,
-                        in_file.variables['time'].calendar)
 
-    lev = np.array(in_file.variables['plev'][:], dtype='d')
-    lev_nam = in_file.variables['plev'].long_name
-    lev_uni = in_file.variables['plev'].units
-    lev_pos = in_file.variables['plev'].positive
-    lev_axi = in_file.variables['plev'].axis
+def _monthly_means(data, date):
+    """
+    Average data along the first (time) axis over calendar months.
 
-    lat = np.array(in_file.variables['lat'][:], dtype='d')
-    # lat_nam = in_file.variables['lat'].long_name
-    lat_uni = in_file.variables['lat'].units
-    lat_axi = in_file.variables['lat'].axis
+    Only months that contain their 15th day are retained; the index of that
+    day is returned along with the means.
+    """
+    month_ids = np.array([day.year * 100 + day.month for day in date])
+    is_mid = np.array([day.day == 15 for day in date])
 
-    lon = np.array(in_file.variables['lon'][:], dtype='d')
-    # lon_nam = in_file.variables['lon'].long_name
-    lon_uni = in_file.variables['lon'].units
-    lon_axi = in_file.variables['lon'].axis
+    # Time steps are sorted, so each month is a contiguous block
+    (_, sta_mon, n_days) = np.unique(month_ids, return_index=True,
+                                     return_counts=True)
+    means = np.add.reduceat(data, sta_mon, axis=0) / n_days[:, np.newaxis]
+    has_mid = np.add.reduceat(is_mid, sta_mon) > 0
 
-    zg_da = np.squeeze(np.array(in_file.variables['zg'][:], dtype='d'))
+    return (means[has_mid], np.flatnonzero(is_mid))
 
-    in_file.close()
 
-    n_tim = len(time_dim)
-    print('end infile close')
+def _leading_eofs(data, weights):
+    """
+    Leading EOF and standardized PC of each level of a (time, lev, lat) field.
 
-    # Start zmNAM index calculation
+    All levels are decomposed at once. The covariance matrices and the
+    projections are computed in single precision, the (small) symmetric
+    eigenproblems in double precision.
 
-    # Lowpass filter
-    zg_da_lp = butter_filter(zg_da, 1, lowcut=1. / 90, order=2)
-
-    # Outputs: stored by level
-    # EOFs, eigenvalues, daily and monthly PCs
-    eofs = np.zeros((len(lev), len(lat)), dtype='d')
-    eigs = np.zeros(len(lev), dtype='d')
-    pcs_da = np.zeros((n_tim, len(lev)), dtype='d')
-
-    # Calendar-independent monthly mean
-    sta_mon = []  # first day of the month
-    mid_mon = []  # 15th of the month
-    end_mon = []  # last day of the month (add +1 when slicing)
+    Returns
+    -------
+    tuple
+        EOFs (lev, lat), fraction of explained variance (lev) and
+        PCs (time, lev).
+    """
+    n_tim = data.shape[0]
+    anom = np.asarray(data * weights, dtype=np.float32)
+    anom -= np.mean(anom, axis=0)
 
-    mon = 999
-    idate = 0
+    # Covariance matrices (lev, lat, lat)
+    cov = np.matmul(anom.transpose(1, 2, 0), anom.transpose(1, 0, 2))
+    cov = cov.astype('d') / (n_tim - 1)
 
-    while idate < len(date):
+    # Eigenvalues in ascending order: the last one is the largest
+    (eigenval, eigenvec) = np.linalg.eigh(cov)
+    eigs = eigenval[:, -1] / np.sum(eigenval, axis=1)
+    lead_eof = eigenvec[:, :, -1]
 
-        # Save first day of the month
-        if date[idate].month != mon:
-            mon = date[idate].month
-            sta_mon.append(idate)
+    # PC calculation and standardization
+    pcs = np.einsum('tli,li->tl', anom,
+                    lead_eof.astype(np.float32)).astype('d')
+    pcs = (pcs - np.mean(pcs, axis=0)) / np.std(pcs, ddof=1, axis=0)
 
-        # Save month mid-day
-        if date[idate].day == 15:
-            mid_mon.append(idate)
+    # Latitude de-weighting
+    eofs = lead_eof / weights
 
-        # Save last day of the month
-        if ((idate == len(date) - 1) or
-            (date[idate].month == mon and
-             date[idate + 1].month != mon)):
-            end_mon.append(idate)
+    return (eofs, eigs, pcs)
 
-        idate += 1
 
-    pcs_mo = np.zeros((len(date[mid_mon]), len(lev)), dtype='d')
-
-    # Perform analysis by level
-    for i_lev in np.arange(len(lev)):
-        # Latitude weighting
-        if lat_weighting is True:
-            for j_lat in np.arange(len(lat)):
-                zg_da_lp[:, i_lev, j_lat] *= np.sqrt(
-                    abs(np.cos(lat[j_lat] * deg_to_r)))
-
-        zg_da_lp_an = zg_da_lp[:, i_lev, :] - np.mean(
-            zg_da_lp[:, i_lev, :], axis=0)
-        cov = np.dot(zg_da_lp_an.T, zg_da_lp_an) / (n_tim - 1)
-
-        # Compute eigenvectors and eigenvalues
-        eigenval, eigenvec = np.linalg.eig(cov)
+def zmnam_calc(da_cube, outdir, src_props):
+    """Function to do EOF/PC decomposition of zg field."""
+    deg_to_r = np.pi / 180.
+    lat_weighting = True
+    outfiles = []
 
-        sum_eigenval = np.sum(eigenval)
+    # Note: daily/monthly means have been
+    # already subtracted from daily/monthly data
 
-        eigenval_norm = eigenval[:] / sum_eigenval
+    # Daily data
 
-        # Largest eigenvalue
-        max_eigenval = eigenval_norm.argmax()
+    time_coord = da_cube.coord('time')
+    time_dim = time_coord.points
+    time_nam = coord_metadata(time_coord)['long_name']
+    time_uni = coord_metadata(time_coord)['units']
+    time_cal = time_coord.units.calendar
+    time = np.array(time_dim[:], dtype='d')
+    date = time_coord.units.num2date(time)
 
-        # PC calculation
-        pc = np.dot(zg_da_lp_an[:, :], eigenvec)
+    lev_coord = da_cube.coord('air_pressure')
+    lev = np.array(lev_coord.points, dtype='d')
+    lev_nam = coord_metadata(lev_coord)['long_name']
+    lev_uni = coord_metadata(lev_coord)['units']
+    lev_pos = coord_metadata(lev_coord)['positive']
+    lev_axi = coord_metadata(lev_coord)['axis']
 
-        # Latitude de-weighting
-        if lat_weighting is True:
-            for i_lat in np.arange(len(lat)):
-                eigenvec[i_lat, :] /= np.sqrt(
-                    abs(np.cos(lat[i_lat] * deg_to_r)))
+    lat_coord = da_cube.coord('latitude')
+    lat = np.array(lat_coord.points, dtype='d')
+    lat_uni = coord_metadata(lat_coord)['units']
+    lat_axi = coord_metadata(lat_coord)['axis']
 
-        # Retain leading standardized PC & EOF
-        lead_pc_mean = np.mean(pc[:, max_eigenval], axis=0)
-        lead_pc_std = np.std(pc[:, max_eigenval], ddof=1, axis=0)
-        lead_pc = (pc[:, max_eigenval] - lead_pc_mean) / lead_pc_std
-        lead_eof = eigenvec[:, max_eigenval]
+    lon_coord = da_cube.coord('longitude')
+    lon = np.array(lon_coord.points, dtype='d')
+    lon_uni = coord_metadata(lon_coord)['units']
+    lon_axi = coord_metadata(lon_coord)['axis']
 
-        max_lat = max(range(len(lat)), key=lambda x: lat[x])
-        min_lat = min(range(len(lat)), key=lambda x: lat[x])
+    zg_da = np.squeeze(np.array(da_cube.data, dtype='d'))
 
-        if lead_eof[max_lat] > lead_eof[min_lat]:
-            lead_pc *= -1
-            lead_eof *= -1
+    # Start zmNAM index calculation
 
-        lead_pc_mo = np.zeros(len(date[mid_mon]), dtype='d')
-        time_mo = np.zeros(len(date[mid_mon]), dtype='d')
+    # Lowpass filter
+    zg_da_lp = butter_filter(zg_da, 1, lowcut=1. / 90, order=2)
 
-        # print(lead_pc)
+    # Leading EOF, explained variance and daily PC of all levels
+    if lat_weighting is True:
+        weights = np.sqrt(abs(np.cos(lat * deg_to_r)))
+    else:
+        weights = np.ones(len(lat))
+    (eofs, eigs, pcs_da) = _leading_eofs(zg_da_lp, weights)
 
-        for k_mo in range(len(date[mid_mon])):
-            lead_pc_mo[k_mo] = np.mean(
-                lead_pc[sta_mon[k_mo]:end_mon[k_mo] + 1])
-            time_mo[k_mo] = time[mid_mon[k_mo]]
+    # Sign convention: EOF lower at the highest than at the lowest latitude
+    max_lat = lat.argmax()
+    min_lat = lat.argmin()
+    flip = np.where(eofs[:, max_lat] > eofs[:, min_lat], -1., 1.)
+    eofs *= flip[:, np.newaxis]
+    pcs_da *= flip[np.newaxis, :]
 
-        # Store PC/EOF for this level (no time dependent)
-        eigs[i_lev] = eigenval_norm[max_eigenval]
-        eofs[i_lev, :] = lead_eof
-        pcs_da[:, i_lev] = lead_pc
-        pcs_mo[:, i_lev] = lead_pc_mo
+    # Calendar-independent monthly mean
+    (pcs_mo, mid_mon) = _monthly_means(pcs_da, date)
+    time_mo = time[mid_mon]
 
     # Save output files
 
@@ -13,8 +13,10 @@ import netCDF4 as nc4
 import cartopy.crs as ccrs
 from cartopy.util import add_cyclic_point
 
+from zmnam_calc import coord_metadata
 
-def zmnam_plot(file_gh_mo, datafolder, figfolder, src_props,
+
+def zmnam_plot(cube_gh_mo, datafolder, figfolder, src_props,
                fig_fmt, write_plots):
     """Plotting of timeseries and maps for zmnam diagnostics."""
     plot_files = []
@@ -44,44 +46,28 @@ def zmnam_plot(file_gh_mo, datafolder, figfolder, src_props,
     pc_mo = np.array(in_file.variables['PC_mo'][:], dtype='d')
     in_file.close()
 
-    # Open monthly gh field
-    file_name = file_gh_mo
-    # print(datafolder + file_name)
-    in_file = nc4.Dataset(file_name, "r")
-    dims = list(in_file.dimensions.keys())[::-1]  # py3
-    print('mo full dims', dims)
-
-    # Double check on lat/lon names, possibly redundant
-    if 'latitude' in dims:
-        latn = 'latitude'
-    if 'lat' in dims:
-        latn = 'lat'
-    if 'longitude' in dims:
-        lonn = 'longitude'
-    if 'lon' in dims:
-        lonn = 'lon'
-    lat = np.array(in_file.variables[latn][:])
-    lon = np.array(in_file.variables[lonn][:])
-
-    zg_mo = np.array(in_file.variables['zg'][:])
+    # Monthly gh field
+    lat = np.array(cube_gh_mo.coord('latitude').points)
+    lon = np.array(cube_gh_mo.coord('longitude').points)
 
-    # Record attributes for output netCDFs
-    time_nam = in_file.variables['time'].long_name
-    time_uni = in_file.variables['time'].units
-    time_cal = in_file.variables['time'].calendar
+    zg_mo = np.array(cube_gh_mo.data)
 
-    lev_nam = in_file.variables['plev'].long_name
-    lev_uni = in_file.variables['plev'].units
-    lev_pos = in_file.variables['plev'].positive
-    lev_axi = in_file.variables['plev'].axis
+    # Record attributes for output netCDFs
+    time_nam = coord_metadata(cube_gh_mo.coord('time'))['long_name']
+    time_uni = coord_metadata(cube_gh_mo.coord('time'))['units']
+    time_cal = cube_gh_mo.coord('time').units.calendar
 
-    lat_uni = in_file.variables[latn].units
-    lat_axi = in_file.variables[latn].axis
+    lev_meta = coord_metadata(cube_gh_mo.coord('air_pressure'))
+    lev_nam = lev_meta['long_name']
+    lev_uni = lev_meta['units']
+    lev_pos = lev_meta['positive']
+    lev_axi = lev_meta['axis']
 
-    lon_uni = in_file.variables[lonn].units
-    lon_axi = in_file.variables[lonn].axis
+    lat_uni = coord_metadata(cube_gh_mo.coord('latitude'))['units']
+    lat_axi = coord_metadata(cube_gh_mo.coord('latitude'))['axis']
 
-    in_file.close()
+    lon_uni = coord_metadata(cube_gh_mo.coord('longitude'))['units']
+    lon_axi = coord_metadata(cube_gh_mo.coord('longitude'))['axis']
 
     # Save dates for timeseries
     date_list = []
@@ -5,22 +5,101 @@ Author: Federico Serva (ISAC-CNR & ISMAR-CNR, Italy)
 Copernicus C3S 34a lot 2 (MAGIC)
 """
 
-import cdo as cd
+import dask
+import dask.array as da
+import iris
+import numpy as np
+
+
+def _grouped_sum(data, index, n_groups):
+    """Sum data along the first axis over groups (sort and reduce)."""
+    order = np.argsort(index, kind='stable')
+    (groups, starts) = np.unique(index[order], return_index=True)
+    sums = np.zeros((n_groups, ) + data.shape[1:], dtype=data.dtype)
+    sums[groups] = np.add.reduceat(data[order], starts, axis=0)
+    return sums
+
+
+def _group_mean(data, index, n_groups):
+    """
+    Average lazy data along the time axis (first axis) over groups.
+
+    Missing values are ignored; groups without valid values are masked.
+
+    Parameters
+    ----------
+    data : dask.array.Array
+        Data with time as first dimension.
+    index : numpy.ndarray
+        Group index (0 to n_groups - 1) of each time step.
+    n_groups : int
+        Number of groups.
+
+    """
+    sums = []
+    counts = []
+    stop = 0
+    for chunk in data.chunks[0]:
+        (start, stop) = (stop, stop + chunk)
+        block = data[start:stop]
+        for (values, result) in (
+                (da.ma.filled(block, 0.).astype(float), sums),
+                ((~da.ma.getmaskarray(block)).astype(float), counts)):
+            result.append(
+                values.map_blocks(_grouped_sum,
+                                  index[start:stop],
+                                  n_groups,
+                                  chunks=((n_groups, ), ) + values.chunks[1:],
+                                  dtype=values.dtype))
+    sums = da.stack(sums).sum(axis=0)
+    counts = da.stack(counts).sum(axis=0)
+    return da.ma.masked_where(counts == 0., sums / da.maximum(counts, 1.))
+
+
+def _anomalies(data, groups):
+    """Subtract the mean of each group of time steps from lazy data."""
+    _, index = np.unique(groups, return_inverse=True)
+    index = index.ravel()
+    means = _group_mean(data, index, index.max() + 1)
+    return data - means[index]
 
 
 def zmnam_preproc(ifile):
-    """Preprocessing of the input dataset files."""
-    cdo = cd.Cdo()
+    """
+    Preprocessing of the input dataset files.
+
+    Returns the daily zonal mean anomalies and the monthly anomalies of the
+    geopotential height as cubes. Both are computed in one pass over the
+    lazy input data.
+    """
+    cube = iris.load_cube(ifile)
+
     # Delete leap day, if any.
-    full_da_nl = cdo.delete('month=2,day=29', input=ifile)
+    time = cube.coord('time')
+    dates = time.units.num2date(time.points)
+    years = np.array([date.year for date in dates])
+    months = np.array([date.month for date in dates])
+    days = np.array([date.day for date in dates])
+    keep = ~((months == 2) & (days == 29))
+    if not keep.all():
+        cube = cube[np.flatnonzero(keep)]
+        years, months, days = years[keep], months[keep], days[keep]
+
+    # Compute anomalies from the daily means of the zonal mean.
+    # The zonal mean is linear, so it is taken first.
+    cube_zm = cube.collapsed('longitude', iris.analysis.MEAN)
+    gh_da_an_zm = _anomalies(cube_zm.lazy_data(), months * 100 + days)
 
-    # Compute anomalies from the daily/monthly means.
-    gh_da_dm = cdo.ydaymean(input=full_da_nl)
-    gh_da_an = cdo.sub(input=full_da_nl + ' ' + gh_da_dm)
-    gh_da_an_zm = cdo.zonmean(input=gh_da_an)
+    # Compute anomalies from the monthly means.
+    month_ids, month_index = np.unique(years * 100 + months,
+                                       return_index=True)
+    gh_mo = _group_mean(cube.lazy_data(),
+                        np.searchsorted(month_ids, years * 100 + months),
+                        len(month_ids))
+    gh_mo_an = _anomalies(gh_mo, month_ids % 100)
 
-    gh_mo = cdo.monmean(input=full_da_nl)
-    gh_mo_mm = cdo.ymonmean(input=gh_mo)
-    gh_mo_an = cdo.sub(input=gh_mo + ' ' + gh_mo_mm)
+    # Read the input data only once for both results
+    gh_da_an_zm, gh_mo_an = dask.compute(gh_da_an_zm, gh_mo_an)
 
-    return (gh_da_an_zm, gh_mo_an)
+    return (cube_zm.copy(data=gh_da_an_zm),
+            cube[month_index].copy(data=gh_mo_an))
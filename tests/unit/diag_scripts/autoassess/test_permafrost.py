@@ -0,0 +1,133 @@
+"""Tests for the module :mod:`permafrost` of the autoassess diagnostics."""
+
+import dask.array as da
+import iris
+import numpy as np
+import pytest
+
+from esmvaltool.diag_scripts.autoassess.land_surface_permafrost import (
+    permafrost, permafrost_koven_sites)
+
+SOIL_DEPTHS = [0.05, 0.225, 0.675, 2.0]
+
+# Two sequences of soil temperatures (in degC) and their numbers of points
+# ending a window of 1, 2 and 3 frozen time steps
+TEMPS = np.array([
+    [-1.0, -2.0, -1.0, 1.0, -1.0, -3.0, 2.0],
+    [1.0, 2.0, -1.0, -1.0, 3.0, 4.0, 5.0],
+])
+COUNTS = {1: [5, 2], 2: [3, 1], 3: [1, 0]}
+
+
+@pytest.mark.parametrize('frozen_length', [1, 2, 3])
+def test_num_frozen(frozen_length):
+    """Test counts of windows full of frozen values."""
+    counts = permafrost.num_frozen(TEMPS, 0.0, -1, frozen_length)
+    assert not np.ma.isMaskedArray(counts)
+    np.testing.assert_array_equal(counts, COUNTS[frozen_length])
+    counts = permafrost.num_frozen(TEMPS.T, 0.0, 0, frozen_length)
+    np.testing.assert_array_equal(counts, COUNTS[frozen_length])
+
+
+def test_num_frozen_masked():
+    """Test that masked values extend runs but need a valid neighbour."""
+    temps = np.ma.masked_array(
+        [[-1.0, 0.0, -1.0, 1.0, 0.0, 0.0, 2.0],
+         [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]],
+        mask=[[0, 1, 0, 0, 1, 1, 0],
+              [1, 1, 1, 1, 1, 1, 1]])
+    counts = permafrost.num_frozen(temps, 0.0, 1, 2)
+    np.testing.assert_array_equal(np.ma.getmaskarray(counts), [False, True])
+    assert counts[0] == 2
+
+
+@pytest.mark.parametrize('frozen_length', [1, 2, 3])
+def test_lazy_num_frozen(frozen_length):
+    """Test chunked count of lazy data."""
+    data = np.stack([TEMPS.T] * 3, axis=-1)
+    lazy_data = da.from_array(data, chunks=(3, 1, 2))
+    counts = permafrost.lazy_num_frozen(lazy_data, 0.0, 0, frozen_length)
+    assert isinstance(counts, da.Array)
+    np.testing.assert_array_equal(counts.compute(),
+                                  np.transpose([COUNTS[frozen_length]] * 3))
+
+
+def _get_cube(data_func, with_depth):
+    """Get monthly cube on a grid covering the Koven sites."""
+    time = iris.coords.DimCoord(np.arange(24) * 30.0 + 15.0,
+                                standard_name='time',
+                                units='days since 2000-01-01')
+    lat = iris.coords.DimCoord(np.arange(50.0, 80.0, 2.5),
+                               standard_name='latitude',
+                               units='degrees')
+    lon = iris.coords.DimCoord(np.arange(-180.0, 180.0, 2.5),
+                               standard_name='longitude',
+                               units='degrees')
+    coords = [time.points[:, None, None], lat.points[None, :, None],
+              lon.points[None, None, :]]
+    if with_depth:
+        depth = iris.coords.DimCoord(SOIL_DEPTHS,
+                                     standard_name='depth',
+                                     units='m')
+        coords = [c[:, None] for c in coords]
+        coords.insert(1, depth.points[None, :, None, None])
+        dims = [(time, 0), (depth, 1), (lat, 2), (lon, 3)]
+    else:
+        coords.insert(1, 0.0)
+        dims = [(time, 0), (lat, 1), (lon, 2)]
+    data = data_func(*coords)
+    return iris.cube.Cube(np.broadcast_to(data, [len(c.points)
+                                                 for (c, _) in dims]),
+                          units='K',
+                          dim_coords_and_dims=dims)
+
+
+def _site_field(lat, lon):
+    """Field which is different at every site and linear in lat and lon."""
+    return 0.1 * lat + 0.01 * lon
+
+
+def test_koven_temp_offsets():
+    """Test offsets are calculated at the sites (with depth interpolation).
+
+    Soil temperatures are linear in depth, so the interpolation to 0m and 1m
+    is exact, and the offset between surface and air varies from site to
+    site.
+    """
+    soiltemp = _get_cube(
+        lambda time, depth, lat, lon: 260.0 + _site_field(lat, lon) +
+        0.5 * depth, True)
+    airtemp = _get_cube(lambda time, depth, lat, lon: 260.0, False)
+    soiltemp_sites = permafrost.extract_sites(
+        permafrost_koven_sites.site_points, soiltemp)
+    airtemp_sites = permafrost.extract_sites(
+        permafrost_koven_sites.site_points, airtemp)
+    metrics = permafrost.koven_temp_offsets(soiltemp_sites, airtemp_sites)
+    expected = np.median(
+        _site_field(permafrost_koven_sites.lats,
+                    permafrost_koven_sites.lons))
+    assert metrics['offset 1m minus surface'] == pytest.approx(0.5)
+    assert metrics['offset surface minus air'] == pytest.approx(expected)
+
+
+def test_koven_temp_metrics():
+    """Test attenuation of the seasonal amplitude at the sites.
+
+    The amplitude of the soil temperature decays exponentially with depth,
+    so the log-linear interpolation to 0m and 1m is exact.
+    """
+    decay = 0.7
+
+    def cycle(time):
+        return np.cos(2.0 * np.pi * (time - 15.0) / 360.0)
+
+    soiltemp = _get_cube(
+        lambda time, depth, lat, lon: 260.0 + 5.0 * np.exp(-decay * depth) *
+        (1.0 + _site_field(lat, lon)) * cycle(time), True)
+    airtemp = _get_cube(
+        lambda time, depth, lat, lon: 260.0 + 10.0 *
+        (1.0 + _site_field(lat, lon)) * cycle(time), False)
+    metrics = permafrost.koven_temp_metrics(soiltemp, airtemp)
+    assert metrics['attenuation 1m over surface'] == pytest.approx(
+        np.exp(-decay))
+    assert metrics['attenuation surface over air'] == pytest.approx(0.5)
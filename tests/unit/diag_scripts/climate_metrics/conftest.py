@@ -0,0 +1,46 @@
+"""Shared fixtures for the tests of the climate metrics diagnostics."""
+
+import cf_units
+import iris
+import numpy as np
+import pytest
+
+
+def _get_cube(data, steps_per_year=1, start_year=1850):
+    """Get cube with leading time dimension and `year` coordinate.
+
+    Three-dimensional data gets a global (latitude, longitude) grid.
+
+    """
+    n_time = data.shape[0]
+    step = 360.0 / steps_per_year
+    time = iris.coords.DimCoord(
+        np.arange(n_time) * step + step / 2.0,
+        standard_name='time',
+        units=cf_units.Unit('days since {}-01-01'.format(start_year),
+                            calendar='360_day'))
+    year = iris.coords.AuxCoord(start_year + np.arange(n_time) //
+                                steps_per_year,
+                                var_name='year',
+                                long_name='year',
+                                units='1')
+    dim_coords = [(time, 0)]
+    if data.ndim == 3:
+        lat = iris.coords.DimCoord([-45.0, 45.0],
+                                   standard_name='latitude',
+                                   units='degrees')
+        lon = iris.coords.DimCoord([60.0, 180.0, 300.0],
+                                   standard_name='longitude',
+                                   units='degrees')
+        dim_coords.extend([(lat, 1), (lon, 2)])
+    return iris.cube.Cube(data,
+                          var_name='tas',
+                          units='K',
+                          dim_coords_and_dims=dim_coords,
+                          aux_coords_and_dims=[(year, 0)])
+
+
+@pytest.fixture
+def get_cube():
+    """Get function which creates cubes with a `year` coordinate."""
+    return _get_cube
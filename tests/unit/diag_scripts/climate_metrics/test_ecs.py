@@ -0,0 +1,107 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.climate_metrics.ecs`.
+
+"""
+
+import iris
+import numpy as np
+import pytest
+
+from esmvaltool.diag_scripts.climate_metrics import ecs
+
+# Annual mean tas anomalies of the abrupt4xCO2 runs and the parameters of
+# the linear relation rtnt = slope * tas + intercept of the datasets
+TAS_ANOM = np.array([1.0, 2.0, 3.0, 3.5, 4.0, 4.2])
+REGRESSIONS = {'MODEL1': (-2.0, 7.0), 'MODEL2': (-1.5, 6.0)}
+
+# Zero-mean seasonal cycle
+CYCLE = np.sin(2.0 * np.pi * (np.arange(12) + 0.5) / 12.0)
+
+
+def test_batch_linregress():
+    """Test regressions of many time series at once."""
+    x_data = np.arange(4.0)[:, np.newaxis]
+    y_data = np.array([
+        [1.0, 5.0, 1.0],
+        [3.0, 4.0, 0.0],
+        [5.0, 3.0, 0.0],
+        [7.0, 2.0, 1.0],
+    ])
+    reg = ecs.batch_linregress(x_data, y_data)
+    np.testing.assert_allclose(reg.slope, [2.0, -1.0, 0.0], atol=1e-14)
+    np.testing.assert_allclose(reg.intercept, [1.0, 5.0, 0.5])
+    np.testing.assert_allclose(reg.rvalue, [1.0, -1.0, 0.0], atol=1e-14)
+
+
+def test_annual_mean(get_cube):
+    """Test lazy annual means."""
+    cube = get_cube(np.arange(24.0), steps_per_year=12)
+    (years, means) = ecs._annual_mean(cube)
+    np.testing.assert_array_equal(years, [1850, 1851])
+    np.testing.assert_allclose(means.compute(), [5.5, 17.5])
+
+
+def _get_input_data(get_cube, tmp_path, grid_shape):
+    """Write monthly input data with a seasonal cycle and a drift."""
+    drift = np.arange(6.0)
+    runs = {
+        'piControl': (1850, {'tas': 280.0 + 0.1 * drift,
+                             'rtnt': 0.5 - 0.05 * drift}),
+    }
+    input_data = {'tas': [], 'rtnt': []}
+    for (dataset, (slope, intercept)) in REGRESSIONS.items():
+        runs['abrupt4xCO2'] = (1870, {
+            'tas': runs['piControl'][1]['tas'] + TAS_ANOM,
+            'rtnt': (runs['piControl'][1]['rtnt'] + slope * TAS_ANOM +
+                     intercept),
+        })
+        for (exp, (start_year, annual_data)) in runs.items():
+            for (var, annual) in annual_data.items():
+                data = (annual[:, np.newaxis] + CYCLE).ravel()
+                data = data.reshape(data.shape + (1, ) * len(grid_shape))
+                cube = get_cube(np.broadcast_to(data,
+                                                data.shape[:1] + grid_shape),
+                                steps_per_year=12,
+                                start_year=start_year)
+                path = str(tmp_path / '{}_{}_{}.nc'.format(var, dataset, exp))
+                iris.save(cube, path)
+                input_data[var].append({
+                    'dataset': dataset,
+                    'exp': exp,
+                    'filename': path,
+                    'project': 'CMIP5',
+                })
+    return input_data
+
+
+@pytest.mark.parametrize('grid_shape', [(), (2, 3)])
+def test_get_anomaly_data(get_cube, tmp_path, grid_shape):
+    """Test anomalies and regressions of all datasets."""
+    input_data = _get_input_data(get_cube, tmp_path, grid_shape)
+    anomaly_data = ecs.get_anomaly_data(input_data['tas'],
+                                        input_data['rtnt'])
+    assert set(anomaly_data) == set(REGRESSIONS)
+    for (dataset, (slope, intercept)) in REGRESSIONS.items():
+        data = anomaly_data[dataset]
+        assert len(data['ancestors']) == 4
+        for var in ('tas', 'rtnt'):
+            np.testing.assert_array_equal(data[var].coord('year').points,
+                                          np.arange(1870, 1876))
+        np.testing.assert_allclose(data['tas'].data, TAS_ANOM, atol=1e-12)
+        np.testing.assert_allclose(data['rtnt'].data,
+                                   slope * TAS_ANOM + intercept,
+                                   atol=1e-12)
+        if grid_shape:
+            assert data['rtnt_grid'].shape == (6, ) + grid_shape
+        else:
+            assert 'rtnt_grid' not in data
+
+    (regs, grid_regs) = ecs.get_regressions(anomaly_data)
+    for (dataset, (slope, intercept)) in REGRESSIONS.items():
+        assert regs[dataset].slope == pytest.approx(slope)
+        assert regs[dataset].intercept == pytest.approx(intercept)
+        assert regs[dataset].rvalue == pytest.approx(-1.0)
+        if grid_shape:
+            np.testing.assert_allclose(grid_regs[dataset].slope,
+                                       np.full(grid_shape, slope))
+        else:
+            assert dataset not in grid_regs
@@ -0,0 +1,59 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.climate_metrics.psi`.
+
+"""
+
+import numpy as np
+import pytest
+
+from esmvaltool.diag_scripts.climate_metrics import psi
+
+CFG = {'window_length': 6, 'lag': 1}
+
+# Any 6 consecutive values of t**2 minus their linear fit are
+# 2/3 * [5, -1, -4, -4, -1, 5], whose lag-1 autocorrelation is 1/6
+PSI_OF_SQUARE = 2.0 / 3.0 * np.sqrt(14.0 / np.log(6.0))
+
+
+def _get_tas(curvature):
+    """Get quadratic temperature time series (years along first axis)."""
+    years = np.arange(20.0).reshape((-1, ) + (1, ) * np.ndim(curvature))
+    return 285.0 + 0.01 * years + curvature * years**2
+
+
+def test_calculate_psi(get_cube):
+    """Test psi of a quadratic time series."""
+    cube = get_cube(_get_tas(0.003))
+    psi_cube = psi.calculate_psi(cube, CFG)
+    np.testing.assert_allclose(psi_cube.data,
+                               np.full(14, 0.003 * PSI_OF_SQUARE),
+                               rtol=1e-6)
+    np.testing.assert_array_equal(psi_cube.coord('year').points,
+                                  np.arange(1855, 1869))
+    assert psi_cube.attributes == {'window_length': 6, 'lag': 1}
+
+
+def test_calculate_psi_gridded(get_cube):
+    """Test psi of gridded data with a missing value."""
+    curvature = 0.001 * np.arange(1.0, 7.0).reshape(2, 3)
+    tas = np.ma.masked_array(_get_tas(curvature))
+    tas[10, 1, 2] = np.ma.masked
+    cube = get_cube(tas)
+    psi_cube = psi.calculate_psi(cube, CFG)
+    assert psi_cube.shape == (14, 2, 3)
+    assert psi_cube.coord('latitude') == cube.coord('latitude')
+    assert psi_cube.coord('longitude') == cube.coord('longitude')
+
+    # All windows containing the missing value are masked
+    mask = np.zeros((14, 2, 3), dtype=bool)
+    mask[5:11, 1, 2] = True
+    np.testing.assert_array_equal(np.ma.getmaskarray(psi_cube.data), mask)
+    expected = np.broadcast_to(curvature * PSI_OF_SQUARE, (14, 2, 3))
+    np.testing.assert_allclose(psi_cube.data[~mask], expected[~mask],
+                               rtol=1e-6)
+
+
+def test_calculate_psi_too_short(get_cube):
+    """Test error for too short time series."""
+    cube = get_cube(_get_tas(0.003)[:6])
+    with pytest.raises(ValueError):
+        psi.calculate_psi(cube, CFG)
@@ -0,0 +1,53 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.crem.ww09_esmvaltool`.
+
+"""
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from esmvaltool.diag_scripts.crem import ww09_esmvaltool as ww09
+
+VARIABLES = ['rsut', 'rlut']
+
+
+@pytest.fixture
+def pointers(tmp_path):
+    """Write daily data of two variables with 7 time steps."""
+    pointers = {}
+    for (idx, var) in enumerate(VARIABLES):
+        path = str(tmp_path / '{}.nc'.format(var))
+        with Dataset(path, 'w') as dataset:
+            dataset.createDimension('time', None)
+            dataset.createDimension('lat', 2)
+            variable = dataset.createVariable(var, 'f4', ('time', 'lat'))
+            variable[:] = 100.0 * idx + np.arange(14.0).reshape(7, 2)
+        pointers[var] = var
+        pointers[var + '_nc'] = path
+    return pointers
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_read_chunks(monkeypatch, pointers, max_workers):
+    """Test reading in chunks with and without worker processes."""
+    monkeypatch.setattr(ww09, 'TIME_CHUNK', 3)
+    chunks = list(ww09._read_chunks(pointers, VARIABLES, 7, max_workers))
+    assert [chunk['rsut'].shape[0] for chunk in chunks] == [3, 3, 1]
+    for (idx, var) in enumerate(VARIABLES):
+        np.testing.assert_array_equal(
+            np.concatenate([chunk[var] for chunk in chunks]),
+            100.0 * idx + np.arange(14.0).reshape(7, 2))
+
+
+def test_read_chunks_serial(monkeypatch, pointers):
+    """Test that a single worker reads without a process pool."""
+    def no_pool(*_, **__):
+        raise AssertionError("No process pool expected")
+
+    monkeypatch.setattr(ww09, 'ProcessPoolExecutor', no_pool)
+    monkeypatch.setattr(ww09, 'TIME_CHUNK', 5)
+    chunks = list(ww09._read_chunks(pointers, VARIABLES, 7, max_workers=1))
+    assert len(chunks) == 2
+    np.testing.assert_array_equal(chunks[1]['rlut'],
+                                  [[110.0, 111.0], [112.0, 113.0]])
+    assert not list(ww09._read_chunks(pointers, VARIABLES, 0, max_workers=1))
@@ -0,0 +1,106 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.emergent_constraints`.
+
+"""
+
+import numpy as np
+import pytest
+
+from esmvaltool.diag_scripts import emergent_constraints as ec
+
+# y = 2x + 1 plus residuals which are orthogonal to 1 and x, i.e. slope 2,
+# intercept 1, squared standard estimate of the error 4/3 and ssx 10
+X_DATA = np.array([0.0, 1.0, 2.0, 3.0, 4.0])
+Y_DATA = np.array([2.0, 2.0, 5.0, 6.0, 10.0])
+
+
+def _moments(y_lin, y_pdf):
+    """Get integral, mean and variance of a PDF."""
+    norm = ec.cdf(y_lin, y_pdf)[..., -1]
+    mean = ec.cdf(y_lin, y_lin * y_pdf)[..., -1] / norm
+    var = ec.cdf(y_lin, y_lin**2 * y_pdf)[..., -1] / norm - mean**2
+    return (norm, mean, var)
+
+
+@pytest.mark.parametrize('obs_std', [0.001, 0.5])
+def test_gaussian_pdf(obs_std):
+    """Test moments of the PDF of the target variable.
+
+    The mean is the regression line at the observational mean; the
+    variance adds the spread of the observations (scaled by the slope) to
+    the mean squared prediction error.
+
+    """
+    (y_lin, y_pdf) = ec.gaussian_pdf(X_DATA, Y_DATA, 2.5, obs_std,
+                                     n_points=500)
+    np.testing.assert_allclose(y_lin, np.linspace(-6.0, 18.0, 500))
+    (norm, mean, var) = _moments(y_lin, y_pdf)
+    expected_var = 4.0 * obs_std**2 + 4.0 / 3.0 * (
+        1.0 + 1.0 / 5.0 + (obs_std**2 + 0.5**2) / 10.0)
+    assert norm == pytest.approx(1.0, rel=1e-6)
+    assert mean == pytest.approx(6.0, rel=1e-6)
+    assert var == pytest.approx(expected_var, rel=1e-6)
+
+
+def test_gaussian_pdf_input_shapes():
+    """Test error for arrays with different shapes."""
+    with pytest.raises(ValueError):
+        ec.gaussian_pdf(X_DATA, Y_DATA[:-1], 2.5, 0.5)
+
+
+def test_bootstrap_gaussian_pdf():
+    """Test bootstrap PDFs against PDFs of the explicit resamples.
+
+    Resamples which contain the smallest and largest y value share the
+    target values with the original data, so their PDFs can be compared
+    directly.
+
+    """
+    (y_lin, y_pdfs) = ec.bootstrap_gaussian_pdf(X_DATA,
+                                                Y_DATA,
+                                                2.5,
+                                                0.5,
+                                                n_points=50,
+                                                n_bootstrap=30,
+                                                random_state=1)
+    assert y_pdfs.shape == (30, 50)
+    idx = np.random.RandomState(1).randint(0, 5, (30, 5))
+    n_compared = 0
+    for (resample, y_pdf) in zip(idx, y_pdfs):
+        if len(set(X_DATA[resample])) < 3 or {0, 4} - set(resample):
+            continue
+        (expected_y_lin, expected_pdf) = ec.gaussian_pdf(X_DATA[resample],
+                                                         Y_DATA[resample],
+                                                         2.5,
+                                                         0.5,
+                                                         n_points=50)
+        np.testing.assert_allclose(expected_y_lin, y_lin)
+        np.testing.assert_allclose(y_pdf, expected_pdf, rtol=1e-6,
+                                   atol=1e-12)
+        n_compared += 1
+    assert n_compared >= 3
+
+
+def test_bootstrap_gaussian_pdf_degenerate():
+    """Test that resamples without a regression give nan."""
+    (_, y_pdfs) = ec.bootstrap_gaussian_pdf(X_DATA[:2],
+                                            Y_DATA[:2],
+                                            2.5,
+                                            0.5,
+                                            n_bootstrap=50,
+                                            random_state=0)
+    assert np.all(np.isnan(y_pdfs))
+
+
+def test_cdf():
+    """Test CDF of multiple PDFs."""
+    data = np.array([0.0, 0.5, 1.0, 1.5, 2.0])
+    pdfs = np.array([
+        [0.5, 0.5, 0.5, 0.5, 0.5],
+        [0.0, 0.5, 1.0, 0.5, 0.0],
+    ])
+    np.testing.assert_allclose(ec.cdf(data, pdfs), [
+        [0.0, 0.25, 0.5, 0.75, 1.0],
+        [0.0, 0.125, 0.5, 0.875, 1.0],
+    ])
+    np.testing.assert_allclose(ec.cdf(data, pdfs[1]),
+                               [0.0, 0.125, 0.5, 0.875, 1.0])
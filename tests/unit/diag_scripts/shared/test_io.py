@@ -1,6 +1,7 @@
 """Tests for the module :mod:`esmvaltool.diag_scripts.shared.io`."""
 
 import os
+import time
 from collections import OrderedDict
 from copy import deepcopy
 
@@ -46,70 +47,121 @@ CFG = {
     'other_attr':
     'I am not used!',
 }
-ROOT_DIR = '/root/to/something'
+ANCESTOR_FILES = [
+    os.path.join('1', 'egg.yml'),
+    os.path.join('1', 'test.nc'),
+    os.path.join('1', 'root2', 'x.nc'),
+    os.path.join('1', 'root2', 'y.png'),
+    os.path.join('1', 'root3', 'egg.nc'),
+    os.path.join('2', 'test_1.nc'),
+    os.path.join('2', 'test_2.yml'),
+    os.path.join('2', 'root4', 'egg.nc'),
+]
 PATTERNS_FOR_ALL_ANCESTORS = [
-    (None, [
-        os.path.join(ROOT_DIR, 'test.nc'),
-        os.path.join(ROOT_DIR, 'egg.yml'),
-        os.path.join(ROOT_DIR, 'root2', 'x.nc'),
-        os.path.join(ROOT_DIR, 'root2', 'y.png'),
-        os.path.join(ROOT_DIR, 'root3', 'egg.nc'),
-        os.path.join(ROOT_DIR, 'test_1.nc'),
-        os.path.join(ROOT_DIR, 'test_2.yml'),
-        os.path.join(ROOT_DIR, 'root4', 'egg.nc'),
+    (None, None, ANCESTOR_FILES),
+    ('*', None, ANCESTOR_FILES),
+    ('*.nc', None, [
+        os.path.join('1', 'test.nc'),
+        os.path.join('1', 'root2', 'x.nc'),
+        os.path.join('1', 'root3', 'egg.nc'),
+        os.path.join('2', 'test_1.nc'),
+        os.path.join('2', 'root4', 'egg.nc'),
     ]),
-    ('*', [
-        os.path.join(ROOT_DIR, 'test.nc'),
-        os.path.join(ROOT_DIR, 'egg.yml'),
-        os.path.join(ROOT_DIR, 'root2', 'x.nc'),
-        os.path.join(ROOT_DIR, 'root2', 'y.png'),
-        os.path.join(ROOT_DIR, 'root3', 'egg.nc'),
-        os.path.join(ROOT_DIR, 'test_1.nc'),
-        os.path.join(ROOT_DIR, 'test_2.yml'),
-        os.path.join(ROOT_DIR, 'root4', 'egg.nc'),
+    ('test*', None, [
+        os.path.join('1', 'test.nc'),
+        os.path.join('2', 'test_1.nc'),
+        os.path.join('2', 'test_2.yml'),
     ]),
-    ('*.nc', [
-        os.path.join(ROOT_DIR, 'test.nc'),
-        os.path.join(ROOT_DIR, 'root2', 'x.nc'),
-        os.path.join(ROOT_DIR, 'root3', 'egg.nc'),
-        os.path.join(ROOT_DIR, 'test_1.nc'),
-        os.path.join(ROOT_DIR, 'root4', 'egg.nc'),
+    ('*.yml', None, [
+        os.path.join('1', 'egg.yml'),
+        os.path.join('2', 'test_2.yml'),
     ]),
-    ('test*', [
-        os.path.join(ROOT_DIR, 'test.nc'),
-        os.path.join(ROOT_DIR, 'test_1.nc'),
-        os.path.join(ROOT_DIR, 'test_2.yml'),
+    ('egg.nc*', None, [
+        os.path.join('1', 'root3', 'egg.nc'),
+        os.path.join('2', 'root4', 'egg.nc'),
     ]),
-    ('*.yml', [
-        os.path.join(ROOT_DIR, 'egg.yml'),
-        os.path.join(ROOT_DIR, 'test_2.yml'),
+    (None, r'test_\d\.nc', [
+        os.path.join('2', 'test_1.nc'),
     ]),
-    ('egg.nc*', [
-        os.path.join(ROOT_DIR, 'root3', 'egg.nc'),
-        os.path.join(ROOT_DIR, 'root4', 'egg.nc'),
+    (None, r'test', []),
+    ('*.nc', r'(x|egg)\..*', [
+        os.path.join('1', 'root2', 'x.nc'),
+        os.path.join('1', 'root3', 'egg.nc'),
+        os.path.join('2', 'root4', 'egg.nc'),
     ]),
 ]
 
 
-@pytest.mark.parametrize('pattern,output', PATTERNS_FOR_ALL_ANCESTORS)
-@mock.patch('esmvaltool.diag_scripts.shared.io.os.walk', autospec=True)
-def test_get_all_ancestor_files(mock_walk, pattern, output):
+@pytest.mark.parametrize('pattern,regex,output', PATTERNS_FOR_ALL_ANCESTORS)
+def test_get_all_ancestor_files(tmp_path, pattern, regex, output):
     """Test retrieving of ancestor files."""
-    input_dirs = [
-        [
-            (ROOT_DIR, ['dir', '__pycache__'], ['test.nc', 'egg.yml']),
-            (os.path.join(ROOT_DIR, 'root2'), ['d'], ['x.nc', 'y.png']),
-            (os.path.join(ROOT_DIR, 'root3'), [], ['egg.nc']),
-        ],
-        [
-            (ROOT_DIR, ['dir', '__pycache__'], ['test_1.nc', 'test_2.yml']),
-            (os.path.join(ROOT_DIR, 'root4'), ['d2'], ['egg.nc']),
+    for path in ANCESTOR_FILES:
+        path = tmp_path / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    for path in (('1', 'dir'), ('1', '__pycache__'), ('1', 'root2', 'd'),
+                 ('2', 'root4', 'd2')):
+        tmp_path.joinpath(*path).mkdir()
+    cfg = {
+        'input_files': [
+            'metadata.yml',
+            'test_metadata.yml',
+            str(tmp_path / '1'),
+            str(tmp_path / '2'),
         ],
-    ]
-    mock_walk.side_effect = input_dirs
-    files = io.get_all_ancestor_files(CFG, pattern=pattern)
+    }
+    output = [str(tmp_path / path) for path in output]
+    files = io.get_all_ancestor_files(cfg, pattern=pattern, regex=regex)
     assert files == output
 
+    # Refresh index after adding file (possibly in the same timestamp tick
+    # as the scan)
+    new_file = tmp_path / '2' / 'root4' / 'test_3.nc'
+    new_file.touch()
+    files = io.get_all_ancestor_files(cfg, pattern=pattern, regex=regex)
+    if (pattern, regex) in ((None, None), ('*', None), ('*.nc', None),
+                            ('test*', None), (None, r'test_\d\.nc')):
+        output.append(str(new_file))
+    assert files == output
+
+    # Use index once the directories are older than the timestamp resolution
+    old_mtime = time.time_ns() - 10 * io.MTIME_RESOLUTION_NS
+    for (dirpath, _, _) in os.walk(tmp_path):
+        os.utime(dirpath, ns=(old_mtime, old_mtime))
+    files = io.get_all_ancestor_files(cfg, pattern=pattern, regex=regex)
+    assert files == output
+    with mock.patch('esmvaltool.diag_scripts.shared.io.os.scandir',
+                    autospec=True) as mock_scandir:
+        files = io.get_all_ancestor_files(cfg, pattern=pattern, regex=regex)
+        assert not mock_scandir.called
+    assert files == output
+
+    # Force rescan
+    with mock.patch('esmvaltool.diag_scripts.shared.io.os.scandir',
+                    wraps=os.scandir) as mock_scandir:
+        files = io.get_all_ancestor_files(cfg,
+                                          pattern=pattern,
+                                          regex=regex,
+                                          refresh=True)
+        assert mock_scandir.called
+    assert files == output
+
+
+def test_ancestor_index_coarse_timestamps(tmp_path):
+    """Test refresh of index if directory timestamps did not change."""
+    cfg = {'input_files': [str(tmp_path)]}
+    (tmp_path / 'a.nc').touch()
+    assert io.get_all_ancestor_files(cfg) == [str(tmp_path / 'a.nc')]
+
+    # Simulate a file system whose timestamp did not tick since the scan
+    (tmp_path / 'b.nc').touch()
+    index = io._ANCESTOR_INDEX[str(tmp_path)]
+    index['dir_mtimes'][str(tmp_path)] = os.stat(tmp_path).st_mtime_ns
+    assert io.get_all_ancestor_files(cfg) == [
+        str(tmp_path / 'a.nc'),
+        str(tmp_path / 'b.nc'),
+    ]
+
 
 PATTERNS_FOR_SINGLE_ANCESTOR = [
     ([], None, True),
@@ -223,6 +275,113 @@ def test_netcdf_to_metadata(mock_walk, mock_load_cube, mock_logger,
     mock_logger.warning.assert_called()
 
 
+def test_netcdf_to_metadata_header(tmp_path):
+    """Test reading metadata from netcdf headers and the cache file."""
+    time_coord = iris.coords.DimCoord([0.0, 1.0],
+                                      standard_name='time',
+                                      units='days since 2000-01-01')
+    attrs = {'dataset': 'model', 'project': 'CMIP42'}
+    cube = iris.cube.Cube([0.0, 1.0],
+                          var_name=SHORT_NAME,
+                          standard_name=STANDARD_NAME,
+                          long_name=LONG_NAME,
+                          units=UNITS,
+                          attributes=attrs,
+                          dim_coords_and_dims=[(time_coord, 0)])
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    work_dir = tmp_path / 'work'
+    work_dir.mkdir()
+    path = str(data_dir / 'model.nc')
+    iris.save(cube, path)
+    output = [{
+        **io.iris.load_cube(path).attributes,
+        'long_name': LONG_NAME,
+        'short_name': SHORT_NAME,
+        'standard_name': STANDARD_NAME,
+        'units': UNITS,
+        'filename': path,
+    }]
+    cfg = {'work_dir': str(work_dir)}
+    metadata = io.netcdf_to_metadata(cfg, root=str(data_dir))
+    assert metadata == output
+    assert (work_dir / io.METADATA_INDEX).exists()
+    assert os.listdir(data_dir) == ['model.nc']
+
+    # Cached metadata
+    with mock.patch.object(io.netCDF4, 'Dataset', autospec=True) as mock_nc:
+        metadata = io.netcdf_to_metadata(cfg, root=str(data_dir))
+        assert not mock_nc.called
+    assert metadata == output
+
+
+@pytest.mark.parametrize('max_parallel_tasks,max_workers', [
+    (None, io.MAX_SCAN_WORKERS),
+    (2, 2),
+    (1, None),
+])
+def test_netcdf_to_metadata_parallel_scan(tmp_path, max_parallel_tasks,
+                                          max_workers):
+    """Test number of processes reading netcdf headers."""
+    paths = []
+    for idx in range(3):
+        path = str(tmp_path / 'model{}.nc'.format(idx))
+        with io.netCDF4.Dataset(path, 'w') as dataset:
+            dataset.createDimension('x', 1)
+            dataset.createVariable(SHORT_NAME, 'f4', ('x', ))
+            dataset.dataset = 'model{}'.format(idx)
+            dataset.project = 'CMIP42'
+        paths.append(path)
+    cfg = {'max_parallel_tasks': max_parallel_tasks}
+    with mock.patch.object(io, 'MIN_FILES_FOR_PARALLEL_SCAN', 3), \
+            mock.patch.object(io, 'ProcessPoolExecutor',
+                              wraps=io.ProcessPoolExecutor) as mock_pool:
+        metadata = io.netcdf_to_metadata(cfg, root=str(tmp_path))
+    if max_workers is None:
+        mock_pool.assert_not_called()
+    else:
+        mock_pool.assert_called_once_with(max_workers=max_workers)
+    assert sorted(m['filename'] for m in metadata) == paths
+    assert sorted(m['dataset'] for m in metadata) == [
+        'model0', 'model1', 'model2'
+    ]
+
+
+@pytest.mark.parametrize('long_name', [None, LONG_NAME])
+def test_netcdf_to_metadata_header_like_iris(tmp_path, long_name):
+    """Test that metadata read from netcdf headers matches :mod:`iris`."""
+    path = str(tmp_path / 'model.nc')
+    with io.netCDF4.Dataset(path, 'w') as dataset:
+        dataset.createDimension('x', 2)
+        var = dataset.createVariable(SHORT_NAME, 'f4', ('x', ))
+        var.standard_name = 'invalid_name'
+        if long_name is not None:
+            var.long_name = long_name
+        var.units = UNITS
+        var.dataset = 'VAR'
+        var.array = np.array([1, 2], dtype=np.int32)
+        var.scalar = np.float32(3.5)
+        dataset.dataset = 'GLOBAL'
+        dataset.project = 'CMIP42'
+        dataset.global_array = np.array([1.5, 2.5])
+    cube = iris.load_cube(path)
+    cfg = {'work_dir': str(tmp_path)}
+    for _ in range(2):
+        metadata = io.netcdf_to_metadata(cfg, root=str(tmp_path))
+        assert len(metadata) == 1
+        metadata = metadata[0]
+        assert metadata['dataset'] == 'VAR'
+        assert metadata['standard_name'] is None
+        assert metadata['long_name'] == cube.long_name
+        assert metadata.get('invalid_standard_name') == (
+            cube.attributes.get('invalid_standard_name'))
+        for attr in ('array', 'scalar', 'global_array'):
+            assert type(metadata[attr]) is type(cube.attributes[attr])
+            assert metadata[attr].dtype == cube.attributes[attr].dtype
+            np.testing.assert_array_equal(metadata[attr],
+                                          cube.attributes[attr])
+
+
 ATTRS_IN = [
     {
         'dataset': 'a',
@@ -447,6 +606,15 @@ def test_save_1d_data(mock_logger, mock_save, var_attrs, attrs):
     else:
         mock_logger.warning.assert_not_called()
         assert mock_save.call_args_list == [mock.call(new_cube, PATH)]
+    mock_logger.reset_mock()
+    mock_save.reset_mock()
+
+    # With chunked output
+    io.save_1d_data(cubes, PATH, coord_name, var_attrs, attrs, (1, 8))
+    if 'units' in var_attrs:
+        assert mock_save.call_args_list == [
+            mock.call(new_cube, PATH, chunksizes=(1, 8))
+        ]
 
 
 CUBELIST = [
@@ -0,0 +1,31 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.shared._validation`."""
+
+import pytest
+
+from esmvaltool.diag_scripts.shared import _validation
+
+INPUT_DATA = [
+    {'short_name': 'tas', 'dataset': 'CTRL', 'project': 'CMIP5'},
+    {'short_name': 'tas', 'dataset': 'EXP', 'project': 'CMIP5'},
+    {'short_name': 'tas', 'dataset': 'ERA-Interim', 'project': 'OBS'},
+    {'short_name': 'pr', 'dataset': 'GPCP', 'project': 'obs4mips'},
+]
+CFG = {'control_model': 'CTRL', 'exper_model': 'EXP'}
+
+
+def test_get_control_exper_obs():
+    """Test selection of control, experiment and observations."""
+    cfg = dict(CFG, observational_datasets=['ERA-Interim'])
+    (ctrl, exper, obs) = _validation.get_control_exper_obs(
+        'tas', INPUT_DATA, cfg, 'CMIP5')
+    assert ctrl == INPUT_DATA[0]
+    assert exper == INPUT_DATA[1]
+    assert obs == [INPUT_DATA[2]]
+
+
+def test_get_control_exper_obs_missing_obs():
+    """Test error for observations without data of the variable."""
+    cfg = dict(CFG, observational_datasets=['ERA-Interim', 'GPCP'])
+    with pytest.raises(ValueError) as exc:
+        _validation.get_control_exper_obs('tas', INPUT_DATA, cfg, 'CMIP5')
+    assert "['GPCP']" in str(exc.value)
@@ -0,0 +1,64 @@
+"""Tests for the module :mod:`esmvaltool.diag_scripts.zmnam.zmnam_calc`.
+
+"""
+
+import cf_units
+import numpy as np
+
+from esmvaltool.diag_scripts.zmnam import zmnam_calc
+
+
+def _get_dates(start_day, n_days):
+    """Get daily dates in a 360-day calendar."""
+    unit = cf_units.Unit('days since 2000-01-01', calendar='360_day')
+    return unit.num2date(np.arange(start_day, start_day + n_days))
+
+
+def test_monthly_means():
+    """Test means over calendar months."""
+    date = _get_dates(0, 90)
+    data = np.arange(180.0).reshape(90, 2)
+    (means, mid_mon) = zmnam_calc._monthly_means(data, date)
+    np.testing.assert_array_equal(mid_mon, [14, 44, 74])
+    np.testing.assert_allclose(means, [[29.0, 30.0], [89.0, 90.0],
+                                       [149.0, 150.0]])
+
+
+def test_monthly_means_partial_months():
+    """Test that months without their 15th day are dropped."""
+    date = _get_dates(19, 50)
+    data = np.arange(50.0)[:, np.newaxis]
+    (means, mid_mon) = zmnam_calc._monthly_means(data, date)
+    np.testing.assert_array_equal(mid_mon, [25])
+    np.testing.assert_allclose(means, [[25.5]])
+
+
+def test_leading_eofs():
+    """Test EOFs of a field made of two known modes per level.
+
+    The weighted patterns of the modes are orthonormal and their PCs are
+    uncorrelated with equal variance, so the explained variance of the
+    leading mode is given by the squared amplitudes.
+    """
+    weights = np.linspace(0.5, 1.0, 8)
+    mode_1 = np.full(8, 1.0 / np.sqrt(8.0))
+    mode_2 = np.array([1.0, -1.0] * 4) / np.sqrt(8.0)
+    phase = 2.0 * np.pi * np.arange(360) / 36.0
+    amplitudes = np.array([3.0, 2.0, 1.5])
+    data = (amplitudes[:, np.newaxis] * np.cos(phase)[:, np.newaxis,
+                                                      np.newaxis] * mode_1 +
+            np.sin(phase)[:, np.newaxis, np.newaxis] * mode_2) / weights
+    (eofs, eigs, pcs) = zmnam_calc._leading_eofs(data, weights)
+
+    np.testing.assert_allclose(eigs, amplitudes**2 / (amplitudes**2 + 1.0),
+                               rtol=1e-5)
+
+    # Eigenvectors are only unique up to their sign
+    sign = np.sign(eofs[:, 0])
+    np.testing.assert_allclose(eofs * sign[:, np.newaxis],
+                               np.tile(mode_1 / weights, (3, 1)),
+                               rtol=1e-5)
+    expected_pc = np.cos(phase) / np.std(np.cos(phase), ddof=1)
+    np.testing.assert_allclose(pcs * sign,
+                               np.tile(expected_pc[:, np.newaxis], (1, 3)),
+                               atol=1e-5)